@@ -0,0 +1,306 @@
+# -*- coding: utf-8 -*-
+"""Micro-benchmarks of the hot paths of wusa with fake Docker and GitHub backends.
+
+Run from the root of the repository, e.g.
+
+    python benchmarks/hot_paths.py --sizes 1000 10000 --json results.json
+
+Every benchmark runs in a temporary wusa directory. Nothing is sent to the docker
+server or to GitHub. Reported are the best and median time of all repetitions
+and the peak of memory allocated during one run, measured with ``tracemalloc``.
+"""
+import argparse
+import io
+import json
+import statistics
+import sys
+import tempfile
+import tracemalloc
+from pathlib import Path
+from time import perf_counter
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import Tuple
+
+from rich.console import Console
+from rich.table import Table
+
+# benchmarks the working tree instead of an installed wusa
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import wusa.docker  # noqa: E402
+import wusa.gh  # noqa: E402
+import wusa.output  # noqa: E402
+import wusa.runners  # noqa: E402
+from wusa.docker import LogMatch  # noqa: E402
+from wusa.docker import wusa_docker_run  # noqa: E402
+from wusa.gh import GitHubClient  # noqa: E402
+from wusa.inventory import LiveRunner  # noqa: E402
+from wusa.output import print_live_runners  # noqa: E402
+from wusa.output import stream_runners  # noqa: E402
+from wusa.runners import Runner  # noqa: E402
+from wusa.runners import RunnersList  # noqa: E402
+
+DEFAULT_SIZES = [100, 1000, 10000]
+
+# a benchmark gets the fleet size and returns the function to measure
+Benchmark = Callable[[int], Callable[[], Any]]
+BENCHMARKS: Dict[str, Benchmark] = {}
+# called after every benchmark, e.g. to close clients
+CLEANUPS: List[Callable[[], None]] = []
+
+
+def benchmark(name: str) -> Callable[[Benchmark], Benchmark]:
+    def register(setup: Benchmark) -> Benchmark:
+        BENCHMARKS[name] = setup
+        return setup
+
+    return register
+
+
+def runner_entries(size: int) -> List[Dict[str, Any]]:
+    return [
+        Runner(f"wusa-bench{i:05d}", f"some/repo{i % 10}", "", ["gpu"]).as_dict()
+        for i in range(size)
+    ]
+
+
+class FakeContainer:
+    name = "wusa-bench"
+    status = "running"
+    attrs: Dict[str, Any] = {"State": {}}
+
+    def __init__(self, lines: List[bytes]) -> None:
+        self.lines = lines
+
+    def logs(self, stream: bool = False, follow: bool = False) -> Any:
+        return iter(self.lines)
+
+    def reload(self) -> None:
+        pass
+
+
+class FakeContainers:
+    def __init__(self) -> None:
+        self.lines: List[bytes] = []
+
+    def run(self, image: str, **kwargs: Any) -> FakeContainer:
+        return FakeContainer(self.lines)
+
+
+class FakeDockerClient:
+    def __init__(self) -> None:
+        self.containers = FakeContainers()
+
+
+class FakeGitHubAPI:
+    """Answers runner listings of ``size`` runners page by page."""
+
+    size = 0
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        pass
+
+    async def getitem(self, url: str) -> Dict[str, Any]:
+        query = dict(part.split("=") for part in url.split("?")[1].split("&"))
+        per_page, page = int(query["per_page"]), int(query["page"])
+        first = (page - 1) * per_page
+        runners = [
+            {
+                "id": i,
+                "name": f"wusa-bench{i:05d}",
+                "status": "online",
+                "busy": False,
+                "labels": [{"name": "self-hosted"}, {"name": "gpu"}],
+            }
+            for i in range(first, min(first + per_page, self.size))
+        ]
+        return {"total_count": self.size, "runners": runners}
+
+
+@benchmark("RunnersList load")
+def bench_load(size: int) -> Callable[[], Any]:
+    base_dir = wusa.runners.WUSA_BASE_DIR
+    (base_dir / "runners.json").write_text(json.dumps(runner_entries(size)))
+
+    def load() -> int:
+        # a new list has no cache, so the store is read every time
+        return len(RunnersList())
+
+    return load
+
+
+@benchmark("RunnersList save one change")
+def bench_save(size: int) -> Callable[[], Any]:
+    base_dir = wusa.runners.WUSA_BASE_DIR
+    (base_dir / "runners.json").write_text(json.dumps(runner_entries(size)))
+    runners = RunnersList()
+    runner = runners[0]
+
+    def save() -> None:
+        runner.status = "online" if runner.status != "online" else "offline"
+        runners.update([runner])
+
+    return save
+
+
+@benchmark("Runner construction")
+def bench_runner_construction(size: int) -> Callable[[], Any]:
+    entries = runner_entries(size)
+
+    def construct() -> List[Runner]:
+        return [Runner(**entry) for entry in entries]
+
+    return construct
+
+
+@benchmark("list-local render")
+def bench_print_live_runners(size: int) -> Callable[[], Any]:
+    runners = [
+        LiveRunner(e["name"], e["repo"], e["status"], e["labels"], "running", "online")
+        for e in runner_entries(size)
+    ]
+
+    def render() -> None:
+        output = io.StringIO()
+        wusa.output.CONSOLE = Console(file=output, width=120)
+        print_live_runners(runners, with_github=True)
+
+    return render
+
+
+@benchmark("list-repo render")
+def bench_stream_runners(size: int) -> Callable[[], Any]:
+    runners = [Runner(**entry) for entry in runner_entries(size)]
+
+    def render() -> None:
+        output = io.StringIO()
+        # rows are only streamed to terminals
+        wusa.output.CONSOLE = Console(file=output, width=120, force_terminal=True)
+        stream_runners(runners)
+
+    return render
+
+
+@benchmark("wusa_docker_run log lines")
+def bench_docker_logs(size: int) -> Callable[[], Any]:
+    client = FakeDockerClient()
+    client.containers.lines = [
+        f"{i:05d} Downloading action repository".encode() for i in range(size)
+    ] + [b"Listening for Jobs"]
+    wusa.docker._client = client
+
+    def run() -> None:
+        wusa_docker_run(
+            "./run.sh", "some/image", "wusa-bench", ready=LogMatch("Listening")
+        )
+
+    return run
+
+
+@benchmark("GitHub runner listing")
+def bench_gh_listing(size: int) -> Callable[[], Any]:
+    FakeGitHubAPI.size = size
+    wusa.gh.GitHubAPI = FakeGitHubAPI
+    client = GitHubClient("some-token")
+    CLEANUPS.append(client.close)
+
+    def listing() -> int:
+        api = wusa.gh.api_runner_list("some/repo")
+        return sum(1 for _ in client.iter(api, "runners"))
+
+    return listing
+
+
+def measure(function: Callable[[], Any], repeat: int) -> Tuple[List[float], int]:
+    times = []
+    for _ in range(repeat):
+        started = perf_counter()
+        function()
+        times.append(perf_counter() - started)
+
+    tracemalloc.start()
+    function()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return times, peak
+
+
+def run_benchmarks(
+    names: List[str],
+    sizes: List[int],
+    repeat: int,
+) -> List[Dict[str, Any]]:
+    results = []
+    for name in names:
+        for size in sizes:
+            with tempfile.TemporaryDirectory() as tmp:
+                base_dir = Path(tmp)
+                (base_dir / "runners").mkdir()
+                wusa.runners.WUSA_BASE_DIR = base_dir
+                wusa.runners.WUSA_RUNNER_DIR = base_dir / "runners"
+                wusa.output.CONSOLE = Console(file=io.StringIO())
+
+                times, peak = measure(BENCHMARKS[name](size), repeat)
+                wusa.docker._client = None
+                while CLEANUPS:
+                    CLEANUPS.pop()()
+
+            results.append(
+                {
+                    "benchmark": name,
+                    "size": size,
+                    "best": min(times),
+                    "median": statistics.median(times),
+                    "peak_bytes": peak,
+                }
+            )
+    return results
+
+
+def print_results(results: List[Dict[str, Any]]) -> None:
+    table = Table()
+    table.add_column("Benchmark", style="bold blue")
+    table.add_column("Runners", justify="right")
+    table.add_column("Best", justify="right")
+    table.add_column("Median", justify="right")
+    table.add_column("Peak memory", justify="right")
+
+    for result in results:
+        table.add_row(
+            result["benchmark"],
+            str(result["size"]),
+            f"{result['best'] * 1000:.2f} ms",
+            f"{result['median'] * 1000:.2f} ms",
+            f"{result['peak_bytes'] / 1024:.0f} KiB",
+        )
+
+    Console().print(table)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--only",
+        nargs="+",
+        choices=list(BENCHMARKS),
+        default=list(BENCHMARKS),
+        metavar="BENCHMARK",
+        help="Benchmarks to run: " + ", ".join(BENCHMARKS),
+    )
+    parser.add_argument("--json", type=Path, help="Also write results to a file.")
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.only, args.sizes, args.repeat)
+    print_results(results)
+    if args.json:
+        args.json.write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
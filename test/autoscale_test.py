@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+import json
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+from threading import Thread
+from urllib.parse import parse_qs
+from urllib.parse import urlparse
+
+from pytest import fixture
+
+from wusa.autoscale import Autoscaler
+from wusa.autoscale import ScalingPolicy
+from wusa.gh import set_http_cache
+from wusa.runners import Runner
+from wusa.runners import Runners
+
+
+class FakeGitHub:
+    """Minimal local GitHub API serving workflow runs, jobs and runners."""
+
+    def __init__(self):
+        self.runs = {"queued": [], "in_progress": []}
+        self.jobs = {}
+        self.runners = []
+        self.requests = []
+
+    def respond(self, path, query):
+        self.requests.append(path)
+        parts = path.strip("/").split("/")
+        if parts[-1] == "runs":
+            runs = self.runs[query["status"][0]]
+            return {"total_count": len(runs), "workflow_runs": runs}
+        if parts[-1] == "jobs":
+            jobs = self.jobs[int(parts[-2])]
+            return {"total_count": len(jobs), "jobs": jobs}
+        if parts[-1] == "runners":
+            return {"total_count": len(self.runners), "runners": self.runners}
+        raise KeyError(path)
+
+
+@fixture(name="fake_github")
+def _fake_github(monkeypatch):
+    github = FakeGitHub()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlparse(self.path)
+            body = json.dumps(github.respond(url.path, parse_qs(url.query))).encode()
+            self.send_response(200)
+            self.send_header("content-type", "application/json; charset=utf-8")
+            self.send_header("content-length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    Thread(target=server.serve_forever, daemon=True).start()
+
+    monkeypatch.setenv("WUSA_GH_API_URL", f"http://127.0.0.1:{server.server_port}")
+    monkeypatch.setattr("wusa.gh.obtain_token", lambda: "some-token")
+    set_http_cache(False)
+    yield github
+    set_http_cache(True)
+    server.shutdown()
+
+
+@fixture(name="local_runners")
+def _local_runners(tmp_path, monkeypatch):
+    monkeypatch.delenv("WUSA_STATE_BACKEND", raising=False)
+    monkeypatch.setattr("wusa.runners.WUSA_BASE_DIR", tmp_path)
+    monkeypatch.setattr("wusa.runners.WUSA_RUNNER_DIR", tmp_path)
+    yield Runners
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def job(status, labels=("self-hosted", "linux")):
+    return {"status": status, "labels": list(labels)}
+
+
+def test_ScalingPolicy_desired():
+    policy = ScalingPolicy(min_runners=1, max_runners=5, hysteresis=1)
+
+    assert policy.desired(current=0, jobs=0) == 1
+    assert policy.desired(current=1, jobs=3) == 3
+    assert policy.desired(current=3, jobs=9) == 5
+    # within hysteresis nothing changes
+    assert policy.desired(current=3, jobs=2) == 3
+    assert policy.desired(current=3, jobs=1) == 1
+    assert policy.desired(current=7, jobs=5) == 5
+
+
+def test_Autoscaler_fetch_demands(fake_github, local_runners):
+    fake_github.runs["queued"] = [{"id": 1}, {"id": 2}]
+    fake_github.runs["in_progress"] = [{"id": 3}]
+    fake_github.jobs = {
+        1: [job("queued"), job("queued", labels=["ubuntu-latest"])],
+        2: [job("queued")],
+        3: [job("in_progress"), job("completed")],
+    }
+    fake_github.runners = [
+        {"name": "wusa-busy", "busy": True},
+        {"name": "wusa-idle", "busy": False},
+    ]
+    local_runners.add(
+        [
+            Runner("wusa-busy", "some/repo", ""),
+            Runner("wusa-idle", "some/repo", ""),
+            Runner("wusa-other", "other/repo", ""),
+        ]
+    )
+
+    autoscaler = Autoscaler({"some/repo": ScalingPolicy()})
+    (demand,) = autoscaler.fetch_demands().values()
+
+    assert demand.jobs == 3
+    assert demand.idle_runners == ["wusa-idle"]
+
+
+def test_Autoscaler_step(fake_github, local_runners):
+    created, removed = [], []
+
+    def create(repo, count):
+        created.append((repo, count))
+        local_runners.add([Runner.new(repo) for _ in range(count)])
+
+    def remove(repo, names):
+        removed.append((repo, names))
+
+    clock = FakeClock()
+    policy = ScalingPolicy(max_runners=4, scale_up_cooldown=10, scale_down_cooldown=60)
+    autoscaler = Autoscaler({"some/repo": policy}, create, remove, clock)
+
+    fake_github.runs["queued"] = [{"id": 1}]
+    fake_github.jobs = {1: [job("queued")] * 6}
+    assert autoscaler.step() == {"some/repo": 4}
+    assert created == [("some/repo", 4)]
+
+    # demand is gone, but scaling down waits for the cooldown
+    fake_github.runs["queued"] = []
+    clock.now += 30
+    assert autoscaler.step() == {"some/repo": 0}
+
+    clock.now += 31
+    assert autoscaler.step() == {"some/repo": -4}
+    ((repo, names),) = removed
+    assert len(names) == 4
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import os
+
+import gidgethub.abc
+from pytest import fixture
+from pytest import raises
+
+from wusa.cache import HTTPCache
+
+
+@fixture(name="cache")
+def _cache(tmp_path):
+    yield HTTPCache(tmp_path / "http")
+
+
+def test_HTTPCache_roundtrip(cache):
+    with raises(KeyError):
+        cache["/some/api"]
+
+    cache["/some/api"] = ('"etag"', None, {"runners": []}, None)
+    assert cache["/some/api"] == ('"etag"', None, {"runners": []}, None)
+    assert list(cache) == ["/some/api"]
+    assert len(cache) == 1
+
+    del cache["/some/api"]
+    assert len(cache) == 0
+
+
+def test_HTTPCache_is_persistent(cache, tmp_path):
+    cache["/some/api"] = ('"etag"', "yesterday", [1, 2], "/some/api?page=2")
+    assert HTTPCache(tmp_path / "http")["/some/api"] == (
+        '"etag"',
+        "yesterday",
+        [1, 2],
+        "/some/api?page=2",
+    )
+
+
+def test_HTTPCache_ttl(tmp_path, monkeypatch):
+    cache = HTTPCache(tmp_path / "http", ttl=60)
+    monkeypatch.setattr("wusa.cache.time", lambda: 1000.0)
+    cache["/some/api"] = ('"etag"', None, {}, None)
+
+    monkeypatch.setattr("wusa.cache.time", lambda: 1059.0)
+    assert cache["/some/api"][0] == '"etag"'
+
+    monkeypatch.setattr("wusa.cache.time", lambda: 1061.0)
+    with raises(KeyError):
+        cache["/some/api"]
+    assert len(cache) == 0
+
+
+def test_HTTPCache_evicts_least_recently_used(tmp_path):
+    cache = HTTPCache(tmp_path / "http")
+    for i in range(3):
+        cache[f"/api/{i}"] = ('"etag"', None, "x" * 100, None)
+        os.utime(cache._path(f"/api/{i}"), (i, i))
+
+    # use of first entry makes the second one the least recently used
+    cache["/api/0"]
+    entry_size = cache._path("/api/0").stat().st_size
+    cache.max_size = int(3.5 * entry_size)
+    cache["/api/3"] = ('"etag"', None, "x" * 100, None)
+
+    assert sorted(cache) == ["/api/0", "/api/2", "/api/3"]
+
+
+class FakeGitHubAPI(gidgethub.abc.GitHubAPI):
+    def __init__(self, cache):
+        super().__init__("wusa", cache=cache)
+        self.request_headers = []
+
+    async def _request(self, method, url, headers, body=b""):
+        self.request_headers.append(headers)
+        response_headers = {"content-type": "application/json; charset=utf-8"}
+        if headers.get("if-none-match") == '"v1"':
+            return 304, response_headers, b""
+        return 200, dict(response_headers, etag='"v1"'), b'{"total_count": 0}'
+
+    async def sleep(self, seconds):
+        pass
+
+
+def test_HTTPCache_used_for_conditional_requests(cache):
+    async def get_twice():
+        gh_api = FakeGitHubAPI(cache)
+        first = await gh_api.getitem("/some/api")
+        second = await gh_api.getitem("/some/api")
+        return gh_api, first, second
+
+    gh_api, first, second = asyncio.run(get_twice())
+
+    assert first == second == {"total_count": 0}
+    assert "if-none-match" not in gh_api.request_headers[0]
+    assert gh_api.request_headers[1]["if-none-match"] == '"v1"'
@@ -6,19 +6,35 @@ from docker.errors import NotFound
 from pytest import fixture
 from pytest import raises
 
+from wusa.docker import FileMarker
+from wusa.docker import HealthCheck
+from wusa.docker import LogMatch
+from wusa.docker import close_client
+from wusa.docker import docker_api_calls
 from wusa.docker import get_client
+from wusa.docker import wait_until_ready
 from wusa.docker import wusa_docker_commit
 from wusa.docker import wusa_docker_get
 from wusa.docker import wusa_docker_remove
 from wusa.docker import wusa_docker_run
+from wusa.docker import wusa_docker_run_service
+from wusa.exceptions import ContainerExited
 from wusa.exceptions import DockerError
 from wusa.exceptions import NoDockerServerFound
+from wusa.exceptions import ReadinessTimeout
+
+
+@fixture(autouse=True)
+def _reset_shared_client():
+    close_client()
+    yield
+    close_client()
 
 
 def test_get_client(monkeypatch):
     """Check that get_client uses 'from_env' interface to get DockerClient"""
 
-    def mocked_from_env():
+    def mocked_from_env(**kwargs):
         return "success"
 
     # TODO: check if this can be done better
@@ -31,7 +47,7 @@ def test_get_client(monkeypatch):
 def test_get_client_raises_NoClient(monkeypatch):
     """Check if get_client raises 'NoDockerServerFound' exception"""
 
-    def raises_DockerException():
+    def raises_DockerException(**kwargs):
         raise DockerException
 
     monkeypatch.setattr("wusa.docker.from_env", raises_DockerException)
@@ -40,6 +56,44 @@ def test_get_client_raises_NoClient(monkeypatch):
         get_client()
 
 
+def test_get_client_is_shared(monkeypatch):
+    """Check that the client is created once with the configured pool size"""
+    created = []
+
+    def mocked_from_env(**kwargs):
+        created.append(kwargs)
+        return object()
+
+    monkeypatch.setattr("wusa.docker.from_env", mocked_from_env)
+    monkeypatch.setenv("WUSA_DOCKER_POOL_SIZE", "32")
+
+    assert get_client() is get_client()
+    assert created == [{"max_pool_size": 32}]
+
+    close_client()
+    get_client()
+    assert len(created) == 2
+
+
+def test_get_client_counts_api_calls(monkeypatch):
+    """Check that responses of the shared client are counted"""
+
+    class APIClient:
+        hooks = {"response": []}
+
+    class Client:
+        api = APIClient()
+
+    monkeypatch.setattr("wusa.docker.from_env", lambda **kwargs: Client())
+
+    hooks = get_client().api.hooks["response"]
+    assert docker_api_calls() == 0
+    for hook in hooks:
+        hook(None)
+        hook(None)
+    assert docker_api_calls() == 2
+
+
 @fixture(name="patched_DockerClient")
 def _mock_DockerClient(monkeypatch):
     class DockerContainer:
@@ -60,7 +114,7 @@ def _mock_DockerClient(monkeypatch):
 
     patched_client = DockerClient()
 
-    def return_patched_client():
+    def return_patched_client(**kwargs):
         return patched_client
 
     def return_container_of_patched_client(*args, **kwargs):
@@ -101,6 +155,39 @@ def test_wusa_docker_run_calls_docker_run(patched_DockerClient):
         wusa_docker_run("some command", "some_image", "some_name")
 
 
+def test_wusa_docker_run_sets_environment(patched_DockerClient):
+    def check_environment(*args, **kwargs):
+        assert kwargs["environment"] == {"RUNNER_TOOL_CACHE": "/opt/tools"}
+        raise HasBeenCalled
+
+    patched_DockerClient.containers.run = check_environment
+
+    with raises(HasBeenCalled):
+        wusa_docker_run(
+            "command",
+            "some_image",
+            "some_name",
+            environment={"RUNNER_TOOL_CACHE": "/opt/tools"},
+        )
+
+
+def test_wusa_docker_run_service(patched_DockerClient):
+    def check_args_and_kwargs(*args, **kwargs):
+        assert args == ("registry:2",)
+        assert kwargs["ports"] == {"5000/tcp": ("127.0.0.1", 5000)}
+        assert kwargs["labels"] == {"org.wusa.service": "wusa-mirror"}
+        assert kwargs["restart_policy"] == {"Name": "unless-stopped"}
+        assert "privileged" not in kwargs
+        raise HasBeenCalled
+
+    patched_DockerClient.containers.run = check_args_and_kwargs
+
+    with raises(HasBeenCalled):
+        wusa_docker_run_service(
+            "registry:2", "wusa-mirror", ports={"5000/tcp": ("127.0.0.1", 5000)}
+        )
+
+
 def test_wusa_docker_run_catches_APIError(patched_DockerClient):
     def raise_APIError(*args, **kwargs):
         raise APIError(message="")
@@ -204,3 +291,105 @@ def test_wusa_docker_get_when_APIError(patched_DockerClient):
     patched_DockerClient.containers.get = raises_APIError
     with raises(DockerError, match="Error encountered while trying to get container"):
         wusa_docker_get("does_not_exist")
+
+
+class FakeContainer:
+    name = "some_name"
+
+    def __init__(self, lines, status="running", exit_code=0, health=None):
+        self.lines = lines
+        self.status = status
+        self.attrs = {"State": {"ExitCode": exit_code, "Health": {"Status": health}}}
+        self.reloads = 0
+        self.removed = False
+
+    def logs(self, stream=False, follow=False):
+        return iter(self.lines)
+
+    def reload(self):
+        self.reloads += 1
+
+    def remove(self, force=False):
+        self.removed = force
+
+
+def test_wait_until_ready_log_match():
+    container = FakeContainer([b"starting", b"\xe2\x88\x9a Listening for Jobs", b"x"])
+
+    elapsed = wait_until_ready(container, LogMatch("Listening for Jobs"), timeout=5)
+    assert 0 <= elapsed < 5
+
+
+def test_wait_until_ready_without_condition_waits_for_exit():
+    container = FakeContainer([b"configured"], status="exited")
+
+    assert wait_until_ready(container, timeout=5, poll_interval=0.01) < 5
+    assert container.reloads >= 1
+
+
+def test_wait_until_ready_raises_on_exit():
+    container = FakeContainer([b"some error"], status="exited", exit_code=3)
+
+    with raises(ContainerExited, match="exited with code 3 before it was ready"):
+        wait_until_ready(container, LogMatch("Listening"), poll_interval=0.01)
+
+
+def test_wait_until_ready_raises_on_timeout():
+    container = FakeContainer([b"still configuring"])
+
+    with raises(ReadinessTimeout, match="not ready after 0.1s"):
+        wait_until_ready(container, LogMatch("Listening"), timeout=0.1)
+
+
+def test_wusa_docker_run_removes_container_which_exited(patched_DockerClient):
+    container = FakeContainer([b"some error"], status="exited", exit_code=3)
+    patched_DockerClient.containers.run = lambda *args, **kwargs: container
+
+    with raises(ContainerExited):
+        wusa_docker_run("", "some_image", "some_name", stop_logging_substr="Listen")
+    assert container.removed
+
+
+def test_wusa_docker_run_check_exit_code(patched_DockerClient):
+    container = FakeContainer([b"invalid token"], status="exited", exit_code=1)
+    patched_DockerClient.containers.run = lambda *args, **kwargs: container
+
+    assert wusa_docker_run("", "some_image", "some_name") is container
+    assert not container.removed
+    with raises(ContainerExited, match="exited with code 1"):
+        wusa_docker_run("", "some_image", "some_name", check=True)
+    assert container.removed
+
+
+def test_wusa_docker_run_service_removes_container_after_timeout(
+    patched_DockerClient,
+):
+    container = FakeContainer([b"still starting"])
+    patched_DockerClient.containers.run = lambda *args, **kwargs: container
+
+    with raises(ReadinessTimeout):
+        wusa_docker_run_service(
+            "registry:2", "wusa-mirror", {}, ready=LogMatch("listening"), timeout=0.1
+        )
+    assert container.removed
+
+
+def test_wait_until_ready_health_check():
+    container = FakeContainer([], health="healthy")
+    assert wait_until_ready(container, HealthCheck(), timeout=5) < 5
+
+    container = FakeContainer([], health="unhealthy")
+    with raises(DockerError, match="is unhealthy"):
+        wait_until_ready(container, HealthCheck(), timeout=5)
+
+
+def test_wait_until_ready_file_marker():
+    class MarkerContainer(FakeContainer):
+        def exec_run(self, cmd):
+            assert cmd == ["test", "-e", "/tmp/ready"]
+            # marker appears on the second check
+            return (0 if self.reloads > 1 else 1), b""
+
+    container = MarkerContainer([])
+    assert wait_until_ready(container, FileMarker("/tmp/ready"), poll_interval=0.01) < 5
+    assert container.reloads == 2
@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+from asyncio import get_running_loop
+from asyncio import run
+from asyncio import sleep
+
+from pytest import fixture
+from pytest import raises
+
+from wusa.exceptions import GHError
+from wusa.gh import GHRequest
+from wusa.gh import GitHubClient
+from wusa.gh import async_get_gh_api
+from wusa.gh import async_post_gh_api
+from wusa.gh import batch_gh_api
+from wusa.gh import close_gh_client
+from wusa.gh import get_gh_api
+from wusa.gh import get_gh_client
+from wusa.gh import iter_gh_api
+from wusa.gh import iter_gh_api_many
+from wusa.gh import post_gh_api
+
+
+class FakeGitHubAPI:
+    instances = []
+
+    def __init__(self, session, requester, oauth_token=None, cache=None, **kwargs):
+        self.session = session
+        self.oauth_token = oauth_token
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.pages = []
+        self.loops = set()
+        FakeGitHubAPI.instances.append(self)
+
+    async def _request(self, method, url, data=None):
+        self.loops.add(get_running_loop())
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await sleep(0.01)
+        self.in_flight -= 1
+        if url.endswith("/fail"):
+            raise GHError("failed")
+        if url.startswith("/listing?"):
+            return self._page(url)
+        return {"method": method, "url": url, "data": data}
+
+    def _page(self, url):
+        query = dict(part.split("=") for part in url.split("?")[1].split("&"))
+        per_page, page = int(query["per_page"]), int(query["page"])
+        self.pages.append(page)
+        items = list(range(250))[(page - 1) * per_page : page * per_page]
+        return {"total_count": 250, "things": [{"id": i} for i in items]}
+
+    async def getitem(self, url):
+        return await self._request("GET", url)
+
+    async def post(self, url, data):
+        return await self._request("POST", url, data)
+
+    async def delete(self, url):
+        await self._request("DELETE", url)
+        # GitHub answers deletions with '204 No Content'
+        return None
+
+
+@fixture(autouse=True)
+def _fake_github(monkeypatch):
+    FakeGitHubAPI.instances = []
+    monkeypatch.setattr("wusa.gh.GitHubAPI", FakeGitHubAPI)
+    monkeypatch.setattr("wusa.gh.obtain_token", lambda: "some-token")
+    close_gh_client()
+    yield
+    close_gh_client()
+
+
+def test_get_gh_client_is_shared():
+    assert get_gh_client() is get_gh_client()
+    assert get_gh_client("other-token").token == "other-token"
+
+
+def test_get_gh_client_keeps_clients_of_other_tokens(monkeypatch):
+    client = get_gh_client()
+    other = get_gh_client("other-token")
+    monkeypatch.setenv("WUSA_GH_API_URL", "https://github.example.com/api/v3")
+    enterprise = get_gh_client()
+
+    assert len({id(client), id(other), id(enterprise)}) == 3
+    assert enterprise.base_url == "https://github.example.com/api/v3"
+    assert not client.loop.is_closed()
+    monkeypatch.delenv("WUSA_GH_API_URL")
+    assert get_gh_client() is client
+
+
+def test_async_get_gh_api_with_other_token():
+    client = get_gh_client()
+
+    # coroutines on the loop of a client may ask for the client of another token
+    response = client.run(async_get_gh_api("/some/api", "other-token"))
+
+    assert response["url"] == "/some/api"
+    assert not client.loop.is_closed()
+
+
+def test_async_gh_api_from_any_loop():
+    client = get_gh_client()
+
+    async def requests():
+        response = await async_get_gh_api("/some/api", "some-token")
+        posted = await async_post_gh_api("/some/api", "some-token", {"a": 1})
+        return response, posted
+
+    response, posted = run(requests())
+
+    assert response["url"] == "/some/api"
+    assert posted["data"] == {"a": 1}
+    # requests are sent with the session of the client, on its loop
+    (gh_api,) = FakeGitHubAPI.instances
+    assert gh_api.loops == {client.loop}
+    assert not gh_api.session.closed
+
+
+def test_GitHubClient_close_on_own_loop():
+    client = get_gh_client()
+
+    async def close():
+        client.close()
+
+    with raises(RuntimeError, match="can not be closed from its own loop"):
+        client.run(close())
+
+
+def test_requests_share_one_session():
+    assert get_gh_api("/some/api") == {
+        "method": "GET",
+        "url": "/some/api",
+        "data": None,
+    }
+    assert post_gh_api("/some/api", {"a": 1})["data"] == {"a": 1}
+    assert post_gh_api("/some/api")["data"] == {}
+
+    (gh_api,) = FakeGitHubAPI.instances
+    assert gh_api.oauth_token == "some-token"
+    assert not gh_api.session.closed
+
+
+def test_batch_gh_api():
+    requests = [GHRequest("GET", f"/api/{i}") for i in range(10)]
+    requests += [GHRequest("POST", "/api/fail"), GHRequest("PATCH", "/api/10")]
+
+    responses = batch_gh_api(requests, concurrency=3)
+
+    assert [r["url"] for r in responses[:10]] == [f"/api/{i}" for i in range(10)]
+    assert isinstance(responses[10], GHError)
+    assert isinstance(responses[11], GHError)
+    (gh_api,) = FakeGitHubAPI.instances
+    assert gh_api.max_in_flight == 3
+
+
+def test_batch_gh_api_delete():
+    requests = [GHRequest("DELETE", "/api/1"), GHRequest("DELETE", "/api/fail")]
+
+    responses = batch_gh_api(requests)
+
+    assert responses[0] == {}
+    assert isinstance(responses[1], GHError)
+    assert get_gh_client().requests == 2
+
+
+def test_iter_gh_api():
+    items = iter_gh_api("/listing", "things")
+
+    assert next(items) == {"id": 0}
+    (gh_api,) = FakeGitHubAPI.instances
+    # items are available before the remaining pages were requested
+    assert gh_api.pages == [1]
+    assert [item["id"] for item in items] == list(range(1, 250))
+    assert gh_api.pages == [1, 2, 3]
+
+
+def test_iter_gh_api_many():
+    apis = {f"repo{i}": "/listing" for i in range(5)}
+    apis["broken"] = "/fail"
+
+    items = list(iter_gh_api_many(apis, "things", concurrency=2))
+
+    (gh_api,) = FakeGitHubAPI.instances
+    assert gh_api.max_in_flight <= 2
+    errors = [(tag, item) for tag, item in items if isinstance(item, Exception)]
+    assert [tag for tag, _ in errors] == ["broken"]
+    for i in range(5):
+        ids = [item["id"] for tag, item in items if tag == f"repo{i}"]
+        assert ids == list(range(250))
+
+
+def test_GitHubClient_close():
+    client = GitHubClient("some-token")
+    client.get("/some/api")
+    session = FakeGitHubAPI.instances[-1].session
+
+    client.close()
+    assert session.closed
+    assert client.loop.is_closed()
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+from types import SimpleNamespace
+
+from docker.errors import ImageNotFound
+from pytest import fixture
+
+from wusa.image import BASE_IMAGE
+from wusa.image import image_repository
+from wusa.image import image_tag
+from wusa.image import pinned_base_image
+from wusa.image import pull_image
+from wusa.image import read_pin
+from wusa.image import remove_pin
+
+DIGEST = "sha256:" + "a" * 64
+
+
+class RecordingReporter:
+    def __init__(self):
+        self.events = []
+
+    def event(self, event):
+        self.events.append(event)
+
+
+def test_image_repository():
+    assert image_repository("wusarunner/base-linux:latest") == "wusarunner/base-linux"
+    assert image_repository("wusarunner/base-linux") == "wusarunner/base-linux"
+    assert image_repository(f"some/image@{DIGEST}") == "some/image"
+    assert image_repository("localhost:5000/some/image") == "localhost:5000/some/image"
+    assert (
+        image_repository("localhost:5000/some/image:v1") == "localhost:5000/some/image"
+    )
+
+
+class FakeImages:
+    def __init__(self, local):
+        self.local = local
+
+    def get_registry_data(self, image):
+        return SimpleNamespace(id=DIGEST)
+
+    def get(self, reference):
+        if reference not in self.local:
+            raise ImageNotFound(f"No such image: {reference}")
+        return self.local[reference]
+
+
+class FakeAPI:
+    def __init__(self, local):
+        self.local = local
+        self.pulled = []
+
+    def pull(self, image, stream, decode):
+        self.pulled.append(image)
+        # like docker, a pull by digest neither adds nor moves a tag
+        self.local[image] = image
+        yield {"status": "Pull complete", "id": "layer", "progressDetail": {}}
+
+    def tag(self, reference, repository, tag):
+        self.local[f"{repository}:{tag}"] = self.local[reference]
+
+
+@fixture(name="docker_client")
+def _docker_client(monkeypatch):
+    local = {}
+    client = SimpleNamespace(images=FakeImages(local), api=FakeAPI(local))
+    monkeypatch.setattr("wusa.docker.get_client", lambda: client)
+    yield client
+
+
+def test_image_tag():
+    assert image_tag("wusarunner/base-linux:v1") == "v1"
+    assert image_tag("localhost:5000/some/image") == "latest"
+    assert image_tag(f"some/image@{DIGEST}") == ""
+
+
+def test_pull_image_pins_digest(tmp_path, docker_client):
+    reporter = RecordingReporter()
+
+    assert pinned_base_image(tmp_path) == BASE_IMAGE
+    assert pull_image(tmp_path, reporter)
+
+    reference = f"wusarunner/base-linux@{DIGEST}"
+    assert docker_client.api.pulled == [reference]
+    assert len(reporter.events) == 1
+    assert read_pin(tmp_path).image == BASE_IMAGE
+    assert pinned_base_image(tmp_path) == reference
+    # the tag of unpinned runners is the pulled image as well
+    assert docker_client.images.get(BASE_IMAGE) == reference
+
+    remove_pin(tmp_path)
+    assert pinned_base_image(tmp_path) == BASE_IMAGE
+
+
+def test_pull_image_reuses_local_image(tmp_path, docker_client):
+    # e.g. pulled before, while the tag still points to an older image
+    reference = f"wusarunner/base-linux@{DIGEST}"
+    docker_client.api.local[reference] = reference
+    docker_client.api.local[BASE_IMAGE] = "older image"
+
+    assert not pull_image(tmp_path, RecordingReporter(), pin=False)
+    assert docker_client.api.pulled == []
+    assert docker_client.images.get(BASE_IMAGE) == reference
+    assert read_pin(tmp_path) is None
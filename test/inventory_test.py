@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+from pytest import fixture
+
+from wusa.exceptions import NoDockerServerFound
+from wusa.inventory import MISSING
+from wusa.inventory import UNKNOWN
+from wusa.inventory import live_runners
+from wusa.runners import Runner
+
+
+class SparseContainer:
+    # sparse containers of a listing have no name
+    name = None
+
+    def __init__(self, name, status):
+        self.attrs = {"Labels": {"org.wusa.container-name": name}}
+        self.status = status
+
+
+@fixture(name="runners")
+def _runners():
+    yield [
+        Runner("wusa-a", "some/repo", "", []),
+        Runner("wusa-b", "some/repo", "standby", []),
+        Runner("wusa-c", "other/repo", "", []),
+    ]
+
+
+@fixture(name="docker_calls")
+def _docker_calls(monkeypatch):
+    calls = []
+
+    def list_containers(**kwargs):
+        calls.append(kwargs)
+        return [
+            SparseContainer("wusa-a", "running"),
+            SparseContainer("wusa-b", "paused"),
+            SparseContainer("wusa-unknown", "exited"),
+        ]
+
+    monkeypatch.setattr("wusa.inventory.wusa_docker_list_containers", list_containers)
+    yield calls
+
+
+@fixture(name="gh_listings")
+def _gh_listings(monkeypatch):
+    listings = []
+
+    def iter_many(apis, key, concurrency):
+        listings.append(sorted(apis))
+        for repo in apis:
+            if repo == "other/repo":
+                yield repo, RuntimeError("listing failed")
+        yield "some/repo", {"name": "wusa-a", "status": "online", "busy": True}
+
+    monkeypatch.setattr("wusa.gh.iter_gh_api_many", iter_many)
+    yield listings
+
+
+def test_live_runners_joins_containers_by_name(runners, docker_calls):
+    live, failures = live_runners(runners)
+
+    assert docker_calls == [{"sparse": True}]
+    assert failures == {}
+    assert [(r.name, r.container, r.github) for r in live] == [
+        ("wusa-a", "running", ""),
+        ("wusa-b", "paused", ""),
+        ("wusa-c", MISSING, ""),
+    ]
+    assert live[1].status == "standby"
+
+
+def test_live_runners_with_github(runners, docker_calls, gh_listings):
+    live, failures = live_runners(runners, github=True)
+
+    # one listing of every repository, however many runners there are
+    assert gh_listings == [["other/repo", "some/repo"]]
+    assert list(failures) == ["other/repo"]
+    assert [r.github for r in live] == ["busy", MISSING, UNKNOWN]
+
+
+def test_live_runners_without_docker(runners, monkeypatch):
+    def no_docker(**kwargs):
+        raise NoDockerServerFound("no docker")
+
+    monkeypatch.setattr("wusa.inventory.wusa_docker_list_containers", no_docker)
+    live, failures = live_runners(runners)
+
+    assert list(failures) == ["docker"]
+    assert [r.container for r in live] == [UNKNOWN] * 3
+
+
+def test_live_runners_without_runners(docker_calls):
+    assert live_runners([], github=True) == ([], {})
+    assert docker_calls == []
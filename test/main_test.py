@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+import subprocess
+import sys
+from http import HTTPStatus
+
+from typer.testing import CliRunner
+
+from wusa.exceptions import BadRequest
+from wusa.main import app
+from wusa.placement import ResourceLimits
+from wusa.runners import Runners
+
+# only needed by commands which talk to docker or GitHub
+HEAVY_MODULES = [
+    "aiohttp",
+    "asyncio",
+    "docker",
+    "gidgethub.aiohttp",
+    "requests",
+    "rich.progress",
+    "shortuuid",
+    "wusa.gh",
+]
+
+LOADED_MODULES = """
+import json, sys
+{code}
+print(json.dumps([m for m in {modules!r} if m in sys.modules]))
+"""
+
+
+def loaded_heavy_modules(code, home):
+    # a new interpreter, as the tests import everything anyway
+    script = LOADED_MODULES.format(code=code, modules=HEAVY_MODULES)
+    result = subprocess.run(
+        [sys.executable, "-c", script],
+        env={**os.environ, "HOME": str(home)},
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(result.stdout.splitlines()[-1])
+
+
+def test_import_has_no_side_effects(tmp_path):
+    assert loaded_heavy_modules("import wusa.main", tmp_path) == []
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_list_local_loads_only_what_it_needs(tmp_path):
+    code = "from wusa.main import app\napp(['list-local'], standalone_mode=False)"
+
+    assert loaded_heavy_modules(code, tmp_path) == []
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_create_count_passes_limits(monkeypatch):
+    calls = []
+
+    def create_new_runners(repo, token, count, progress, labels, **kwargs):
+        calls.append(kwargs)
+        return [], {}
+
+    monkeypatch.setattr("wusa.tokens.get_runner_token", lambda repo, kind: "token")
+    monkeypatch.setattr(Runners, "create_new_runners", create_new_runners)
+    args = ["create", "some/repo", "--count", "2", "--cpus", "1.5", "--memory", "4g"]
+
+    result = CliRunner().invoke(app, args + ["--pids-limit", "64", "--place", "2"])
+
+    assert result.exit_code == 0, result.output
+    (kwargs,) = calls
+    assert kwargs["limits"] == ResourceLimits(cpus=1.5, memory="4g", pids_limit=64)
+    assert kwargs["place_cores"] == 2
+
+
+def test_list_repo_org_without_admin_scope(monkeypatch):
+    def iter_gh_api(api, key):
+        return [{"full_name": "some-org/repo"}]
+
+    def iter_gh_api_many(apis, key, concurrency):
+        runner = {"name": "wusa-a", "status": "online", "labels": []}
+        yield "some-org/repo", runner
+        yield "some-org", BadRequest(HTTPStatus.FORBIDDEN, "Must have admin rights")
+
+    monkeypatch.setattr("wusa.gh.iter_gh_api", iter_gh_api)
+    monkeypatch.setattr("wusa.gh.iter_gh_api_many", iter_gh_api_many)
+
+    result = CliRunner().invoke(app, ["list-repo", "--org", "some-org"])
+
+    assert result.exit_code == 0, result.output
+    assert "wusa-a" in result.output
+    assert "WARNING" in result.output
+    assert "'admin:org' scope" in result.output
@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+import json
+
+from pytest import fixture
+
+from wusa.events import EventTail
+from wusa.events import append_event
+from wusa.exceptions import NoDockerServerFound
+from wusa.metrics import Histogram
+from wusa.metrics import MetricsCollector
+from wusa.metrics import cgroup_stats
+from wusa.runners import Runner
+from wusa.runners import RunnersList
+
+
+class FakeContainer:
+    def __init__(self, name, id, status="running"):
+        self.name = name
+        self.id = id
+        self.status = status
+        self.attrs = {"Labels": {"org.wusa.container-name": name}}
+
+
+@fixture(name="base_dir")
+def _base_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr("wusa.runners.WUSA_BASE_DIR", tmp_path)
+    runners = [
+        Runner("wusa-a", "some/repo", "online", []),
+        Runner("wusa-b", "some/repo", "online", []),
+        Runner("wusa-c", "other/repo", "", []),
+    ]
+    (tmp_path / "runners.json").write_text(json.dumps([r.as_dict() for r in runners]))
+    yield tmp_path
+
+
+@fixture(name="containers")
+def _containers(monkeypatch):
+    containers = []
+    monkeypatch.setattr(
+        "wusa.metrics.wusa_docker_list_containers", lambda **kwargs: containers
+    )
+    yield containers
+
+
+def test_EventTail_reads_only_new_complete_lines(tmp_path):
+    log = tmp_path / "events.jsonl"
+    tail = EventTail(log)
+    assert tail.read() == []
+
+    append_event(log, {"kind": "create", "seconds": 1.0})
+    with log.open("a") as fp:
+        fp.write('{"kind": "startup"')
+
+    assert [event["kind"] for event in tail.read()] == ["create"]
+    assert tail.read() == []
+
+    with log.open("a") as fp:
+        fp.write(', "seconds": 2.0}\n')
+    assert tail.read()[0]["seconds"] == 2.0
+
+    # replaced log is read from its start
+    log.unlink()
+    append_event(log, {"kind": "remove"})
+    assert [event["kind"] for event in tail.read()] == ["remove"]
+
+
+def test_Histogram_lines_are_cumulative():
+    histogram = Histogram([1, 5])
+    for value in [0.5, 1, 3, 10]:
+        histogram.observe(value)
+
+    assert histogram.lines("latency", (("repo", "some/repo"),)) == [
+        'latency_bucket{repo="some/repo",le="1"} 2',
+        'latency_bucket{repo="some/repo",le="5"} 3',
+        'latency_bucket{repo="some/repo",le="+Inf"} 4',
+        'latency_sum{repo="some/repo"} 14.5',
+        'latency_count{repo="some/repo"} 4',
+    ]
+
+
+def test_cgroup_stats_v2_and_v1(tmp_path):
+    scope = tmp_path / "v2" / "system.slice" / "docker-abc.scope"
+    scope.mkdir(parents=True)
+    (scope / "cpu.stat").write_text("usage_usec 2500000\nuser_usec 2000000\n")
+    (scope / "memory.current").write_text("1048576\n")
+    assert cgroup_stats(tmp_path / "v2", "abc") == {
+        "cpu_seconds": 2.5,
+        "memory_bytes": 1048576.0,
+    }
+
+    cpuacct = tmp_path / "v1" / "cpuacct" / "docker" / "abc"
+    cpuacct.mkdir(parents=True)
+    (cpuacct / "cpuacct.usage").write_text("3000000000\n")
+    assert cgroup_stats(tmp_path / "v1", "abc") == {"cpu_seconds": 3.0}
+
+    assert cgroup_stats(tmp_path / "missing", "abc") == {}
+
+
+def test_MetricsCollector_collect(base_dir, containers, tmp_path):
+    append_event(
+        base_dir / "events.jsonl",
+        {"kind": "create", "repo": "some/repo", "seconds": 4.0},
+    )
+    append_event(
+        base_dir / "events.jsonl",
+        {
+            "kind": "github",
+            "requests": 3,
+            "rate_limit": 5000,
+            "rate_limit_remaining": 4990,
+        },
+    )
+    scope = tmp_path / "cgroup" / "system.slice" / "docker-abc.scope"
+    scope.mkdir(parents=True)
+    (scope / "cpu.stat").write_text("usage_usec 1500000\n")
+    containers.append(FakeContainer("wusa-a", "abc"))
+    containers.append(FakeContainer("wusa-c", "def", "exited"))
+
+    collector = MetricsCollector(base_dir, RunnersList(), tmp_path / "cgroup")
+    lines = collector.collect().splitlines()
+
+    assert 'wusa_runners{repo="some/repo",status="online"} 2' in lines
+    assert 'wusa_runners{repo="other/repo",status="unknown"} 1' in lines
+    assert 'wusa_runner_create_seconds_bucket{repo="some/repo",le="5"} 1' in lines
+    assert "wusa_github_requests_total 3" in lines
+    assert "wusa_github_rate_limit_remaining 4990" in lines
+    assert 'wusa_container_running{name="wusa-c"} 0' in lines
+    assert 'wusa_container_cpu_seconds_total{name="wusa-a"} 1.5' in lines
+
+    # events are counted once, new events are added on the next scrape
+    append_event(base_dir / "events.jsonl", {"kind": "github", "requests": 2})
+    lines = collector.collect().splitlines()
+    assert "wusa_github_requests_total 5" in lines
+    assert 'wusa_runner_create_seconds_count{repo="some/repo"} 1' in lines
+
+
+def test_MetricsCollector_without_docker(base_dir, monkeypatch):
+    def no_docker(**kwargs):
+        raise NoDockerServerFound("no docker")
+
+    monkeypatch.setattr("wusa.metrics.wusa_docker_list_containers", no_docker)
+    metrics = MetricsCollector(base_dir, RunnersList()).collect()
+
+    assert "wusa_runners" in metrics
+    assert "wusa_container" not in metrics
+
+
+def test_append_event_rotates_log(tmp_path):
+    log = tmp_path / "events.jsonl"
+    tail = EventTail(log)
+
+    append_event(log, {"kind": "create"}, max_size=100)
+    assert [event["kind"] for event in tail.read()] == ["create"]
+    append_event(log, {"kind": "startup", "name": "x" * 100}, max_size=100)
+    append_event(log, {"kind": "remove"}, max_size=100)
+
+    assert not log.with_name("events.jsonl.1").read_text().count("remove")
+    # events appended before the rotation are not lost
+    assert [event["kind"] for event in tail.read()] == ["startup", "remove"]
+
+    for _ in range(2):
+        append_event(log, {"kind": "startup", "name": "x" * 100}, max_size=100)
+    assert [p.name for p in sorted(tmp_path.iterdir())] == [
+        "events.jsonl.1",
+        "events.jsonl.lock",
+    ]
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+from pytest import fixture
+
+from wusa.mirror import MIRROR_DIR
+from wusa.mirror import Mirror
+from wusa.mirror import mirror_down
+from wusa.mirror import mirror_environment
+from wusa.mirror import mirror_status
+from wusa.mirror import mirror_up
+from wusa.mirror import read_mirror
+from wusa.mirror import write_mirror
+
+
+class FakeContainer:
+    def __init__(self, status):
+        self.status = status
+
+
+@fixture(name="docker")
+def _docker(monkeypatch):
+    calls = {"run": [], "stop": []}
+    services = {}
+
+    def run_service(image, name, **kwargs):
+        calls["run"].append((image, name, kwargs))
+        services[name] = FakeContainer("running")
+
+    def stop(container):
+        calls["stop"].append(container)
+        services.clear()
+
+    monkeypatch.setattr("wusa.mirror.wusa_docker_run_service", run_service)
+    monkeypatch.setattr("wusa.mirror.wusa_docker_container_stop", stop)
+    monkeypatch.setattr("wusa.mirror.wusa_docker_get_service", services.get)
+    monkeypatch.setattr(
+        "wusa.mirror.wusa_docker_info",
+        lambda: {"RegistryConfig": {"Mirrors": ["http://127.0.0.1:5000/"]}},
+    )
+    yield calls, services
+
+
+def test_mirror_up(tmp_path, docker):
+    calls, _ = docker
+
+    mirror = mirror_up(tmp_path)
+
+    ((image, name, kwargs),) = calls["run"]
+    assert (image, name) == ("registry:2", "wusa-mirror")
+    assert kwargs["ports"] == {"5000/tcp": ("127.0.0.1", 5000)}
+    assert kwargs["mounts"] == [f"{tmp_path / MIRROR_DIR}:/var/lib/registry"]
+    assert kwargs["environment"] == {
+        "REGISTRY_PROXY_REMOTEURL": "https://registry-1.docker.io"
+    }
+    assert read_mirror(tmp_path) == mirror
+    assert mirror_environment(tmp_path) == {"WUSA_REGISTRY_MIRROR": "127.0.0.1:5000"}
+
+
+def test_mirror_up_keeps_running_mirror(tmp_path, docker):
+    calls, _ = docker
+
+    first = mirror_up(tmp_path)
+    assert mirror_up(tmp_path) == first
+    assert len(calls["run"]) == 1
+
+    # a mirror with other settings replaces the running one
+    mirror_up(tmp_path, port=5001)
+    assert len(calls["run"]) == 2
+    assert len(calls["stop"]) == 1
+    assert read_mirror(tmp_path).port == 5001
+
+
+def test_mirror_down(tmp_path, docker):
+    _, services = docker
+    mirror_up(tmp_path)
+    (tmp_path / MIRROR_DIR / "blob").write_bytes(b"x" * 100)
+
+    assert mirror_down(tmp_path)
+    assert services == {}
+    assert read_mirror(tmp_path) is None
+    assert mirror_environment(tmp_path) == {}
+    # the cache is kept for the next mirror unless it is purged
+    assert (tmp_path / MIRROR_DIR / "blob").exists()
+
+    assert not mirror_down(tmp_path, purge=True)
+    assert not (tmp_path / MIRROR_DIR).exists()
+
+
+def test_mirror_status(tmp_path, docker):
+    mirror_up(tmp_path)
+    (tmp_path / MIRROR_DIR / "blob").write_bytes(b"x" * 100)
+
+    status = mirror_status(tmp_path)
+
+    assert status.state == "running"
+    assert status.cache_size == 100
+    assert status.daemon_uses_mirror
+
+    write_mirror(tmp_path, Mirror(5001, "https://registry-1.docker.io", 0.0))
+    assert not mirror_status(tmp_path).daemon_uses_mirror
+
+
+def test_mirror_status_without_mirror(tmp_path, docker):
+    status = mirror_status(tmp_path)
+
+    assert status.mirror is None
+    assert status.state == ""
+    assert status.cache_size == 0
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+import io
+import json
+
+from pytest import mark
+from rich.console import Console
+
+from wusa.output import OutputFormat
+from wusa.output import print_timings
+from wusa.output import runner_records
+from wusa.output import stream_runners
+from wusa.output import write_records
+from wusa.runners import Runner
+from wusa.tracing import Tracer
+
+FIELDS = ["name", "repo", "status", "labels"]
+
+
+def records():
+    runners = [
+        Runner("wusa-a", "some/repo", "online", ["gpu", "linux"]),
+        Runner("wusa-b", "some/repo", "", []),
+    ]
+    return runner_records(runners, FIELDS)
+
+
+def test_write_records_ndjson():
+    fp = io.StringIO()
+    write_records(records(), OutputFormat.ndjson, FIELDS, fp)
+
+    lines = fp.getvalue().splitlines()
+    assert [json.loads(line)["name"] for line in lines] == ["wusa-a", "wusa-b"]
+    assert json.loads(lines[0])["labels"] == ["gpu", "linux"]
+
+
+@mark.parametrize("count", [0, 2])
+def test_write_records_json(count):
+    fp = io.StringIO()
+    write_records(list(records())[:count], OutputFormat.json, FIELDS, fp)
+
+    assert len(json.loads(fp.getvalue())) == count
+
+
+def test_write_records_csv():
+    fp = io.StringIO()
+    write_records(records(), OutputFormat.csv, FIELDS, fp)
+
+    assert fp.getvalue().splitlines() == [
+        "name,repo,status,labels",
+        'wusa-a,some/repo,online,"gpu,linux"',
+        "wusa-b,some/repo,,",
+    ]
+
+
+def test_write_records_streams_every_record():
+    fp = io.StringIO()
+    written = []
+
+    def slow_records():
+        for record in records():
+            yield record
+            # the record is written before the next one is produced
+            written.append(fp.getvalue().count("\n"))
+
+    write_records(slow_records(), OutputFormat.ndjson, FIELDS, fp)
+    assert written == [1, 2]
+
+
+def test_stream_runners_prints_every_row_once(monkeypatch):
+    fp = io.StringIO()
+    console = Console(file=fp, force_terminal=True, height=10, width=100)
+    monkeypatch.setattr("wusa.output.CONSOLE", console)
+    runners = [Runner(f"r{i:03}", "some/repo", "online", ["gpu"]) for i in range(40)]
+
+    stream_runners(runners)
+
+    output = fp.getvalue()
+    assert output.count("Runner name") == 1
+    assert all(output.count(f"r{i:03}") == 1 for i in range(40))
+
+
+def test_stream_runners_without_terminal(monkeypatch):
+    fp = io.StringIO()
+    monkeypatch.setattr("wusa.output.CONSOLE", Console(file=fp, width=100))
+
+    stream_runners(Runner(f"r{i:03}", "some/repo", "", []) for i in range(3))
+
+    output = fp.getvalue()
+    assert output.count("Runner name") == 1
+    assert [output.count(f"r{i:03}") for i in range(3)] == [1, 1, 1]
+
+
+def test_print_timings_with_counts(monkeypatch):
+    fp = io.StringIO()
+    monkeypatch.setattr("wusa.output.ERROR_CONSOLE", Console(file=fp, width=100))
+    tracer = Tracer()
+    tracer.enabled = True
+    with tracer.span("wusa create"):
+        for _ in range(2):
+            with tracer.span("docker run"):
+                pass
+
+    print_timings(tracer, {"docker API calls": 7})
+
+    output = fp.getvalue()
+    assert "wusa create" in output
+    assert "docker run" in output and "(2 times)" in output
+    assert "docker API calls 7" in output
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+import os
+
+from pytest import raises
+
+from wusa.exceptions import PlacementError
+from wusa.placement import ResourceLimits
+from wusa.placement import format_cpulist
+from wusa.placement import parse_cpulist
+from wusa.placement import place_cpuset
+from wusa.placement import read_topology
+
+
+def test_parse_and_format_cpulist():
+    assert parse_cpulist("0-3,8,10-11\n") == [0, 1, 2, 3, 8, 10, 11]
+    assert parse_cpulist("") == []
+    assert format_cpulist([11, 0, 1, 2, 3, 8, 10]) == "0-3,8,10-11"
+    assert format_cpulist([]) == ""
+
+
+def test_ResourceLimits_docker_kwargs():
+    assert ResourceLimits().docker_kwargs() == {}
+    assert ResourceLimits(1.5, "0-1", "4g", 512).docker_kwargs() == {
+        "nano_cpus": 1_500_000_000,
+        "cpuset_cpus": "0-1",
+        "mem_limit": "4g",
+        "pids_limit": 512,
+    }
+
+
+def test_read_topology(tmp_path, monkeypatch):
+    monkeypatch.setattr(os, "sched_getaffinity", lambda pid: set(range(7)))
+    for node, cpulist in [(0, "0-3"), (1, "4-7")]:
+        (tmp_path / f"node{node}").mkdir()
+        (tmp_path / f"node{node}" / "cpulist").write_text(cpulist)
+
+    # CPUs which are not usable by wusa are skipped
+    assert read_topology(tmp_path) == {0: [0, 1, 2, 3], 1: [4, 5, 6]}
+    assert read_topology(tmp_path / "missing") == {0: list(range(7))}
+
+
+def test_place_cpuset_spreads_across_nodes():
+    topology = {0: [0, 1, 2, 3], 1: [4, 5, 6, 7]}
+    used = set()
+
+    placed = []
+    for _ in range(4):
+        cpuset = place_cpuset(2, used, topology)
+        used.update(parse_cpulist(cpuset))
+        placed.append(cpuset)
+
+    assert placed == ["0-1", "4-5", "2-3", "6-7"]
+    with raises(PlacementError, match="Not enough free CPUs"):
+        place_cpuset(1, used, topology)
+
+
+def test_place_cpuset_splits_if_no_node_fits():
+    topology = {0: [0, 1, 2, 3], 1: [4, 5, 6, 7]}
+
+    assert place_cpuset(3, {0, 1, 4, 5, 6}, topology) == "2-3,7"
@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+import json
+
+from pytest import fixture
+
+from wusa.exceptions import DockerError
+from wusa.pool import STANDBY
+from wusa.pool import WarmPool
+from wusa.runners import Runner
+from wusa.runners import RunnersList
+
+
+class DummyProgress:
+    def update(self, index, message):
+        pass
+
+    def done(self, index, message):
+        pass
+
+    def failed(self, index, message):
+        pass
+
+
+@fixture(name="base_dir")
+def _base_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr("wusa.runners.WUSA_BASE_DIR", tmp_path)
+    runners = [
+        Runner("wusa-standby0", "some/repo", STANDBY, ["gpu"]),
+        Runner("wusa-standby1", "some/repo", STANDBY, ["gpu"]),
+        Runner("wusa-other", "some/repo", STANDBY, []),
+        Runner("wusa-busy", "some/repo", "", ["gpu"]),
+    ]
+    (tmp_path / "runners.json").write_text(json.dumps([r.as_dict() for r in runners]))
+    yield tmp_path
+
+
+@fixture(name="resumed")
+def _resumed(monkeypatch):
+    resumed = []
+    monkeypatch.setattr(Runner, "resume", lambda r: resumed.append(r.name))
+    yield resumed
+
+
+def test_WarmPool_take_without_pool(base_dir, resumed):
+    pool = WarmPool(base_dir / "pool.json", RunnersList())
+
+    assert pool.take("some/repo", ["gpu"]) == []
+    assert resumed == []
+    assert not (base_dir / "pool.json").exists()
+
+
+def test_WarmPool_take_counts_hits_and_misses(base_dir, resumed):
+    runners = RunnersList()
+    pool = WarmPool(base_dir / "pool.json", runners)
+    pool.configure("some/repo", ["gpu"], size=2)
+
+    (taken,) = pool.take("some/repo", ["gpu"])
+    assert taken.name == "wusa-standby0"
+    assert resumed == ["wusa-standby0"]
+    assert RunnersList().get("wusa-standby0").status == ""
+
+    assert [r.name for r in pool.take("some/repo", ["gpu"], count=3)] == [
+        "wusa-standby1"
+    ]
+    config = pool.config("some/repo", ["gpu"])
+    assert (config.hits, config.misses) == (2, 2)
+    # standby runner of another label set is kept
+    assert RunnersList().get("wusa-other").status == STANDBY
+
+
+def test_WarmPool_take_only_runners_of_image_mode(base_dir, resumed):
+    runners = RunnersList()
+    shared = Runner("wusa-shared", "some/repo", STANDBY, ["gpu"], image="base:1")
+    runners.add([shared])
+    pool = WarmPool(base_dir / "pool.json", runners)
+    pool.configure("some/repo", ["gpu"], size=2, shared_image=True)
+
+    # runners with their own image are not handed out for a shared image
+    assert [r.name for r in pool.take("some/repo", ["gpu"], 2, True)] == ["wusa-shared"]
+    assert resumed == ["wusa-shared"]
+    # and the pool of shared images is skipped for runners with their own image
+    assert pool.take("some/repo", ["gpu"]) == []
+    config = pool.config("some/repo", ["gpu"])
+    assert (config.hits, config.misses) == (1, 1)
+
+
+def test_WarmPool_take_skips_broken_runner(base_dir, monkeypatch):
+    def fail_first(runner):
+        if runner.name == "wusa-standby0":
+            raise DockerError("gone")
+
+    monkeypatch.setattr(Runner, "resume", fail_first)
+    pool = WarmPool(base_dir / "pool.json", RunnersList())
+    pool.configure("some/repo", ["gpu"])
+
+    (taken,) = pool.take("some/repo", ["gpu"])
+    assert taken.name == "wusa-standby1"
+    assert RunnersList().get("wusa-standby0").status == "error"
+
+
+def test_WarmPool_fill(base_dir, monkeypatch):
+    calls = []
+
+    def create_new_runners(self, repo, token, count, progress, **kwargs):
+        calls.append((repo, token, count, kwargs))
+        return [], {}
+
+    monkeypatch.setattr("wusa.pool.get_runner_token", lambda repo, kind: "token")
+    monkeypatch.setattr(RunnersList, "create_new_runners", create_new_runners)
+    pool = WarmPool(base_dir / "pool.json", RunnersList())
+
+    # nothing to fill without pool or if pool is full
+    pool.fill("some/repo", ["gpu"], DummyProgress())
+    pool.configure("some/repo", ["gpu"], size=2)
+    pool.fill("some/repo", ["gpu"], DummyProgress())
+    assert calls == []
+
+    pool.configure("some/repo", ["gpu"], size=5, paused=False)
+    pool.fill("some/repo", ["gpu"], DummyProgress())
+    ((repo, token, count, kwargs),) = calls
+    assert (repo, token, count) == ("some/repo", "token", 3)
+    assert kwargs["status"] == STANDBY
+    assert kwargs["pause"] is False
+    assert kwargs["labels"] == ["gpu"]
+
+
+def test_WarmPool_status(base_dir, resumed):
+    pool = WarmPool(base_dir / "pool.json", RunnersList())
+    pool.configure("some/repo", ["gpu"], size=3)
+    pool.configure("some/repo", [], size=1)
+    pool.take("some/repo", ["gpu"])
+
+    by_labels = {tuple(s.labels): s for s in pool.status()}
+    assert by_labels[("gpu",)].standby == 1
+    assert by_labels[("gpu",)].hits == 1
+    assert by_labels[()].standby == 1
+    assert by_labels[()].size == 1
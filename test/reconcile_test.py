@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+import os
+
+from pytest import fixture
+
+from wusa.exceptions import DockerError
+from wusa.reconcile import CONTAINER
+from wusa.reconcile import IMAGE
+from wusa.reconcile import REGISTRATION
+from wusa.reconcile import WORKDIR
+from wusa.reconcile import Inventory
+from wusa.reconcile import Orphan
+from wusa.reconcile import find_orphans
+from wusa.reconcile import remove_orphans
+from wusa.reconcile import take_inventory
+from wusa.runners import host_label
+
+HOST = "wusa-host-0123456789ab"
+
+
+class SparseContainer:
+    name = None
+
+    def __init__(self, name, created):
+        self.attrs = {"Labels": {"org.wusa.container-name": name}, "Created": created}
+
+
+class FakeImage:
+    def __init__(self, tags, created):
+        self.tags = tags
+        self.attrs = {"Created": created}
+
+
+class Progress:
+    def __init__(self):
+        self.succeeded = []
+        self.failures = []
+
+    def update(self, index, message):
+        pass
+
+    def done(self, index, message):
+        self.succeeded.append(index)
+
+    def failed(self, index, message):
+        self.failures.append(index)
+
+
+@fixture(name="inventory")
+def _inventory(tmp_path):
+    yield Inventory(
+        containers={"wusa-a": ("a", 3600.0), "wusa-new": ("new", 5.0)},
+        images={"wusa-a": 3600.0, "wusa-b": 3600.0, "wusa-c": 3600.0},
+        workdirs={"wusa-b": (tmp_path / "wusa-b", 3600.0)},
+        registrations={
+            ("some/repo", "wusa-a"): (1, "offline", [HOST]),
+            ("some/repo", "wusa-b"): (2, "online", [HOST]),
+            ("some/repo", "wusa-c"): (3, "offline", [HOST]),
+            ("some/repo", "wusa-d"): (4, "offline", ["gpu", HOST]),
+            ("some/repo", "other-runner"): (5, "offline", [HOST]),
+            ("other/repo", "wusa-d"): (6, "offline", [HOST]),
+            ("some/repo", "wusa-e"): (7, "offline", ["wusa-host-other"]),
+            ("some/repo", "wusa-f"): (8, "offline", []),
+        },
+    )
+
+
+def test_find_orphans(inventory):
+    orphans = find_orphans(inventory, {"wusa-c"}, min_age=60.0, host=HOST)
+
+    assert [(o.kind, o.name) for o in orphans] == [
+        (CONTAINER, "wusa-a"),
+        (IMAGE, "wusa-a"),
+        (IMAGE, "wusa-b"),
+        (WORKDIR, "wusa-b"),
+        (REGISTRATION, "wusa-d"),
+        (REGISTRATION, "wusa-d"),
+    ]
+    # runners of several repositories may have the same name
+    assert orphans[-2:] == [
+        Orphan(REGISTRATION, "wusa-d", 6, "other/repo"),
+        Orphan(REGISTRATION, "wusa-d", 4, "some/repo"),
+    ]
+
+
+def test_find_orphans_keeps_registrations_without_host(inventory):
+    orphans = find_orphans(inventory, {"wusa-c"}, min_age=60.0)
+
+    assert REGISTRATION not in {o.kind for o in orphans}
+
+
+def test_host_label(tmp_path):
+    label = host_label(tmp_path)
+
+    assert label.startswith("wusa-host-") and len(label) == 22
+    assert host_label(tmp_path) == label
+    assert host_label(tmp_path / "other") != label
+
+
+def test_find_orphans_without_containers(inventory):
+    inventory.containers = {}
+    inventory.failures[CONTAINER] = DockerError("no listing")
+
+    orphans = find_orphans(inventory, {"wusa-c"}, min_age=60.0, host=HOST)
+
+    # any registration could still have a container
+    assert REGISTRATION not in {o.kind for o in orphans}
+
+
+def test_take_inventory(tmp_path, monkeypatch):
+    (tmp_path / "wusa-b").mkdir()
+    os.utime(tmp_path / "wusa-b", (0, 0))
+    listings = []
+
+    def list_images(reference):
+        listings.append(reference)
+        return [FakeImage(["wusa-a:latest", "other:latest"], 0), FakeImage([], 0)]
+
+    def iter_many(apis, key, concurrency):
+        labels = [{"id": 1, "name": HOST}]
+        yield "some/repo", {
+            "name": "wusa-a",
+            "id": 1,
+            "status": "offline",
+            "labels": labels,
+        }
+        yield "other/repo", {
+            "name": "wusa-a",
+            "id": 2,
+            "status": "online",
+            "labels": [],
+        }
+
+    monkeypatch.setattr(
+        "wusa.reconcile.wusa_docker_list_containers",
+        lambda sparse: [SparseContainer("wusa-a", 0)],
+    )
+    monkeypatch.setattr("wusa.reconcile.wusa_docker_list_images", list_images)
+    monkeypatch.setattr("wusa.gh.iter_gh_api_many", iter_many)
+
+    inventory = take_inventory(tmp_path, ["some/repo", "other/repo"])
+
+    assert listings == ["wusa-*"]
+    assert inventory.failures == {}
+    assert list(inventory.containers) == ["wusa-a"]
+    assert list(inventory.images) == ["wusa-a"]
+    assert list(inventory.workdirs) == ["wusa-b"]
+    assert inventory.workdirs["wusa-b"][1] > 0
+    assert inventory.registrations == {
+        ("some/repo", "wusa-a"): (1, "offline", [HOST]),
+        ("other/repo", "wusa-a"): (2, "online", []),
+    }
+
+
+def test_take_inventory_without_docker(tmp_path, monkeypatch):
+    def no_docker(*args, **kwargs):
+        raise DockerError("no docker")
+
+    monkeypatch.setattr("wusa.reconcile.wusa_docker_list_containers", no_docker)
+    monkeypatch.setattr("wusa.reconcile.wusa_docker_list_images", no_docker)
+
+    inventory = take_inventory(tmp_path / "missing", [])
+
+    assert sorted(inventory.failures) == [CONTAINER, IMAGE]
+    assert inventory.workdirs == {}
+
+
+def test_remove_orphans(tmp_path, monkeypatch):
+    (tmp_path / "wusa-b").mkdir()
+    removed = []
+
+    def stop(container):
+        # images are only removed once their containers are gone
+        assert not any(kind == IMAGE for kind, _ in removed)
+        removed.append((CONTAINER, container))
+
+    def batch(requests, concurrency):
+        return [{} if r.api.endswith("/4") else DockerError("failed") for r in requests]
+
+    monkeypatch.setattr("wusa.reconcile.wusa_docker_container_stop", stop)
+    monkeypatch.setattr(
+        "wusa.reconcile.wusa_docker_remove_image",
+        lambda name: removed.append((IMAGE, name)),
+    )
+    monkeypatch.setattr("wusa.gh.batch_gh_api", batch)
+    orphans = [
+        Orphan(IMAGE, "wusa-a", "wusa-a"),
+        Orphan(CONTAINER, "wusa-a", "a"),
+        Orphan(WORKDIR, "wusa-b", tmp_path / "wusa-b"),
+        Orphan(REGISTRATION, "wusa-d", 4, "some/repo"),
+        Orphan(REGISTRATION, "wusa-e", 5, "some/repo"),
+    ]
+    progress = Progress()
+
+    failures = remove_orphans(orphans, progress)
+
+    assert removed == [(CONTAINER, "a"), (IMAGE, "wusa-a")]
+    assert not (tmp_path / "wusa-b").exists()
+    assert list(failures) == [orphans[4]]
+    assert sorted(progress.succeeded) == [0, 1, 2, 3]
+    assert progress.failures == [4]
@@ -1,13 +1,22 @@
 # -*- coding: utf-8 -*-
 import json
+from pathlib import Path
 from string import ascii_lowercase
 
 from pytest import fixture
+from pytest import raises
 
+from wusa.exceptions import ContainerExited
+from wusa.exceptions import InvalidRunnerName
+from wusa.placement import ResourceLimits
+from wusa.placement import place_cpuset
+from wusa.runners import BASE_IMAGE
 from wusa.runners import Runner
 from wusa.runners import Runners
 from wusa.runners import RunnersList
-from wusa.runners import open_runner_file
+from wusa.runners import read_reservations
+from wusa.runners import write_reservations
+from wusa.state import JSONRunnerStore
 
 
 def test_Runner_init():
@@ -45,6 +54,8 @@ def _mock_wusa_basedir(tmp_path, monkeypatch):
     new_basedir = tmp_path / "wusa-new-basedir"
     new_basedir.mkdir(parents=True, exist_ok=True)
     monkeypatch.setattr("wusa.runners.WUSA_BASE_DIR", new_basedir)
+    # working directories of runners are not below the base directory
+    monkeypatch.setattr("wusa.runners.WUSA_RUNNER_DIR", tmp_path / "runners")
     yield new_basedir
 
 
@@ -56,16 +67,6 @@ def _mock_runners_json(mocked_wusa_base_dir):
     yield runner_file
 
 
-def test_open_runner_file(mocked_wusa_base_dir):
-    runner_file = mocked_wusa_base_dir / "runners.json"
-
-    with open_runner_file("w") as fp:
-        fp.write("something")
-
-    assert runner_file.exists()
-    assert runner_file.read_text() == "something"
-
-
 def test_RunnerList_no_runners(mocked_runners_json):
     assert len(Runners) == 0
 
@@ -99,13 +100,15 @@ def test_RunnerList_new_check_run_call_args(mocked_runners_json, monkeypatch):
     def do_nothing_and_return_None(*args, **kwargs):
         return None
 
-    def check_args(command, image, name):
+    def check_args(command, image, name, quiet=False, check=False):
+        assert check
         # keep space for checking for surrounded space
         assert " --unattended " in command
         assert " --url https://github.com/some/repo " in command
         assert " --name wusa-" in command
         assert " --replace " in command
         assert " --token abcdeftoken " in command
+        assert " --labels some-more,some_label,wusa-host-" in command
         assert image == "wusarunner/base-linux:latest"
         assert name.startswith("wusa-")
 
@@ -116,6 +119,305 @@ def test_RunnerList_new_check_run_call_args(mocked_runners_json, monkeypatch):
     Runners.create_new_runner("some/repo", "abcdeftoken", ["some_label", "some-more"])
 
 
+def test_RunnerList_new_retries_with_fresh_token(mocked_runners_json, monkeypatch):
+    commands = []
+    invalidated = []
+
+    def reject_cached_token(command, image, name, **kwargs):
+        commands.append(command)
+        if "--token cached" in command:
+            raise ContainerExited(f"Container '{name}' exited with code 1")
+
+    monkeypatch.setattr("wusa.runners.wusa_docker_run", reject_cached_token)
+    monkeypatch.setattr("wusa.runners.wusa_docker_remove", lambda container: None)
+    monkeypatch.setattr("wusa.runners.wusa_docker_commit", lambda *args: None)
+    monkeypatch.setattr(
+        "wusa.tokens.invalidate_runner_token",
+        lambda repo, kind: invalidated.append((repo, kind)),
+    )
+    monkeypatch.setattr("wusa.tokens.get_runner_token", lambda repo, kind: "fresh")
+
+    runner = Runners.create_new_runner("some/repo", "cached")
+
+    assert invalidated == [("some/repo", "registration")]
+    assert [" --token fresh " in command for command in commands] == [False, True]
+    assert f" --name {runner.name} " in commands[-1]
+    assert Runners.get(runner.name) == runner
+
+    commands.clear()
+    monkeypatch.setattr("wusa.tokens.get_runner_token", lambda repo, kind: "cached")
+    with raises(ContainerExited):
+        Runners.create_new_runner("some/repo", "cached")
+    assert len(commands) == 2
+
+
+@fixture(name="stored_runners")
+def _stored_runners(mocked_runners_json):
+    entries = [
+        Runner(f"wusa-runner{i}", "some/repo", "", ["label"]).as_dict()
+        for i in range(3)
+    ]
+    mocked_runners_json.write_text(json.dumps(entries))
+    yield mocked_runners_json
+
+
+def test_RunnerList_reads_file_once(stored_runners, monkeypatch):
+    loads_called = []
+    original_loads = json.loads
+
+    def counting_loads(*args, **kwargs):
+        loads_called.append(True)
+        return original_loads(*args, **kwargs)
+
+    monkeypatch.setattr("wusa.state.loads", counting_loads)
+    runners = RunnersList()
+
+    assert [r.name for r in runners] == [f"wusa-runner{i}" for i in range(3)]
+    assert len(runners) == 3
+    assert runners[1].name == "wusa-runner1"
+    assert len(loads_called) == 1
+
+
+def test_RunnerList_invalidated_by_file_change(stored_runners):
+    runners = RunnersList()
+    assert len(runners) == 3
+
+    stored_runners.write_text(json.dumps([]))
+    assert len(runners) == 0
+
+
+def test_RunnerList_write_after_concurrent_write(stored_runners, monkeypatch):
+    runners = RunnersList()
+    assert len(runners) == 3
+    original_apply = JSONRunnerStore.apply
+
+    def apply_after_other_process(self, upserts, removals):
+        # another process writes after the version was checked
+        other = JSONRunnerStore(stored_runners)
+        original_apply(other, [Runner("wusa-other", "some/repo", "").as_dict()], [])
+        return original_apply(self, upserts, removals)
+
+    monkeypatch.setattr("wusa.state.JSONRunnerStore.apply", apply_after_other_process)
+    runners.add([Runner("wusa-new", "some/repo", "")])
+
+    assert [r.name for r in runners][-2:] == ["wusa-other", "wusa-new"]
+
+
+def test_RunnerList_get(stored_runners):
+    runners = RunnersList()
+
+    assert runners.get("wusa-runner2").name == "wusa-runner2"
+    assert "wusa-runner0" in runners
+    assert "wusa-unknown" not in runners
+    with raises(InvalidRunnerName, match="No runner with name 'wusa-unknown'"):
+        runners.get("wusa-unknown")
+
+
+def test_RunnerList_skips_unchanged_write(stored_runners, monkeypatch):
+    runners = RunnersList()
+    current = list(runners)
+
+    def fail_apply(*args, **kwargs):
+        raise AssertionError("runner file should not be written")
+
+    monkeypatch.setattr("wusa.state.JSONRunnerStore.apply", fail_apply)
+    runners._runners = current
+
+
+def test_RunnerList_remove(stored_runners, monkeypatch):
+    cleaned_up = []
+    monkeypatch.setattr(Runner, "cleanup", lambda r: cleaned_up.append(r.name))
+    runners = RunnersList()
+
+    runners.remove("wusa-runner1")
+    assert cleaned_up == ["wusa-runner1"]
+    assert [r.name for r in runners] == ["wusa-runner0", "wusa-runner2"]
+    assert [e["name"] for e in json.loads(stored_runners.read_text())] == [
+        "wusa-runner0",
+        "wusa-runner2",
+    ]
+
+
+def test_RunnerList_new_shared_image(mocked_runners_json, monkeypatch):
+    calls = []
+
+    def record_run(command, image, name, mounts=[], quiet=False, check=False):
+        calls.append((command, image, name, mounts))
+
+    def fail_commit(*args, **kwargs):
+        raise AssertionError("no image should be committed")
+
+    monkeypatch.setattr("wusa.runners.wusa_docker_run", record_run)
+    monkeypatch.setattr("wusa.runners.wusa_docker_remove", lambda container: None)
+    monkeypatch.setattr("wusa.runners.wusa_docker_commit", fail_commit)
+
+    runner = Runners.create_new_runner("some/repo", "token", shared_image=True)
+
+    ((command, image, name, mounts),) = calls
+    assert image == "wusarunner/base-linux:latest"
+    files = ".runner .credentials .credentials_rsaparams"
+    assert command.endswith(f" && cp -a {files} {runner.identity_dir}/'")
+    assert mounts == [f"{runner.workdir}:{runner.workdir}"]
+    assert Runners.get(runner.name).image == "wusarunner/base-linux:latest"
+
+
+def test_Runner_up_with_shared_image(mocked_wusa_base_dir, monkeypatch):
+    calls = []
+
+    def record_run(command, image, name, **kwargs):
+        calls.append((command, image, name))
+        assert kwargs["ready"].on_log("√ Listening for Jobs")
+
+    monkeypatch.setattr("wusa.runners.wusa_docker_run", record_run)
+    runner = Runner("wusa-shared", "some/repo", "", image="some/image:latest")
+    runner.up()
+    Runner("wusa-committed", "some/repo", "").up()
+
+    assert calls == [
+        (
+            f"bash -c 'cp -a {runner.identity_dir}/. ./ && ./run.sh'",
+            "some/image:latest",
+            "wusa-shared",
+        ),
+        ("bash -c './run.sh'", "wusa-committed", "wusa-committed"),
+    ]
+
+    event_log = mocked_wusa_base_dir / "events.jsonl"
+    records = [json.loads(line) for line in event_log.read_text().splitlines()]
+    assert [r["kind"] for r in records] == ["startup", "startup"]
+    assert [r["name"] for r in records] == ["wusa-shared", "wusa-committed"]
+    assert records[0]["image"] == "some/image:latest"
+
+
+def test_Runner_up_mounts_shared_caches(mocked_wusa_base_dir, tmp_path, monkeypatch):
+    calls = []
+
+    def record_run(command, image, name, mounts, environment, **kwargs):
+        calls.append((mounts, environment))
+
+    cache_dir = tmp_path / "cache"
+    monkeypatch.setattr("wusa.runners.wusa_docker_run", record_run)
+    monkeypatch.setattr("wusa.runners.WUSA_RUNNER_DIR", tmp_path / "runners")
+    monkeypatch.setattr("wusa.toolcache.cache_root", lambda base_dir: cache_dir)
+    monkeypatch.setenv("WUSA_CACHE_SIZE", "1g")
+    runner = Runner("wusa-cached", "some/repo", "")
+    runner.up()
+    monkeypatch.setenv("WUSA_CACHE_SIZE", "0")
+    runner.up()
+
+    # every mounted host directory is created below the test directory
+    for mount in calls[0][0]:
+        assert tmp_path in Path(mount.split(":")[0]).parents
+    assert calls[0][0] == [
+        f"{runner.workdir}:{runner.workdir}",
+        f"{cache_dir / 'tool-cache'}:/opt/hostedtoolcache",
+        f"{cache_dir / 'action-cache'}:/opt/actionarchivecache",
+        f"{cache_dir / 'hooks'}:/opt/wusa-hooks:ro",
+    ]
+    assert calls[0][1]["RUNNER_TOOL_CACHE"] == "/opt/hostedtoolcache"
+    assert calls[1] == ([f"{runner.workdir}:{runner.workdir}"], {})
+
+
+def test_Runner_migrate_to_shared_image(mocked_wusa_base_dir, monkeypatch):
+    class Container:
+        def __init__(self, name):
+            self.name = name
+
+    calls = []
+
+    def record(name):
+        def record_call(*args, **kwargs):
+            calls.append((name,) + args)
+            return Container(args[2]) if name == "run" else None
+
+        return record_call
+
+    monkeypatch.setattr("wusa.runners.wusa_docker_run", record("run"))
+    monkeypatch.setattr("wusa.runners.wusa_docker_container_stop", record("stop"))
+    monkeypatch.setattr("wusa.runners.wusa_docker_remove_image", record("rmi"))
+    monkeypatch.setattr(
+        "wusa.runners.wusa_docker_list_containers",
+        lambda name: [Container("wusa-migrate"), Container("wusa-migrate-other")],
+    )
+    monkeypatch.setattr(Runner, "up", record("up"))
+
+    runner = Runner("wusa-migrate", "some/repo", "")
+    runner.migrate_to_shared_image()
+
+    assert runner.image == "wusarunner/base-linux:latest"
+    assert [call[0] for call in calls] == ["run", "stop", "stop", "up", "rmi"]
+    assert calls[0][2:] == ("wusa-migrate", "wusa-migrate-migration")
+    assert calls[2][1].name == "wusa-migrate"
+    assert calls[-1][1:] == ("wusa-migrate",)
+
+
+class DummyProgress:
+    def __init__(self):
+        self.messages = []
+
+    def update(self, index, message):
+        self.messages.append((index, "update", message))
+
+    def done(self, index, message):
+        self.messages.append((index, "done", message))
+
+    def failed(self, index, message):
+        self.messages.append((index, "failed", message))
+
+
+def test_RunnerList_create_new_runners(mocked_runners_json, monkeypatch):
+    def do_nothing_and_return_None(*args, **kwargs):
+        return None
+
+    started = []
+
+    def fail_second_startup(runner, quiet=False):
+        started.append(runner.name)
+        if len(started) == 2:
+            raise RuntimeError("startup failed")
+
+    monkeypatch.setattr("wusa.runners.wusa_docker_run", do_nothing_and_return_None)
+    monkeypatch.setattr("wusa.runners.wusa_docker_remove", do_nothing_and_return_None)
+    monkeypatch.setattr("wusa.runners.wusa_docker_commit", do_nothing_and_return_None)
+    monkeypatch.setattr(Runner, "up", fail_second_startup)
+
+    progress = DummyProgress()
+    new_runners, failures = Runners.create_new_runners(
+        "some/repo", "abcdef-token", 3, progress, max_workers=1
+    )
+
+    # configured runners are stored even if their startup failed
+    assert len(new_runners) == 3
+    assert len(Runners) == 3
+    assert list(failures) == [1]
+    assert (1, "failed", "startup failed") in progress.messages
+    assert sum(kind == "done" for _, kind, _ in progress.messages) == 2
+
+
+def test_RunnerList_create_new_runners_writes_once(mocked_runners_json, monkeypatch):
+    def do_nothing_and_return_None(*args, **kwargs):
+        return None
+
+    monkeypatch.setattr("wusa.runners.wusa_docker_run", do_nothing_and_return_None)
+    monkeypatch.setattr("wusa.runners.wusa_docker_remove", do_nothing_and_return_None)
+    monkeypatch.setattr("wusa.runners.wusa_docker_commit", do_nothing_and_return_None)
+    monkeypatch.setattr(Runner, "up", do_nothing_and_return_None)
+
+    writes = []
+    original_setter = RunnersList._runners.fset
+
+    def count_writes(self, runners):
+        writes.append(len(runners))
+        original_setter(self, runners)
+
+    monkeypatch.setattr(
+        RunnersList, "_runners", RunnersList._runners.setter(count_writes)
+    )
+
+    Runners.create_new_runners("some/repo", "token", 5, DummyProgress())
+    assert writes == [5]
+
+
 def test_RunnerList_iteration(monkeypatch):
     # patch internal representation of runners and replace by list of str
     monkeypatch.setattr(RunnersList, "_runners", ["a", "b", "c"])
@@ -125,3 +427,98 @@ def test_RunnerList_iteration(monkeypatch):
     assert len(expected_value) == len(RunnersList())
     for i, content in enumerate(RunnersList()):
         assert content == expected_value[i]
+
+
+def test_RunnerList_remove_many(stored_runners, monkeypatch):
+    def fail_runner1(runner):
+        if runner.name == "wusa-runner1":
+            raise RuntimeError("cleanup failed")
+
+    monkeypatch.setattr(Runner, "cleanup", fail_runner1)
+    writes = []
+    original_apply = JSONRunnerStore.apply
+
+    def count_apply(self, upserts, removals):
+        writes.append(removals)
+        return original_apply(self, upserts, removals)
+
+    monkeypatch.setattr(JSONRunnerStore, "apply", count_apply)
+    runners = RunnersList()
+    progress = DummyProgress()
+
+    names = ["wusa-runner0", "wusa-runner1", "wusa-unknown", "wusa-runner2"]
+    removed, failures = runners.remove_many(names, progress, max_workers=2)
+
+    assert removed == ["wusa-runner0", "wusa-runner2"]
+    assert sorted(failures) == ["wusa-runner1", "wusa-unknown"]
+    assert isinstance(failures["wusa-unknown"], InvalidRunnerName)
+    assert [r.name for r in runners] == ["wusa-runner1"]
+    assert writes == [["wusa-runner0", "wusa-runner2"]]
+    assert sum(kind == "done" for _, kind, _ in progress.messages) == 2
+
+
+def test_RunnerList_create_new_runners_places_cpus(stored_runners, monkeypatch):
+    monkeypatch.setattr("wusa.runners.wusa_docker_run", lambda *a, **kw: None)
+    monkeypatch.setattr("wusa.runners.wusa_docker_remove", lambda *a, **kw: None)
+    monkeypatch.setattr("wusa.runners.wusa_docker_commit", lambda *a, **kw: None)
+    monkeypatch.setattr(Runner, "up", lambda *a, **kw: None)
+    topology = {0: [0, 1, 2, 3], 1: [4, 5, 6, 7]}
+    monkeypatch.setattr(
+        "wusa.runners.place_cpuset",
+        lambda cores, used: place_cpuset(cores, used, topology),
+    )
+    runners = RunnersList()
+    old_runner = runners.get("wusa-runner0")
+    old_runner.limits = ResourceLimits(cpuset="0-1")
+    runners.update([old_runner])
+
+    new_runners, _ = runners.create_new_runners(
+        "some/repo",
+        "token",
+        3,
+        DummyProgress(),
+        limits=ResourceLimits(memory="2g"),
+        place_cores=2,
+    )
+
+    assert [r.limits.cpuset for r in new_runners] == ["4-5", "2-3", "6-7"]
+    assert all(r.limits.cpus == 2.0 for r in new_runners)
+    assert all(r.limits.memory == "2g" for r in new_runners)
+    # limits are stored with the runner
+    assert RunnersList().get(new_runners[0].name).limits == new_runners[0].limits
+
+
+def test_RunnerList_reserve_keeps_cpus_of_concurrent_creates(
+    stored_runners, monkeypatch
+):
+    topology = {0: [0, 1, 2, 3], 1: [4, 5, 6, 7]}
+    monkeypatch.setattr(
+        "wusa.runners.place_cpuset",
+        lambda cores, used: place_cpuset(cores, used, topology),
+    )
+    # reservation of a process which exited meanwhile
+    stale = {"stale": {"pid": 2**22 + 1, "cpus": [4, 5, 6, 7]}}
+    write_reservations(stored_runners.parent, stale)
+
+    with RunnersList().reserve(1, ResourceLimits(), 2) as (first,):
+        # e.g. another 'wusa create --place' while the first one is provisioning
+        with RunnersList().reserve(2, ResourceLimits(), 2) as others:
+            cpusets = [first.cpuset] + [limits.cpuset for limits in others]
+
+    assert cpusets == ["0-1", "4-5", "2-3"]
+    assert read_reservations(stored_runners.parent) == {}
+
+
+def test_RunnerList_new_uses_pinned_image(mocked_runners_json, monkeypatch):
+    images = []
+    monkeypatch.setattr(
+        "wusa.runners.wusa_docker_run", lambda c, image, n, **kw: images.append(image)
+    )
+    monkeypatch.setattr("wusa.runners.wusa_docker_remove", lambda *a, **kw: None)
+    monkeypatch.setattr("wusa.runners.wusa_docker_commit", lambda *a, **kw: None)
+    pinned = {"image": BASE_IMAGE, "digest": "sha256:abc", "pulled": 0.0}
+    (mocked_runners_json.parent / "image.json").write_text(json.dumps(pinned))
+
+    runner = Runners.create_new_runner("some/repo", "token", shared_image=True)
+    assert images == ["wusarunner/base-linux@sha256:abc"]
+    assert runner.image == "wusarunner/base-linux@sha256:abc"
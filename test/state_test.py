@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+import json
+
+from pytest import fixture
+from pytest import raises
+
+from wusa.exceptions import RunnerFileIOError
+from wusa.runners import Runner
+from wusa.runners import RunnersList
+from wusa.state import JSONRunnerStore
+from wusa.state import SQLiteRunnerStore
+from wusa.state import open_runner_store
+from wusa.state import state_backend
+
+
+def entry(name, repo="some/repo"):
+    return {"name": name, "repo": repo, "status": "", "labels": []}
+
+
+@fixture(name="base_dir")
+def _base_dir(tmp_path, monkeypatch):
+    monkeypatch.delenv("WUSA_STATE_BACKEND", raising=False)
+    monkeypatch.setattr("wusa.runners.WUSA_BASE_DIR", tmp_path)
+    yield tmp_path
+
+
+def test_state_backend_default(base_dir):
+    assert state_backend(base_dir) == "json"
+    (base_dir / "runners.db").touch()
+    assert state_backend(base_dir) == "sqlite"
+
+
+def test_state_backend_from_env(base_dir, monkeypatch):
+    monkeypatch.setenv("WUSA_STATE_BACKEND", "sqlite")
+    assert state_backend(base_dir) == "sqlite"
+
+    monkeypatch.setenv("WUSA_STATE_BACKEND", "yaml")
+    with raises(RunnerFileIOError, match="Unknown state backend 'yaml'"):
+        state_backend(base_dir)
+
+
+def test_JSONRunnerStore_keeps_concurrent_entries(base_dir):
+    first = JSONRunnerStore(base_dir / "runners.json")
+    second = JSONRunnerStore(base_dir / "runners.json")
+
+    first.apply([entry("wusa-a"), entry("wusa-b")], [])
+    second.apply([entry("wusa-c")], ["wusa-a"])
+    first.apply([dict(entry("wusa-b"), status="online")], [])
+
+    assert first.load() == [dict(entry("wusa-b"), status="online"), entry("wusa-c")]
+
+
+def test_SQLiteRunnerStore_apply(base_dir):
+    store = SQLiteRunnerStore(base_dir / "runners.db")
+
+    store.apply([entry("wusa-a"), entry("wusa-b"), entry("wusa-c")], [])
+    store.apply([dict(entry("wusa-a"), status="online")], ["wusa-b"])
+
+    assert store.load() == [dict(entry("wusa-a"), status="online"), entry("wusa-c")]
+
+
+def test_SQLiteRunnerStore_version_changes_on_foreign_commit(base_dir):
+    first = SQLiteRunnerStore(base_dir / "runners.db")
+    second = SQLiteRunnerStore(base_dir / "runners.db")
+
+    version = first.version()
+    first.apply([entry("wusa-a")], [])
+    assert first.version() == version
+
+    second.apply([entry("wusa-b")], [])
+    assert first.version() != version
+    assert [e["name"] for e in first.load()] == ["wusa-a", "wusa-b"]
+
+
+def test_SQLiteRunnerStore_uses_wal(base_dir):
+    store = SQLiteRunnerStore(base_dir / "runners.db")
+    (mode,) = store._connection.execute("PRAGMA journal_mode").fetchone()
+    assert mode == "wal"
+
+
+def test_SQLiteRunnerStore_migrates_json_once(base_dir):
+    legacy = base_dir / "runners.json"
+    legacy.write_text(json.dumps([entry("wusa-a"), entry("wusa-b")]))
+
+    store = SQLiteRunnerStore(base_dir / "runners.db", legacy_path=legacy)
+    assert [e["name"] for e in store.load()] == ["wusa-a", "wusa-b"]
+    assert not legacy.exists()
+    assert (base_dir / "runners.json.migrated").exists()
+
+    # a re-appearing legacy file is not imported again
+    legacy.write_text(json.dumps([entry("wusa-c")]))
+    store = SQLiteRunnerStore(base_dir / "runners.db", legacy_path=legacy)
+    assert [e["name"] for e in store.load()] == ["wusa-a", "wusa-b"]
+
+
+def test_open_runner_store(base_dir, monkeypatch):
+    assert isinstance(open_runner_store(base_dir), JSONRunnerStore)
+    monkeypatch.setenv("WUSA_STATE_BACKEND", "sqlite")
+    assert isinstance(open_runner_store(base_dir), SQLiteRunnerStore)
+
+
+def test_RunnersList_with_sqlite_backend(base_dir, monkeypatch):
+    monkeypatch.setenv("WUSA_STATE_BACKEND", "sqlite")
+    first = RunnersList()
+    second = RunnersList()
+
+    first.add([Runner("wusa-a", "some/repo", "")])
+    assert len(second) == 1
+    second.add([Runner("wusa-b", "other/repo", "")])
+    first.add([Runner("wusa-c", "some/repo", "")])
+
+    assert [r.name for r in first] == ["wusa-a", "wusa-b", "wusa-c"]
+    assert [r.name for r in second] == ["wusa-a", "wusa-b", "wusa-c"]
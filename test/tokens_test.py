@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+import stat
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from datetime import timedelta
+from datetime import timezone
+from time import sleep
+
+from pytest import fixture
+
+from wusa.tokens import RunnerTokenCache
+from wusa.tokens import parse_expires_at
+
+
+@fixture(name="token_api")
+def _token_api(monkeypatch):
+    calls = []
+
+    def post_gh_api(api):
+        calls.append(api)
+        sleep(0.01)
+        expires_at = datetime.now(timezone.utc) + token_api.lifetime
+        return {"token": f"token-{len(calls)}", "expires_at": expires_at.isoformat()}
+
+    token_api = type("TokenAPI", (), {"calls": calls, "lifetime": timedelta(hours=1)})
+    monkeypatch.setattr("wusa.tokens.post_gh_api", post_gh_api)
+    yield token_api
+
+
+def test_parse_expires_at():
+    expected = datetime(2020, 1, 22, 20, 13, 35, 123000, tzinfo=timezone.utc)
+    assert parse_expires_at("2020-01-22T12:13:35.123-08:00") == expected
+    assert parse_expires_at("2020-01-22T20:13:35.123Z") == expected
+
+
+def test_RunnerTokenCache_reuses_token(token_api):
+    cache = RunnerTokenCache()
+
+    assert cache.get("some/repo", "registration") == "token-1"
+    assert cache.get("some/repo", "registration") == "token-1"
+    assert cache.get("some/repo", "removal") == "token-2"
+    assert cache.get("other/repo", "registration") == "token-3"
+    assert token_api.calls == [
+        "/repos/some/repo/actions/runners/registration-token",
+        "/repos/some/repo/actions/runners/remove-token",
+        "/repos/other/repo/actions/runners/registration-token",
+    ]
+
+
+def test_RunnerTokenCache_refreshes_expiring_token(token_api):
+    cache = RunnerTokenCache(margin=timedelta(minutes=5))
+    token_api.lifetime = timedelta(minutes=4)
+
+    assert cache.get("some/repo", "registration") == "token-1"
+    assert cache.get("some/repo", "registration") == "token-2"
+
+
+def test_RunnerTokenCache_concurrent_requests(token_api):
+    cache = RunnerTokenCache()
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        tokens = list(
+            executor.map(lambda _: cache.get("some/repo", "removal"), range(16))
+        )
+
+    assert set(tokens) == {"token-1"}
+    assert len(token_api.calls) == 1
+
+
+def test_RunnerTokenCache_on_disk(token_api, tmp_path):
+    path = tmp_path / ".runner_tokens"
+
+    assert RunnerTokenCache(path).get("some/repo", "removal") == "token-1"
+    assert stat.S_IMODE(path.stat().st_mode) == 0o600
+    assert RunnerTokenCache(path).get("some/repo", "removal") == "token-1"
+    assert len(token_api.calls) == 1
+
+
+def test_RunnerTokenCache_on_disk_keeps_tokens_of_others(token_api, tmp_path):
+    path = tmp_path / ".runner_tokens"
+    first = RunnerTokenCache(path)
+    second = RunnerTokenCache(path)
+
+    assert first.get("some/repo", "removal") == "token-1"
+    assert second.get("other/repo", "removal") == "token-2"
+    first.invalidate("some/repo", "removal")
+
+    assert stat.S_IMODE(path.stat().st_mode) == 0o600
+    assert RunnerTokenCache(path).get("other/repo", "removal") == "token-2"
+    assert RunnerTokenCache(path).get("some/repo", "removal") == "token-3"
+    assert [p.name for p in tmp_path.iterdir() if p.name != ".runner_tokens.lock"] == [
+        ".runner_tokens"
+    ]
+
+
+def test_RunnerTokenCache_invalidate(token_api):
+    cache = RunnerTokenCache()
+
+    assert cache.get("some/repo", "removal") == "token-1"
+    cache.invalidate("some/repo", "removal")
+    assert cache.get("some/repo", "removal") == "token-2"
@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+import os
+from time import time
+
+from pytest import mark
+from pytest import raises
+
+from wusa.toolcache import ACTION_CACHE
+from wusa.toolcache import CACHE_LOCK
+from wusa.toolcache import TOOL_CACHE
+from wusa.toolcache import cache_entries
+from wusa.toolcache import cache_environment
+from wusa.toolcache import cache_mounts
+from wusa.toolcache import cache_size
+from wusa.toolcache import end_job
+from wusa.toolcache import parse_size
+from wusa.toolcache import prune_caches
+from wusa.toolcache import running_jobs
+from wusa.toolcache import try_lock
+
+
+def add_tool(base_dir, name, size, last_used):
+    path = base_dir / "cache" / TOOL_CACHE / name / "1.0.0" / "x64"
+    path.mkdir(parents=True)
+    (path / "bin").write_bytes(b"x" * size)
+    marker = path.with_name("x64.complete")
+    marker.touch()
+    for used in (path / "bin", path, marker):
+        os.utime(used, (last_used, last_used))
+    return path
+
+
+def add_action(base_dir, name, size, last_used):
+    path = base_dir / "cache" / ACTION_CACHE / name / "abc.tar.gz"
+    path.parent.mkdir(parents=True)
+    path.write_bytes(b"x" * size)
+    os.utime(path, (last_used, last_used))
+    return path
+
+
+@mark.parametrize(
+    "size, expected",
+    [("1024", 1024), ("2k", 2048), ("1.5g", 3 << 29), ("0", 0), (" 20G ", 20 << 30)],
+)
+def test_parse_size(size, expected):
+    assert parse_size(size) == expected
+
+
+def test_parse_size_invalid():
+    with raises(ValueError, match="Invalid size"):
+        parse_size("lots")
+
+
+def test_cache_mounts(tmp_path, monkeypatch):
+    monkeypatch.setenv("WUSA_CACHE_SIZE", "1g")
+
+    mounts = cache_mounts(tmp_path)
+
+    assert mounts == [
+        f"{tmp_path / 'cache' / TOOL_CACHE}:/opt/hostedtoolcache",
+        f"{tmp_path / 'cache' / ACTION_CACHE}:/opt/actionarchivecache",
+        f"{tmp_path / 'cache' / 'hooks'}:/opt/wusa-hooks:ro",
+    ]
+    assert (tmp_path / "cache" / TOOL_CACHE).is_dir()
+    environment = cache_environment()
+    assert environment["RUNNER_TOOL_CACHE"] == "/opt/hostedtoolcache"
+    started = environment["ACTIONS_RUNNER_HOOK_JOB_STARTED"]
+    assert started == "/opt/wusa-hooks/job-started.sh"
+    hook = tmp_path / "cache" / "hooks" / "job-started.sh"
+    assert "flock -s /opt/hostedtoolcache/.jobs/.lock" in hook.read_text()
+    assert os.access(hook, os.X_OK)
+    # the directory of the jobs is not an entry of the tool cache
+    assert cache_entries(tmp_path)[TOOL_CACHE] == []
+
+
+def test_cache_off_by_default(tmp_path, monkeypatch):
+    monkeypatch.delenv("WUSA_CACHE_SIZE", raising=False)
+
+    assert cache_size() == 0
+    assert cache_mounts(tmp_path) == []
+
+
+def test_cache_mounts_off(tmp_path, monkeypatch):
+    monkeypatch.setenv("WUSA_CACHE_SIZE", "0")
+
+    assert cache_mounts(tmp_path) == []
+    assert cache_environment() == {}
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_cache_entries(tmp_path):
+    tool = add_tool(tmp_path, "node", 100, 1000)
+    action = add_action(tmp_path, "actions_checkout", 50, 2000)
+
+    entries = cache_entries(tmp_path)
+
+    (tool_entry,) = entries[TOOL_CACHE]
+    assert tool_entry.path == tool
+    assert tool_entry.size == 100
+    assert tool_entry.last_used == 1000
+    assert [(e.path, e.size) for e in entries[ACTION_CACHE]] == [(action, 50)]
+
+
+def test_prune_caches_evicts_least_recently_used(tmp_path):
+    now = time()
+    oldest = add_tool(tmp_path, "node", 1000, now - 30000)
+    add_tool(tmp_path, "python", 1000, now - 20000)
+    action = add_action(tmp_path, "actions_checkout", 1000, now - 10000)
+    add_tool(tmp_path, "go", 5000, now)
+
+    evicted, size = prune_caches(tmp_path, max_size=4000, min_age=60)
+
+    # the most recently used toolchain may be in use, although it is the largest
+    python = oldest.parents[2] / "python" / "1.0.0" / "x64"
+    assert [e.path for e in evicted] == [oldest, python, action]
+    assert size == 5000
+    assert not oldest.with_name("x64.complete").exists()
+    # directories of the tool are removed with its last version
+    assert not oldest.parents[1].exists()
+    assert (tmp_path / "cache" / TOOL_CACHE / "go").exists()
+
+
+def test_prune_caches_keeps_entries_while_jobs_run(tmp_path):
+    tool = add_tool(tmp_path, "node", 1000, 0)
+    (tmp_path / "cache" / TOOL_CACHE / ".jobs").mkdir()
+    job = tmp_path / "cache" / TOOL_CACHE / ".jobs" / "wusa-busy"
+    job.touch()
+
+    assert running_jobs(tmp_path) == ["wusa-busy"]
+    assert prune_caches(tmp_path, max_size=0) == ([], 1000)
+    assert tool.exists()
+
+    # jobs of runners which are gone do not keep the caches forever
+    os.utime(job, (0, 0))
+    assert running_jobs(tmp_path) == []
+    end_job(tmp_path, "wusa-busy")
+    evicted, _ = prune_caches(tmp_path, max_size=0)
+    assert [e.path for e in evicted] == [tool]
+
+
+def test_prune_caches_once_at_a_time(tmp_path):
+    add_tool(tmp_path, "node", 1000, 0)
+
+    with try_lock(tmp_path / "cache" / CACHE_LOCK) as locked:
+        assert locked
+        assert prune_caches(tmp_path, max_size=0) is None
+
+    evicted, _ = prune_caches(tmp_path, max_size=0, interval=3600)
+    assert len(evicted) == 1
+    add_tool(tmp_path, "python", 1000, 0)
+    assert prune_caches(tmp_path, max_size=0, interval=3600) is None
+
+
+def test_prune_caches_without_caches(tmp_path):
+    assert prune_caches(tmp_path, max_size=0) == ([], 0)
+    assert list(tmp_path.iterdir()) == []
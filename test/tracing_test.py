@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+from pytest import fixture
+
+from wusa.tracing import Tracer
+from wusa.tracing import propagate
+from wusa.tracing import span
+from wusa.tracing import traced
+
+
+@fixture(name="tracer")
+def _tracer(monkeypatch):
+    tracer = Tracer()
+    tracer.enabled = True
+    monkeypatch.setattr("wusa.tracing.TRACER", tracer)
+    yield tracer
+
+
+def test_Tracer_disabled_records_nothing():
+    tracer = Tracer()
+    with tracer.span("something"):
+        pass
+    assert tracer.spans == []
+
+
+def test_Tracer_nests_spans(tracer):
+    @traced("inner")
+    def inner():
+        pass
+
+    with span("outer", step=1):
+        inner()
+        inner()
+    with span("second"):
+        pass
+
+    assert [s.name for s in tracer.roots()] == ["outer", "second"]
+    outer, _ = tracer.roots()
+    assert [s.name for s in tracer.children()[outer]] == ["inner", "inner"]
+    assert outer.args == {"step": 1}
+    assert all(s.end is not None for s in tracer.spans)
+
+
+def test_propagate_to_worker_threads(tracer):
+    def work(index):
+        with span(f"work {index}"):
+            pass
+
+    with span("batch"):
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            list(executor.map(propagate(work), range(3)))
+
+    (batch,) = tracer.roots()
+    assert sorted(s.name for s in tracer.children()[batch]) == [
+        "work 0",
+        "work 1",
+        "work 2",
+    ]
+
+
+def test_write_chrome_trace(tracer, tmp_path):
+    with span("outer"):
+        with span("inner"):
+            pass
+
+    trace_file = tmp_path / "trace.json"
+    tracer.write_chrome_trace(trace_file)
+    events = json.loads(trace_file.read_text())["traceEvents"]
+
+    assert [e["name"] for e in events] == ["outer", "inner"]
+    assert all(e["ph"] == "X" for e in events)
+    outer, inner = events
+    assert outer["ts"] == 0
+    assert outer["ts"] <= inner["ts"]
+    assert inner["ts"] + inner["dur"] <= outer["ts"] + outer["dur"]
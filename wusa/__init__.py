@@ -4,7 +4,6 @@ import typer
 
 
 APP_NAME = "wusa"
+# directories are created on first write, importing wusa has no side effects
 WUSA_BASE_DIR = Path(typer.get_app_dir(APP_NAME, roaming=False, force_posix=True))
-WUSA_BASE_DIR.mkdir(parents=True, exist_ok=True)
 WUSA_RUNNER_DIR = WUSA_BASE_DIR / "runners"
-WUSA_RUNNER_DIR.mkdir(parents=True, exist_ok=True)
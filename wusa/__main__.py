@@ -0,0 +1,4 @@
+# -*- coding: utf-8 -*-
+from .main import app
+
+app(prog_name="wusa")
@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+from asyncio import gather
+from dataclasses import dataclass
+from dataclasses import field
+from math import inf
+from time import monotonic
+from time import sleep
+from typing import Any
+from typing import AsyncIterator
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import Optional
+
+from .gh import GitHubClient
+from .gh import api_runner_list
+from .gh import api_workflow_run_jobs
+from .gh import api_workflow_runs
+from .gh import get_gh_client
+from .output import LogProgress
+from .output import print_error
+from .output import print_step
+from .pool import STANDBY
+from .runners import Runners
+from .tokens import get_runner_token
+
+ACTIVE_JOB_STATUS = ("queued", "in_progress")
+
+
+@dataclass
+class ScalingPolicy:
+    """Scaling limits and damping of a single repository.
+
+    Runners are added as soon as more jobs wait or run than runners exist, but
+    only removed if more than ``hysteresis`` runners are left over. After any
+    scaling, scaling down is paused for ``scale_down_cooldown`` seconds and
+    scaling up again for ``scale_up_cooldown`` seconds.
+    """
+
+    min_runners: int = 0
+    max_runners: int = 10
+    hysteresis: int = 1
+    scale_up_cooldown: float = 30.0
+    scale_down_cooldown: float = 300.0
+
+    def desired(self, current: int, jobs: int) -> int:
+        wanted = min(max(jobs, self.min_runners), self.max_runners)
+        if wanted > current or current - wanted > self.hysteresis:
+            return wanted
+        return current
+
+
+@dataclass
+class Demand:
+    """Self-hosted jobs which are queued or in progress and idle local runners."""
+
+    jobs: int
+    idle_runners: List[str] = field(default_factory=list)
+
+
+@dataclass
+class ScalingState:
+    last_scale_up: float = -inf
+    last_scale_down: float = -inf
+
+
+async def _collect(items: AsyncIterator[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return [item async for item in items]
+
+
+async def fetch_demand(client: GitHubClient, repo: str) -> Demand:
+    """Gets the demand of a repository from GitHub API.
+
+    Jobs are counted if they are queued or in progress and require a
+    self-hosted runner. Jobs of all active workflow runs are listed concurrently.
+    """
+    run_listings = [
+        client.async_iter(api_workflow_runs(repo, status), "workflow_runs")
+        for status in ACTIVE_JOB_STATUS
+    ]
+    runs_by_status = await gather(*(_collect(r) for r in run_listings))
+    run_ids = sorted({run["id"] for runs in runs_by_status for run in runs})
+
+    job_listings = [
+        client.async_iter(api_workflow_run_jobs(repo, run_id), "jobs")
+        for run_id in run_ids
+    ]
+    jobs_by_run, repo_runners = await gather(
+        gather(*(_collect(j) for j in job_listings)),
+        _collect(client.async_iter(api_runner_list(repo), "runners")),
+    )
+
+    job_count = sum(
+        1
+        for run_jobs in jobs_by_run
+        for job in run_jobs
+        if job["status"] in ACTIVE_JOB_STATUS and "self-hosted" in job["labels"]
+    )
+    busy = {runner["name"] for runner in repo_runners if runner["busy"]}
+    idle_runners = [
+        runner.name
+        for runner in Runners
+        if runner.repo == repo and runner.status != STANDBY and runner.name not in busy
+    ]
+
+    return Demand(job_count, idle_runners)
+
+
+def create_runners(repo: str, count: int, shared_image: bool = False) -> None:
+    token = get_runner_token(repo, "registration")
+    _, failures = Runners.create_new_runners(
+        repo, token, count, LogProgress(), shared_image=shared_image
+    )
+    for exc in failures.values():
+        print_error(exc)
+
+
+def remove_runners(repo: str, runner_names: List[str]) -> None:
+    _, failures = Runners.remove_many(runner_names, LogProgress())
+    for exc in failures.values():
+        print_error(exc)
+
+
+class Autoscaler:
+    """Scales local runners of repositories with their queued and running jobs.
+
+    Parameters
+    ----------
+    policies
+        Scaling policy by repository.
+
+    create
+        Called with repository and number of runners to add.
+
+    remove
+        Called with repository and names of idle runners to remove.
+
+    clock
+        Monotonic clock in seconds used for cooldowns.
+    """
+
+    def __init__(
+        self,
+        policies: Dict[str, ScalingPolicy],
+        create: Callable[[str, int], None] = create_runners,
+        remove: Callable[[str, List[str]], None] = remove_runners,
+        clock: Callable[[], float] = monotonic,
+    ) -> None:
+        self.policies = policies
+        self.create = create
+        self.remove = remove
+        self.clock = clock
+        self.states = {repo: ScalingState() for repo in policies}
+
+    def fetch_demands(self) -> Dict[str, Demand]:
+        client = get_gh_client()
+
+        async def fetch_all() -> List[Demand]:
+            return await gather(*(fetch_demand(client, repo) for repo in self.policies))
+
+        return dict(zip(self.policies, client.run(fetch_all())))
+
+    def scale(self, repo: str, demand: Demand) -> int:
+        """Scales runners of ``repo`` for ``demand`` and returns the change."""
+        policy = self.policies[repo]
+        state = self.states[repo]
+        now = self.clock()
+
+        # standby runners of a warm pool are managed by the pool
+        current = sum(
+            1 for runner in Runners if runner.repo == repo and runner.status != STANDBY
+        )
+        desired = policy.desired(current, demand.jobs)
+        last_scaling = max(state.last_scale_up, state.last_scale_down)
+
+        if desired > current:
+            if now - state.last_scale_up < policy.scale_up_cooldown:
+                return 0
+            print_step(f"Scaling '{repo}' up from {current} to {desired} runners")
+            self.create(repo, desired - current)
+            state.last_scale_up = now
+            return desired - current
+
+        if desired < current:
+            if now - last_scaling < policy.scale_down_cooldown:
+                return 0
+            # only idle runners are removed, busy ones are kept
+            to_remove = demand.idle_runners[: current - desired]
+            if not to_remove:
+                return 0
+            print_step(f"Scaling '{repo}' down by {len(to_remove)} idle runners")
+            self.remove(repo, to_remove)
+            state.last_scale_down = now
+            return -len(to_remove)
+
+        return 0
+
+    def step(self) -> Dict[str, int]:
+        demands = self.fetch_demands()
+        return {repo: self.scale(repo, demand) for repo, demand in demands.items()}
+
+    def run(self, interval: float, iterations: Optional[int] = None) -> None:
+        iteration = 0
+        while iterations is None or iteration < iterations:
+            started = self.clock()
+            try:
+                self.step()
+            except Exception as exc:
+                # a failed poll should not stop the daemon
+                print_error("An error occurred while autoscaling")
+                print_error(exc)
+            iteration += 1
+            if iterations is None or iteration < iterations:
+                sleep(max(0.0, interval - (self.clock() - started)))
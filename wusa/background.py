@@ -0,0 +1,21 @@
+# -*- coding: utf-8 -*-
+import subprocess
+import sys
+from pathlib import Path
+from typing import List
+
+
+def run_in_background(args: List[str], log_file: Path) -> None:
+    """Starts ``wusa <args>`` as detached process, appending output to ``log_file``.
+
+    The process keeps running after the calling wusa invocation has exited.
+    """
+    log_file.parent.mkdir(parents=True, exist_ok=True)
+    with log_file.open("a") as log:
+        subprocess.Popen(
+            [sys.executable, "-m", "wusa"] + args,
+            stdin=subprocess.DEVNULL,
+            stdout=log,
+            stderr=subprocess.STDOUT,
+            start_new_session=True,
+        )
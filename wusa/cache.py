@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+import os
+from hashlib import sha256
+from json import dumps
+from json import loads
+from json.decoder import JSONDecodeError
+from pathlib import Path
+from tempfile import NamedTemporaryFile
+from threading import Lock
+from time import time
+from typing import Any
+from typing import Iterator
+from typing import MutableMapping
+from typing import Optional
+from typing import Tuple
+
+CacheEntry = Tuple[Optional[str], Optional[str], Any, Optional[str]]
+
+DEFAULT_TTL = 24 * 60 * 60
+DEFAULT_MAX_SIZE = 50 * 1024 * 1024
+
+
+class HTTPCache(MutableMapping[str, CacheEntry]):
+    """Persistent cache for responses of GitHub API.
+
+    Used as the cache of ``gidgethub``, which stores ETag, Last-Modified, data
+    and the link to the next page by URL and sends conditional requests for
+    cached URLs. Responses with '304 Not Modified' do not count against the
+    rate limit of GitHub.
+
+    Every entry is stored in its own file. Entries older than ``ttl`` seconds are
+    dropped, and the least recently used entries are evicted as soon as all
+    entries together exceed ``max_size`` bytes.
+    """
+
+    def __init__(
+        self,
+        directory: Path,
+        ttl: float = DEFAULT_TTL,
+        max_size: int = DEFAULT_MAX_SIZE,
+    ) -> None:
+        self.directory = directory
+        self.ttl = ttl
+        self.max_size = max_size
+        self._lock = Lock()
+        self._size: Optional[int] = None
+
+    def _path(self, key: str) -> Path:
+        return self.directory / (sha256(key.encode()).hexdigest() + ".json")
+
+    def _files(self) -> Iterator[Path]:
+        if self.directory.exists():
+            yield from self.directory.glob("*.json")
+
+    def _read(self, path: Path) -> Tuple[str, float, CacheEntry]:
+        content = loads(path.read_text())
+        return content["key"], content["stored"], tuple(content["value"])
+
+    def __getitem__(self, key: str) -> CacheEntry:
+        path = self._path(key)
+        try:
+            stored_key, stored, value = self._read(path)
+        except (FileNotFoundError, JSONDecodeError, KeyError):
+            raise KeyError(key)
+
+        if stored_key != key:
+            raise KeyError(key)
+
+        if time() - stored > self.ttl:
+            self._unlink(path)
+            raise KeyError(key)
+
+        # modification time tracks the last use for eviction
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        return value
+
+    def __setitem__(self, key: str, value: CacheEntry) -> None:
+        content = dumps({"key": key, "stored": time(), "value": list(value)})
+        path = self._path(key)
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+        with NamedTemporaryFile(
+            "w", dir=self.directory, prefix=".entry-", delete=False
+        ) as fp:
+            fp.write(content)
+        previous_size = path.stat().st_size if path.exists() else 0
+        os.replace(fp.name, path)
+
+        with self._lock:
+            self._size = self._current_size() + len(content) - previous_size
+        self._evict()
+
+    def __delitem__(self, key: str) -> None:
+        path = self._path(key)
+        if not path.exists():
+            raise KeyError(key)
+        self._unlink(path)
+
+    def __iter__(self) -> Iterator[str]:
+        for path in self._files():
+            try:
+                yield self._read(path)[0]
+            except (FileNotFoundError, JSONDecodeError, KeyError):
+                continue
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self._files())
+
+    def _current_size(self) -> int:
+        # computed once, afterwards tracked by writes and deletes of this process
+        if self._size is None:
+            self._size = sum(path.stat().st_size for path in self._files())
+        return self._size
+
+    def _unlink(self, path: Path) -> None:
+        try:
+            size = path.stat().st_size
+            path.unlink()
+        except FileNotFoundError:
+            return
+        with self._lock:
+            self._size = self._current_size() - size
+
+    def _evict(self) -> None:
+        if self._current_size() <= self.max_size:
+            return
+
+        entries = []
+        for path in self._files():
+            try:
+                entries.append((path.stat().st_mtime, path))
+            except FileNotFoundError:
+                continue
+
+        with self._lock:
+            self._size = None
+        for _, path in sorted(entries):
+            if self._current_size() <= self.max_size:
+                break
+            self._unlink(path)
+
+    def clear(self) -> None:
+        for path in list(self._files()):
+            self._unlink(path)
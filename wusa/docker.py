@@ -1,19 +1,33 @@
 # -*- coding: utf-8 -*-
+import atexit
+import os
+import re
+from queue import Empty
+from queue import Queue
+from threading import Lock
+from threading import Thread
+from time import monotonic
+from time import sleep
+from typing import TYPE_CHECKING
+from typing import Any
+from typing import Callable
+from typing import Dict
 from typing import List
 from typing import Optional
 from typing import Protocol
 
-from docker import from_env
-from docker.client import DockerClient
-from docker.errors import APIError
-from docker.errors import DockerException
-from docker.errors import ImageNotFound
-from docker.errors import NotFound
-from docker.models.containers import Container
-
+from .exceptions import ContainerExited
 from .exceptions import DockerError
 from .exceptions import NoDockerServerFound
+from .exceptions import ReadinessTimeout
 from .output import silent_print
+from .tracing import span
+from .tracing import traced
+
+if TYPE_CHECKING:
+    from docker.client import DockerClient
+    from docker.models.containers import Container
+    from docker.models.images import Image
 
 
 class Logger(Protocol):
@@ -21,17 +35,96 @@ class Logger(Protocol):
         ...
 
 
-def get_client() -> DockerClient:
-    try:
-        return from_env()
-    except DockerException:
-        raise NoDockerServerFound("Wusa failed to connect to docker server")
+class ReadyCondition(Protocol):
+    def on_log(self, line: str) -> bool:
+        ...
+
+    def poll(self, container: "Container") -> bool:
+        ...
+
+
+DEFAULT_POOL_SIZE = 16
+# label of helper containers of wusa which are not runners, e.g. the mirror
+SERVICE_LABEL = "org.wusa.service"
+# seconds between two checks of container state while waiting for readiness
+POLL_INTERVAL = 0.5
+
+_client: Optional["DockerClient"] = None
+_client_lock = Lock()
+_api_calls = 0
+_api_calls_lock = Lock()
+
+
+def docker_pool_size() -> int:
+    """Connection pool size of the shared client (``WUSA_DOCKER_POOL_SIZE``)."""
+    return int(os.environ.get("WUSA_DOCKER_POOL_SIZE", DEFAULT_POOL_SIZE))
+
+
+def _count_api_call(response, *args, **kwargs) -> None:
+    global _api_calls
+    with _api_calls_lock:
+        _api_calls += 1
+
+
+def docker_api_calls() -> int:
+    """Number of API round-trips done with the shared client so far."""
+    return _api_calls
+
+
+def from_env(**kwargs: Any) -> "DockerClient":
+    """Creates a client configured by the environment, see ``docker.from_env``.
+
+    The docker SDK is imported on first use only, as importing it takes longer
+    than some commands of wusa, e.g. 'wusa list-local', take to run.
+    """
+    import docker
+
+    return docker.from_env(**kwargs)
+
+
+def get_client() -> "DockerClient":
+    """Returns the docker client shared by all ``wusa_docker_*`` functions.
 
+    The client is created on first use. Its connection pool is reused by every
+    following call, instead of connecting and negotiating with the docker server
+    over and over again.
+    """
+    from docker.errors import DockerException
+
+    global _client
+    with _client_lock:
+        if _client is None:
+            try:
+                _client = from_env(max_pool_size=docker_pool_size())
+            except DockerException:
+                raise NoDockerServerFound("Wusa failed to connect to docker server")
+
+            api = getattr(_client, "api", None)
+            if api is not None:
+                api.hooks["response"].append(_count_api_call)
+
+        return _client
+
+
+@atexit.register
+def close_client() -> None:
+    global _client, _api_calls
+    with _client_lock:
+        if _client is not None and hasattr(_client, "close"):
+            _client.close()
+        _client = None
+    with _api_calls_lock:
+        _api_calls = 0
+
+
+@traced("docker get")
+def wusa_docker_get(name: str) -> "Container":
+    from docker.errors import APIError
+    from docker.errors import NotFound
 
-def wusa_docker_get(name: str) -> Container:
     client = get_client()
     try:
-        container: Container = client.containers.get(name)
+        container: "Container" = client.containers.get(name)
         if "org.wusa.container-name" in container.labels:
             return container
         else:
@@ -42,20 +135,47 @@ def wusa_docker_get(name: str) -> Container:
         raise DockerError("Error encountered while trying to get container")
 
 
-def wusa_docker_list_containers(name: Optional[str] = None) -> Container:
+@traced("docker list containers")
+def wusa_docker_list_containers(
+    name: Optional[str] = None,
+    sparse: bool = False,
+) -> List["Container"]:
+    """Lists containers of wusa, optionally only those matching ``name``.
+
+    Without ``sparse`` docker is asked for the details of every container, which
+    takes one round-trip per container. Sparse containers carry only what was
+    listed, e.g. status and labels, but take a single round-trip (see
+    ``wusa_container_name``).
+    """
+    from docker.errors import APIError
+
     client = get_client()
     filters = {"label": "org.wusa.container-name"}
     if name:
         filters["name"] = name
 
     try:
-        return client.containers.list(all=True, filters=filters)
+        return client.containers.list(all=True, filters=filters, sparse=sparse)
     except APIError:
         raise DockerError("Error encountered while trying getting list of containers")
 
 
-def wusa_docker_container_stop(container: Container, remove: bool = True) -> None:
+def wusa_container_name(container: "Container") -> str:
+    """Name of a wusa container, also of sparse containers which have no name."""
+    labels = container.attrs.get("Labels") or {}
+    return labels.get("org.wusa.container-name") or container.name
+
+
+@traced("docker stop")
+def wusa_docker_container_stop(container: "Container", remove: bool = True) -> None:
+    from docker.errors import APIError
+
     try:
+        if container.status == "paused":
+            # paused containers do not receive the stop signal
+            container.unpause()
+            container.status = "running"
+
         if container.status == "running":
             silent_print("# Stopping container")
             container.stop()
@@ -69,7 +189,33 @@ def wusa_docker_container_stop(container: Container, remove: bool = True) -> Non
         raise DockerError("Error encountered while trying to remove container")
 
 
+@traced("docker pause")
+def wusa_docker_pause(container: "Container") -> None:
+    from docker.errors import APIError
+
+    try:
+        container.pause()
+    except APIError:
+        raise DockerError("Error during 'docker pause' encountered")
+
+
+@traced("docker unpause")
+def wusa_docker_unpause(container: "Container") -> None:
+    from docker.errors import APIError
+
+    try:
+        container.reload()
+        if container.status == "paused":
+            container.unpause()
+    except APIError:
+        raise DockerError("Error during 'docker unpause' encountered")
+
+
+@traced("docker remove image")
 def wusa_docker_remove_image(image_name: str) -> None:
+    from docker.errors import APIError
+    from docker.errors import ImageNotFound
+
     client = get_client()
 
     try:
@@ -80,6 +226,262 @@ def wusa_docker_remove_image(image_name: str) -> None:
         raise DockerError("Error encountered while trying to get image")
 
 
+class LogMatch:
+    """Container is ready as soon as a log line matches ``pattern``."""
+
+    def __init__(self, pattern: str) -> None:
+        self.regex = re.compile(pattern)
+
+    def on_log(self, line: str) -> bool:
+        return self.regex.search(line) is not None
+
+    def poll(self, container: "Container") -> bool:
+        return False
+
+
+class HealthCheck:
+    """Container is ready as soon as the healthcheck of its image passes."""
+
+    def on_log(self, line: str) -> bool:
+        return False
+
+    def poll(self, container: "Container") -> bool:
+        health = container.attrs.get("State", {}).get("Health", {}).get("Status")
+        if health == "unhealthy":
+            raise DockerError(f"Container '{container.name}' is unhealthy")
+        return health == "healthy"
+
+
+class FileMarker:
+    """Container is ready as soon as ``path`` exists inside of the container."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+
+    def on_log(self, line: str) -> bool:
+        return False
+
+    def poll(self, container: "Container") -> bool:
+        exit_code, _ = container.exec_run(["test", "-e", self.path])
+        return exit_code == 0
+
+
+def _exited(container: "Container") -> bool:
+    container.reload()
+    return container.status in ("exited", "dead")
+
+
+def wait_until_ready(
+    container: "Container",
+    ready: Optional[ReadyCondition] = None,
+    timeout: Optional[float] = None,
+    quiet: bool = False,
+    poll_interval: float = POLL_INTERVAL,
+) -> float:
+    """Follows the logs of ``container`` until it is ready.
+
+    Without ``ready`` condition the container is followed until it exits. With
+    condition, an exit of the container raises ``ContainerExited`` and a
+    container which is not ready within ``timeout`` seconds raises
+    ``ReadinessTimeout``.
+
+    Returns
+    -------
+        Seconds until the container was ready or exited.
+    """
+    from docker.errors import APIError
+
+    started = monotonic()
+    deadline = None if timeout is None else started + timeout
+    lines: "Queue[Optional[bytes]]" = Queue()
+    stream = container.logs(stream=True, follow=True)
+
+    def follow() -> None:
+        try:
+            for line in stream:
+                lines.put(line)
+        except Exception:
+            # stream was closed after readiness
+            pass
+        finally:
+            lines.put(None)
+
+    Thread(target=follow, daemon=True).start()
+
+    logs_ended = False
+    next_poll = started
+    try:
+        while True:
+            now = monotonic()
+            if deadline is not None and now >= deadline:
+                raise ReadinessTimeout(
+                    f"Container '{container.name}' was not ready after {timeout}s"
+                )
+
+            if now >= next_poll:
+                next_poll = now + poll_interval
+                # an exited container is done once all of its logs are read
+                if _exited(container) and logs_ended:
+                    if ready is None:
+                        return monotonic() - started
+                    exit_code = container.attrs.get("State", {}).get("ExitCode")
+                    raise ContainerExited(
+                        f"Container '{container.name}' exited with code "
+                        f"{exit_code} before it was ready"
+                    )
+                if ready is not None and ready.poll(container):
+                    return monotonic() - started
+                continue
+
+            wait = next_poll - now
+            if deadline is not None:
+                wait = min(wait, deadline - now)
+
+            if logs_ended:
+                sleep(wait)
+                continue
+
+            try:
+                line = lines.get(timeout=wait)
+            except Empty:
+                continue
+
+            if line is None:
+                # container probably exited, so check right away
+                logs_ended = True
+                next_poll = monotonic()
+                continue
+
+            decoded_cleaned_line = line.decode("utf-8").strip()
+            if decoded_cleaned_line and not quiet:
+                silent_print(decoded_cleaned_line)
+            if ready is not None and ready.on_log(decoded_cleaned_line):
+                return monotonic() - started
+    except APIError:
+        raise DockerError("Error while waiting for container to be ready")
+    finally:
+        if hasattr(stream, "close"):
+            stream.close()
+
+
+@traced("docker list images")
+def wusa_docker_list_images(reference: str) -> List["Image"]:
+    """Lists images whose name matches ``reference``, e.g. 'wusa-*'."""
+    from docker.errors import APIError
+
+    client = get_client()
+    try:
+        return client.images.list(filters={"reference": reference})
+    except APIError:
+        raise DockerError("Error encountered while trying getting list of images")
+
+
+@traced("docker info")
+def wusa_docker_info() -> Dict[str, Any]:
+    """System-wide information of the docker daemon, e.g. its registry mirrors."""
+    from docker.errors import APIError
+
+    client = get_client()
+    try:
+        return client.info()
+    except APIError:
+        raise DockerError("Error encountered while trying to get docker info")
+
+
+@traced("docker registry digest")
+def wusa_docker_registry_digest(image: str) -> str:
+    """Digest of ``image`` in its registry, without pulling the image."""
+    from docker.errors import APIError
+    from docker.errors import NotFound
+
+    client = get_client()
+    try:
+        return client.images.get_registry_data(image).id
+    except NotFound:
+        raise DockerError(f"Image '{image}' not found in registry")
+    except APIError:
+        raise DockerError(f"Error while getting digest of '{image}' from registry")
+
+
+@traced("docker image exists")
+def wusa_docker_image_exists(reference: str) -> bool:
+    """Whether the image ``reference``, e.g. 'some/image@sha256:...', is local."""
+    from docker.errors import APIError
+    from docker.errors import ImageNotFound
+
+    client = get_client()
+    try:
+        client.images.get(reference)
+    except ImageNotFound:
+        return False
+    except APIError:
+        raise DockerError("Error encountered while trying to get image")
+    return True
+
+
+@traced("docker tag")
+def wusa_docker_tag(reference: str, repository: str, tag: str) -> None:
+    """Tags the local image ``reference`` as ``repository:tag``."""
+    from docker.errors import APIError
+
+    client = get_client()
+    try:
+        client.api.tag(reference, repository, tag)
+    except APIError:
+        raise DockerError(f"Error during 'docker tag' of '{reference}' encountered")
+
+
+@traced("docker pull")
+def wusa_docker_pull(image: str, on_event: Callable[[Dict[str, Any]], None]) -> None:
+    """Pulls ``image`` and calls ``on_event`` for every progress event of docker."""
+    from docker.errors import APIError
+    from docker.errors import NotFound
+
+    client = get_client()
+    try:
+        events = client.api.pull(image, stream=True, decode=True)
+        for event in events:
+            if "error" in event:
+                raise DockerError(f"Error during 'docker pull': {event['error']}")
+            on_event(event)
+    except NotFound:
+        raise DockerError(f"Image '{image}' not found")
+    except APIError:
+        raise DockerError("Error during 'docker pull' encountered")
+
+
+def _wait_or_remove(
+    container: "Container",
+    ready: Optional[ReadyCondition],
+    timeout: Optional[float],
+    quiet: bool,
+    check: bool = False,
+) -> None:
+    """Waits until ``container`` is ready, or removes it if it never gets ready.
+
+    Otherwise the container would keep its name, and the next container of the
+    same name fails with a conflict. With ``check``, a container which exited
+    with a non-zero code never got ready either.
+    """
+    from docker.errors import APIError
+
+    try:
+        wait_until_ready(container, ready, timeout, quiet)
+        if check and ready is None:
+            exit_code = container.attrs.get("State", {}).get("ExitCode")
+            if exit_code:
+                raise ContainerExited(
+                    f"Container '{container.name}' exited with code {exit_code}"
+                )
+    except (ReadinessTimeout, ContainerExited):
+        try:
+            container.remove(force=True)
+        except APIError:
+            pass
+        raise
+
+
+@traced("docker run")
 def wusa_docker_run(
     command: str,
     image: str,
@@ -87,13 +489,33 @@ def wusa_docker_run(
     stop_logging_substr: Optional[str] = None,
     mounts: List[str] = [],
     mount_docker: bool = False,
-) -> Container:
+    quiet: bool = False,
+    ready: Optional[ReadyCondition] = None,
+    timeout: Optional[float] = None,
+    limits: Dict[str, Any] = {},
+    environment: Dict[str, str] = {},
+    check: bool = False,
+) -> "Container":
+    """Runs ``command`` in a new container and waits until it is ready.
+
+    The container is ready as soon as ``ready`` is met, or a log line contains
+    ``stop_logging_substr``. Without either, this waits for the container to
+    exit, and with ``check`` a non-zero exit code raises ``ContainerExited``.
+    ``limits`` are passed on to docker, e.g. ``mem_limit``, and
+    ``environment`` is set in the container.
+    """
+    from docker.errors import APIError
+    from docker.errors import ImageNotFound
+
+    if ready is None and stop_logging_substr:
+        ready = LogMatch(re.escape(stop_logging_substr))
+
     client = get_client()
     try:
         if mount_docker:
             mounts += ["/var/run/docker.sock:/var/run/docker.sock"]
 
-        container: Container = client.containers.run(
+        container: "Container" = client.containers.run(
             image,
             command=command,
             detach=True,
@@ -101,16 +523,12 @@ def wusa_docker_run(
             volumes=mounts,
             privileged=True,
             labels={"org.wusa.container-name": name},
+            environment=environment,
+            **limits,
         )
 
-        for line in container.logs(stream=True):
-            decoded_cleaned_line = line.decode("utf-8").strip()
-            if decoded_cleaned_line:
-                silent_print(decoded_cleaned_line)
-
-            if stop_logging_substr and stop_logging_substr in decoded_cleaned_line:
-                break
-
+        with span("wait until ready", container=name):
+            _wait_or_remove(container, ready, timeout, quiet, check)
         return container
 
     # ATTENTION: ImageNotFound requires to be raised before APIError
@@ -121,20 +539,81 @@ def wusa_docker_run(
         raise DockerError("Error during 'docker run' encountered")
 
 
+@traced("docker run service")
+def wusa_docker_run_service(
+    image: str,
+    name: str,
+    ports: Dict[str, Any],
+    mounts: List[str] = [],
+    environment: Dict[str, str] = {},
+    ready: Optional[ReadyCondition] = None,
+    timeout: Optional[float] = None,
+) -> "Container":
+    """Runs a helper container of wusa, e.g. the registry mirror, until ready.
+
+    Unlike runners, services are not privileged, publish ``ports`` and are
+    restarted by docker, e.g. after a reboot, until they are stopped.
+    """
+    from docker.errors import APIError
+    from docker.errors import ImageNotFound
+
+    client = get_client()
+    try:
+        container: "Container" = client.containers.run(
+            image,
+            detach=True,
+            name=name,
+            volumes=mounts,
+            ports=ports,
+            environment=environment,
+            labels={SERVICE_LABEL: name},
+            restart_policy={"Name": "unless-stopped"},
+        )
+
+        with span("wait until ready", container=name):
+            _wait_or_remove(container, ready, timeout, quiet=True)
+        return container
+
+    except ImageNotFound:
+        raise DockerError(f"Image '{image}' not found")
+    except APIError as exc:
+        raise DockerError(f"Error during 'docker run' encountered: {exc.explanation}")
+
+
+@traced("docker get service")
+def wusa_docker_get_service(name: str) -> Optional["Container"]:
+    """Helper container of wusa called ``name``, None if there is none."""
+    from docker.errors import APIError
+
+    client = get_client()
+    filters = {"label": f"{SERVICE_LABEL}={name}"}
+    try:
+        containers = client.containers.list(all=True, filters=filters)
+    except APIError:
+        raise DockerError("Error encountered while trying getting list of containers")
+    return containers[0] if containers else None
+
+
+@traced("docker commit")
 def wusa_docker_commit(
-    container: Container,
+    container: "Container",
     image_name: str,
     tag: str = "latest",
 ) -> None:
+    from docker.errors import APIError
+
     try:
         container.commit(repository=image_name, tag=tag)
     except APIError:
         raise DockerError("Error during 'docker commit' encountered")
 
 
+@traced("docker remove")
 def wusa_docker_remove(
-    container: Container,
+    container: "Container",
 ) -> None:
+    from docker.errors import APIError
+
     try:
         container.remove()
     except APIError:
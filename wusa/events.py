@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+import os
+from json import dumps
+from json import loads
+from json.decoder import JSONDecodeError
+from pathlib import Path
+from time import time
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Optional
+
+from .state import file_lock
+
+EVENT_LOG = "events.jsonl"
+# the log is moved to '<log>.1' once it is larger, replacing the older one
+MAX_EVENT_LOG_SIZE = 10 * 1024 * 1024
+
+Event = Dict[str, Any]
+
+
+def rotated(path: Path) -> Path:
+    return path.with_name(path.name + ".1")
+
+
+def append_event(path: Path, event: Event, max_size: int = MAX_EVENT_LOG_SIZE) -> None:
+    """Appends ``event`` with the current time as line of JSON to ``path``.
+
+    Every line is written with a single ``write`` in append mode, so lines of
+    concurrent wusa processes do not interleave. Once the log is larger than
+    ``max_size`` bytes, it is moved to ``rotated(path)``, so only the previous
+    log is kept.
+    """
+    line = dumps({"time": time(), **event}) + "\n"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+    try:
+        os.write(fd, line.encode())
+        size = os.fstat(fd).st_size
+    finally:
+        os.close(fd)
+
+    if size > max_size:
+        # others might have seen the same size, only the first one rotates
+        with file_lock(path.with_name(path.name + ".lock")):
+            try:
+                if path.stat().st_size > max_size:
+                    os.replace(path, rotated(path))
+            except FileNotFoundError:
+                pass
+
+
+class EventTail:
+    """Reads the events which were appended to an event log since the last read.
+
+    If the log was rotated, the events which were appended before are read from
+    the rotated log first. The log is read again from its start if it was
+    replaced or truncated.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._offset = 0
+        self._inode: Optional[int] = None
+        self._partial = b""
+
+    def _events(self, data: bytes) -> List[Event]:
+        # the last line may still be written
+        *lines, self._partial = (self._partial + data).split(b"\n")
+        events = []
+        for line in lines:
+            try:
+                events.append(loads(line))
+            except (JSONDecodeError, UnicodeDecodeError):
+                continue
+        return events
+
+    def _read_from(self, path: Path) -> bytes:
+        with path.open("rb") as fp:
+            fp.seek(self._offset)
+            data = fp.read()
+        self._offset += len(data)
+        return data
+
+    def read(self) -> List[Event]:
+        try:
+            stat = self.path.stat()
+        except FileNotFoundError:
+            return []
+
+        events: List[Event] = []
+        if stat.st_ino != self._inode or stat.st_size < self._offset:
+            try:
+                if rotated(self.path).stat().st_ino == self._inode:
+                    events += self._events(self._read_from(rotated(self.path)))
+            except FileNotFoundError:
+                pass
+            self._inode = stat.st_ino
+            self._offset = 0
+            self._partial = b""
+
+        return events + self._events(self._read_from(self.path))
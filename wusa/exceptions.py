@@ -1,5 +1,6 @@
 # -*- coding: utf-8 -*-
 from gidgethub import BadRequest  # noqa: F401
+from gidgethub import RateLimitExceeded  # noqa: F401
 
 
 class NoAccessToken(Exception):
@@ -18,6 +19,14 @@ class DockerError(Exception):
     pass
 
 
+class ContainerExited(DockerError):
+    pass
+
+
+class ReadinessTimeout(DockerError):
+    pass
+
+
 class RunnerFileIOError(Exception):
     pass
 
@@ -28,3 +37,7 @@ class InvalidRunnerName(Exception):
 
 class PendingError(Exception):
     pass
+
+
+class PlacementError(Exception):
+    pass
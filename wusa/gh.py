@@ -1,23 +1,57 @@
 # -*- coding: utf-8 -*-
-from asyncio import get_event_loop
+import atexit
+import os
+from asyncio import AbstractEventLoop
+from asyncio import Queue
+from asyncio import Semaphore
+from asyncio import gather
+from asyncio import get_running_loop
+from asyncio import new_event_loop
+from asyncio import run_coroutine_threadsafe
+from asyncio import wrap_future
+from hashlib import sha256
+from threading import Lock
+from threading import Thread
+from threading import current_thread
 from typing import Any
+from typing import AsyncIterator
+from typing import Awaitable
 from typing import Dict
+from typing import Iterable
+from typing import Iterator
+from typing import List
+from typing import NamedTuple
 from typing import Optional
+from typing import Tuple
+from typing import TypeVar
 from typing import Union
 from urllib.parse import parse_qs
 
 from aiohttp import ClientSession
+from aiohttp import TCPConnector
 from gidgethub.aiohttp import GitHubAPI
 from requests import post
 from requests.exceptions import HTTPError
 
 from . import WUSA_BASE_DIR
+from .cache import HTTPCache
+from .events import EVENT_LOG
+from .events import append_event
 from .exceptions import GHError
 from .exceptions import NoAccessToken
 from .exceptions import PendingError
+from .tracing import attach
+from .tracing import current_span
+from .tracing import span
 
 _location_access_token = WUSA_BASE_DIR / ".access_token"
 _CLIENT_ID = "070dcc7e8ff3a7c087d5"
+_DEFAULT_POOL_SIZE = 20
+_MAX_PER_PAGE = 100
+_use_http_cache = True
+_DEFAULT_API_URL = "https://api.github.com"
+
+T = TypeVar("T")
 
 
 def obtain_token() -> str:
@@ -45,15 +79,408 @@ def save_access_token(token: str) -> None:
     token
         Token which will be written in file.
     """
+    _location_access_token.parent.mkdir(parents=True, exist_ok=True)
     _location_access_token.write_text(token)
 
 
+class GHRequest(NamedTuple):
+    """Single request to GitHub API as used by ``GitHubClient.batch``."""
+
+    method: str
+    api: str
+    data: Optional[Dict[str, Union[str, int]]] = None
+
+
+class GitHubClient:
+    """Long-lived client for GitHub API.
+
+    All requests run on one event loop in a background thread and share a single
+    ``aiohttp`` session. Connections are kept alive and pooled, so following
+    requests skip the TCP and TLS handshake. The synchronous methods can be
+    called from any thread.
+
+    Parameters
+    ----------
+    token
+        Auth token for GitHub to access API endpoints.
+
+    pool_size
+        Maximum number of simultaneous connections to GitHub.
+
+    cache
+        Cache for GET requests, which are then sent as conditional requests.
+
+    base_url
+        URL of GitHub API, e.g. of a GitHub Enterprise server.
+    """
+
+    def __init__(
+        self,
+        token: str,
+        pool_size: int = _DEFAULT_POOL_SIZE,
+        cache: Optional[HTTPCache] = None,
+        base_url: str = _DEFAULT_API_URL,
+    ) -> None:
+        self.token = token
+        self.pool_size = pool_size
+        self.cache = cache
+        self.base_url = base_url
+        self.requests = 0
+        self._session: Optional[ClientSession] = None
+        self._gh_api: Optional[GitHubAPI] = None
+        self._loop: AbstractEventLoop = new_event_loop()
+        self._thread = Thread(
+            target=self._loop.run_forever, name="wusa-gh", daemon=True
+        )
+        self._thread.start()
+
+    @property
+    def loop(self) -> AbstractEventLoop:
+        return self._loop
+
+    @property
+    def gh_api(self) -> GitHubAPI:
+        """Underlying ``GitHubAPI``, only to be used on ``self.loop``."""
+        if self._gh_api is None:
+            connector = TCPConnector(limit=self.pool_size, keepalive_timeout=60)
+            self._session = ClientSession(connector=connector)
+            self._gh_api = GitHubAPI(
+                self._session,
+                "wusa",
+                oauth_token=self.token,
+                cache=self.cache,
+                base_url=self.base_url,
+            )
+        return self._gh_api
+
+    def run(self, coroutine: Awaitable[T]) -> T:
+        """Runs a coroutine on the event loop of the client and waits for it."""
+        # spans of the coroutine belong to the span of the caller
+        attached = attach(coroutine, current_span())
+        return run_coroutine_threadsafe(attached, self._loop).result()
+
+    @property
+    def rate_limit(self) -> Optional[Any]:
+        """Rate limit of GitHub reported by the last response, if any."""
+        return getattr(self._gh_api, "rate_limit", None)
+
+    async def async_get(self, api: str) -> Dict[str, Any]:
+        self.requests += 1
+        with span("GitHub GET", api=api):
+            return await self.gh_api.getitem(api)
+
+    async def async_post(
+        self,
+        api: str,
+        data: Optional[Dict[str, Union[str, int]]] = None,
+    ) -> Dict[str, Any]:
+        self.requests += 1
+        with span("GitHub POST", api=api):
+            return await self.gh_api.post(api, data=data or {})
+
+    async def async_delete(self, api: str) -> Dict[str, Any]:
+        self.requests += 1
+        with span("GitHub DELETE", api=api):
+            # GitHub answers deletions without content
+            return await self.gh_api.delete(api) or {}
+
+    async def async_iter(
+        self,
+        api: str,
+        key: Optional[str],
+        per_page: int = _MAX_PER_PAGE,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Iterates over all items of a paginated listing, one page at a time.
+
+        Parameters
+        ----------
+        api
+            API endpoint of the listing.
+
+        key
+            Key of the response under which the items of a page are listed,
+            e.g. ``"runners"``, or ``None`` if the response is the list itself.
+
+        per_page
+            Number of items requested per page.
+        """
+        separator = "&" if "?" in api else "?"
+        page = 1
+        received = 0
+        while True:
+            response = await self.async_get(
+                f"{api}{separator}per_page={per_page}&page={page}"
+            )
+            items = response[key] if key else response
+            for item in items:
+                yield item
+
+            received += len(items)
+            total_count = response.get("total_count") if key else None
+            if len(items) < per_page or (total_count and received >= total_count):
+                break
+            page += 1
+
+    async def async_iter_many(
+        self,
+        apis: Dict[str, str],
+        key: Optional[str],
+        concurrency: int = _DEFAULT_POOL_SIZE,
+    ) -> AsyncIterator[Tuple[str, Union[Dict[str, Any], Exception]]]:
+        """Iterates concurrently over several paginated listings.
+
+        Parameters
+        ----------
+        apis
+            API endpoints of the listings by an arbitrary tag, e.g. the repository.
+
+        key
+            Key of the responses under which the items of a page are listed.
+
+        concurrency
+            Maximum number of listings which are fetched at the same time.
+
+        Returns
+        -------
+            Tuples of tag and item in the order in which items arrive. If a
+            listing fails, the exception is yielded in place of an item.
+        """
+        semaphore = Semaphore(concurrency)
+        queue: Queue = Queue()
+        done = object()
+
+        async def fetch(tag: str, api: str) -> None:
+            async with semaphore:
+                try:
+                    async for item in self.async_iter(api, key):
+                        await queue.put((tag, item))
+                except Exception as exc:
+                    await queue.put((tag, exc))
+                finally:
+                    await queue.put(done)
+
+        tasks = [self._loop.create_task(fetch(tag, api)) for tag, api in apis.items()]
+        remaining = len(tasks)
+        try:
+            while remaining:
+                entry = await queue.get()
+                if entry is done:
+                    remaining -= 1
+                else:
+                    yield entry
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def async_request(self, request: GHRequest) -> Dict[str, Any]:
+        if request.method == "GET":
+            return await self.async_get(request.api)
+        elif request.method == "POST":
+            return await self.async_post(request.api, request.data)
+        elif request.method == "DELETE":
+            return await self.async_delete(request.api)
+        else:
+            raise GHError(f"Unsupported request method '{request.method}'")
+
+    def get(self, api: str) -> Dict[str, Any]:
+        return self.run(self.async_get(api))
+
+    def post(
+        self,
+        api: str,
+        data: Optional[Dict[str, Union[str, int]]] = None,
+    ) -> Dict[str, Any]:
+        return self.run(self.async_post(api, data))
+
+    def _iter_sync(self, items: AsyncIterator[T]) -> Iterator[T]:
+        items = items.__aiter__()
+        while True:
+            try:
+                yield self.run(items.__anext__())
+            except StopAsyncIteration:
+                return
+
+    def iter(
+        self,
+        api: str,
+        key: Optional[str],
+        per_page: int = _MAX_PER_PAGE,
+    ) -> Iterator[Dict[str, Any]]:
+        """Synchronous version of ``async_iter``, yielding items as they arrive."""
+        return self._iter_sync(self.async_iter(api, key, per_page))
+
+    def iter_many(
+        self,
+        apis: Dict[str, str],
+        key: Optional[str],
+        concurrency: int = _DEFAULT_POOL_SIZE,
+    ) -> Iterator[Tuple[str, Union[Dict[str, Any], Exception]]]:
+        """Synchronous version of ``async_iter_many``."""
+        return self._iter_sync(self.async_iter_many(apis, key, concurrency))
+
+    def batch(
+        self,
+        requests: Iterable[GHRequest],
+        concurrency: int = _DEFAULT_POOL_SIZE,
+    ) -> List[Union[Dict[str, Any], Exception]]:
+        """Sends many requests concurrently.
+
+        Parameters
+        ----------
+        requests
+            Requests to send.
+
+        concurrency
+            Maximum number of requests in flight at the same time.
+
+        Returns
+        -------
+            Responses in the order of ``requests``. Failed requests are returned
+            as the exception which was raised.
+        """
+
+        async def send_all() -> List[Union[Dict[str, Any], Exception]]:
+            semaphore = Semaphore(concurrency)
+
+            async def send(request: GHRequest) -> Dict[str, Any]:
+                async with semaphore:
+                    return await self.async_request(request)
+
+            return await gather(
+                *(send(request) for request in requests), return_exceptions=True
+            )
+
+        return self.run(send_all())
+
+    def close(self) -> None:
+        """Closes the session and stops the event loop of the client.
+
+        Raises
+        ------
+        ``RuntimeError``
+            If called on the event loop of the client, which can not wait for
+            itself to stop.
+        """
+        if self._loop.is_closed():
+            return
+        if current_thread() is self._thread:
+            raise RuntimeError("GitHub client can not be closed from its own loop")
+        if self._session is not None:
+            self.run(self._session.close())
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+
+# clients by token and URL of GitHub API
+_gh_clients: Dict[Tuple[str, str], GitHubClient] = {}
+_gh_client_lock = Lock()
+
+
+def gh_pool_size() -> int:
+    """Connection pool size of the shared client (``WUSA_GH_POOL_SIZE``)."""
+    return int(os.environ.get("WUSA_GH_POOL_SIZE", _DEFAULT_POOL_SIZE))
+
+
+def gh_api_url() -> str:
+    """URL of GitHub API (``WUSA_GH_API_URL``), e.g. of GitHub Enterprise."""
+    return os.environ.get("WUSA_GH_API_URL", _DEFAULT_API_URL)
+
+
+def set_http_cache(enabled: bool) -> None:
+    """Enables or disables the on-disk cache of GitHub API responses."""
+    global _use_http_cache
+    _use_http_cache = enabled
+    close_gh_client()
+
+
+def http_cache(token: str) -> Optional[HTTPCache]:
+    """Returns the on-disk cache of GitHub API responses for ``token``.
+
+    Responses are cached per token under ``WUSA_BASE_DIR/cache/http``, as
+    different tokens might be allowed to see different data.
+    """
+    if not _use_http_cache:
+        return None
+    token_hash = sha256(token.encode()).hexdigest()[:16]
+    return HTTPCache(WUSA_BASE_DIR / "cache" / "http" / token_hash)
+
+
+def get_gh_client(token: Optional[str] = None) -> GitHubClient:
+    """Returns the GitHub client shared by all GitHub API calls of wusa.
+
+    Every token and URL of GitHub API has its own client, which is kept until
+    wusa exits, as other threads or coroutines on its loop may still use it.
+
+    Parameters
+    ----------
+    token
+        Auth token for GitHub. If not given, the stored access token is used.
+
+    Raises
+    ------
+    ``NoAcccessToken``
+        If no token is given and no access token has been stored yet.
+    """
+    token = token or obtain_token()
+    base_url = gh_api_url()
+    with _gh_client_lock:
+        client = _gh_clients.get((token, base_url))
+        if client is None:
+            client = GitHubClient(
+                token,
+                pool_size=gh_pool_size(),
+                cache=http_cache(token),
+                base_url=base_url,
+            )
+            _gh_clients[(token, base_url)] = client
+        return client
+
+
+@atexit.register
+def close_gh_client() -> None:
+    """Closes all clients, which must not be used by anyone anymore."""
+    with _gh_client_lock:
+        clients = list(_gh_clients.values())
+        _gh_clients.clear()
+    # outside of the lock, as coroutines on the loops might still wait for it
+    for client in clients:
+        client.close()
+
+
+def record_gh_usage() -> None:
+    """Appends requests and rate limit of every client to the event log."""
+    with _gh_client_lock:
+        clients = list(_gh_clients.values())
+
+    for client in clients:
+        if not client.requests:
+            continue
+        event: Dict[str, Any] = {"kind": "github", "requests": client.requests}
+        rate_limit = client.rate_limit
+        if rate_limit is not None:
+            event["rate_limit"] = rate_limit.limit
+            event["rate_limit_remaining"] = rate_limit.remaining
+        append_event(WUSA_BASE_DIR / EVENT_LOG, event)
+
+
+async def on_client_loop(client: GitHubClient, coroutine: Awaitable[T]) -> T:
+    """Awaits ``coroutine`` on the event loop of ``client`` from any event loop."""
+    if get_running_loop() is client.loop:
+        return await coroutine
+    attached = attach(coroutine, current_span())
+    return await wrap_future(run_coroutine_threadsafe(attached, client.loop))
+
+
 async def async_get_gh_api(
     api: str,
     token: str,
 ) -> Dict[str, Any]:
     """Coroutine which sends a GET request to GitHub API.
 
+    The request is sent with the session of the shared client, on its event
+    loop, and the coroutine can be awaited on any event loop.
+
     Parameters
     ----------
     api
@@ -66,9 +493,8 @@ async def async_get_gh_api(
     -------
         Dictionary containing respond to request.
     """
-    async with ClientSession() as session:
-        gh_api = GitHubAPI(session, "wusa", oauth_token=token)
-        return await gh_api.getitem(api)
+    client = get_gh_client(token)
+    return await on_client_loop(client, client.async_get(api))
 
 
 async def async_post_gh_api(
@@ -78,6 +504,9 @@ async def async_post_gh_api(
 ) -> Dict[str, Any]:
     """Coroutine which sends a POST request to GitHub API.
 
+    The request is sent with the session of the shared client, on its event
+    loop, and the coroutine can be awaited on any event loop.
+
     Parameters
     ----------
     api
@@ -93,13 +522,12 @@ async def async_post_gh_api(
     -------
         Dictionary containing respond to request.
     """
-    async with ClientSession() as session:
-        gh_api = GitHubAPI(session, "wusa", oauth_token=token)
-        return await gh_api.post(api, data=data)
+    client = get_gh_client(token)
+    return await on_client_loop(client, client.async_post(api, data))
 
 
 def get_gh_api(api: str) -> Dict[str, Any]:
-    """Wrapper function for GET requests to call GitHub API in async mode.
+    """Sends a GET request to GitHub API using the shared client.
 
     Parameters
     ----------
@@ -110,16 +538,14 @@ def get_gh_api(api: str) -> Dict[str, Any]:
     -------
         Dictionary containing respond to request.
     """
-    token = obtain_token()
-    loop = get_event_loop()
-    return loop.run_until_complete(async_get_gh_api(api, token))
+    return get_gh_client().get(api)
 
 
 def post_gh_api(
     api: str,
     data: Optional[Dict[str, Union[str, int]]] = None,
 ) -> Dict[str, Any]:
-    """Wrapper function for POST requests to call GitHub API in async mode.
+    """Sends a POST request to GitHub API using the shared client.
 
     Parameters
     ----------
@@ -133,10 +559,77 @@ def post_gh_api(
     -------
         Dictionary containing respond to request.
     """
-    token = obtain_token()
-    loop = get_event_loop()
-    data_to_send = data or {}
-    return loop.run_until_complete(async_post_gh_api(api, token, data_to_send))
+    return get_gh_client().post(api, data)
+
+
+def iter_gh_api(api: str, key: Optional[str]) -> Iterator[Dict[str, Any]]:
+    """Iterates over all pages of a listing of GitHub API using the shared client.
+
+    Pages are requested one after another with the maximum page size. Items are
+    yielded as soon as their page arrived.
+
+    Parameters
+    ----------
+    api
+        API endpoint of the listing, e.g. ``api_runner_list(repo)``.
+
+    key
+        Key of the response under which the items are listed, e.g. ``"runners"``,
+        or ``None`` if the response is the list itself.
+
+    Returns
+    -------
+        Iterator over all items of the listing.
+    """
+    return get_gh_client().iter(api, key)
+
+
+def iter_gh_api_many(
+    apis: Dict[str, str],
+    key: Optional[str],
+    concurrency: int = _DEFAULT_POOL_SIZE,
+) -> Iterator[Tuple[str, Union[Dict[str, Any], Exception]]]:
+    """Iterates concurrently over several listings using the shared client.
+
+    Parameters
+    ----------
+    apis
+        API endpoints of the listings by an arbitrary tag, e.g. the repository.
+
+    key
+        Key of the responses under which the items are listed.
+
+    concurrency
+        Maximum number of listings which are fetched at the same time.
+
+    Returns
+    -------
+        Iterator over tuples of tag and item in the order in which items arrive.
+        If a listing fails, the exception is yielded in place of an item.
+    """
+    return get_gh_client().iter_many(apis, key, concurrency)
+
+
+def batch_gh_api(
+    requests: Iterable[GHRequest],
+    concurrency: int = _DEFAULT_POOL_SIZE,
+) -> List[Union[Dict[str, Any], Exception]]:
+    """Sends many requests concurrently to GitHub API using the shared client.
+
+    Parameters
+    ----------
+    requests
+        Requests to send, e.g. ``GHRequest("POST", api_runner_removal(repo))``.
+
+    concurrency
+        Maximum number of requests in flight at the same time.
+
+    Returns
+    -------
+        Responses in the order of ``requests``. Failed requests are returned as
+        the exception which was raised.
+    """
+    return get_gh_client().batch(requests, concurrency)
 
 
 def api_runner_registration(repo: str) -> str:
@@ -184,6 +677,90 @@ def api_runner_list(repo: str) -> str:
     return f"/repos/{repo}/actions/runners"
 
 
+def api_runner(repo: str, runner_id: int) -> str:
+    """Helper function which returns the API endpoint of a single runner.
+
+    Parameter
+    ---------
+    repo
+        Repository in the format "some_user/repo_name".
+
+    runner_id
+        ID of the runner on GitHub.
+
+    Returns
+    -------
+        String containing the full API endpoint of the runner, e.g. to delete it.
+    """
+    return f"/repos/{repo}/actions/runners/{runner_id}"
+
+
+def api_workflow_runs(repo: str, status: str) -> str:
+    """Helper function which returns the API endpoint to list workflow runs.
+
+    Parameter
+    ---------
+    repo
+        Repository in the format "some_user/repo_name".
+
+    status
+        Status of the workflow runs to list, e.g. "queued" or "in_progress".
+
+    Returns
+    -------
+        String containing the full API endpoint to obtain workflow runs.
+    """
+    return f"/repos/{repo}/actions/runs?status={status}"
+
+
+def api_workflow_run_jobs(repo: str, run_id: int) -> str:
+    """Helper function which returns the API endpoint to list jobs of a run.
+
+    Parameter
+    ---------
+    repo
+        Repository in the format "some_user/repo_name".
+
+    run_id
+        Identifier of the workflow run.
+
+    Returns
+    -------
+        String containing the full API endpoint to obtain jobs of a workflow run.
+    """
+    return f"/repos/{repo}/actions/runs/{run_id}/jobs"
+
+
+def api_org_runner_list(org: str) -> str:
+    """Helper function which returns the API endpoint to list organization runners.
+
+    Parameter
+    ---------
+    org
+        Name of the organization.
+
+    Returns
+    -------
+        String containing the full API endpoint to obtain organization runners.
+    """
+    return f"/orgs/{org}/actions/runners"
+
+
+def api_org_repos(org: str) -> str:
+    """Helper function which returns the API endpoint to list organization repos.
+
+    Parameter
+    ---------
+    org
+        Name of the organization.
+
+    Returns
+    -------
+        String containing the full API endpoint to obtain organization repos.
+    """
+    return f"/orgs/{org}/repos"
+
+
 def get_gh_verification_codes() -> Dict[str, Union[str, int]]:
     """Function which gets device codes
 
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+from dataclasses import asdict
+from dataclasses import dataclass
+from json import dumps
+from json import loads
+from json.decoder import JSONDecodeError
+from pathlib import Path
+from time import time
+from typing import Any
+from typing import Dict
+from typing import Optional
+from typing import Protocol
+
+from .docker import wusa_docker_image_exists
+from .docker import wusa_docker_pull
+from .docker import wusa_docker_registry_digest
+from .docker import wusa_docker_tag
+
+BASE_IMAGE = "wusarunner/base-linux:latest"
+IMAGE_PIN_FILE = "image.json"
+
+
+class PullReporter(Protocol):
+    def event(self, event: Dict[str, Any]) -> None:
+        ...
+
+
+@dataclass
+class ImagePin:
+    """Base image of new runners, pinned to the digest which was pulled."""
+
+    image: str
+    digest: str
+    pulled: float
+
+    @property
+    def reference(self) -> str:
+        return f"{image_repository(self.image)}@{self.digest}"
+
+
+def image_repository(image: str) -> str:
+    """Strips tag and digest, e.g. 'localhost:5000/some/image:tag' -> '.../image'."""
+    image = image.split("@", 1)[0]
+    name, _, tag = image.rpartition(":")
+    if name and "/" not in tag:
+        return name
+    return image
+
+
+def image_tag(image: str) -> str:
+    """Tag of ``image``, 'latest' without tag and empty for digest references."""
+    if "@" in image:
+        return ""
+    return image[len(image_repository(image)) + 1 :] or "latest"
+
+
+def read_pin(base_dir: Path) -> Optional[ImagePin]:
+    try:
+        return ImagePin(**loads((base_dir / IMAGE_PIN_FILE).read_text()))
+    except (FileNotFoundError, JSONDecodeError, TypeError):
+        return None
+
+
+def write_pin(base_dir: Path, pin: ImagePin) -> None:
+    base_dir.mkdir(parents=True, exist_ok=True)
+    (base_dir / IMAGE_PIN_FILE).write_text(dumps(asdict(pin)))
+
+
+def remove_pin(base_dir: Path) -> None:
+    try:
+        (base_dir / IMAGE_PIN_FILE).unlink()
+    except FileNotFoundError:
+        pass
+
+
+def pinned_base_image(base_dir: Path) -> str:
+    """Image reference of new runners, the pinned digest if there is one."""
+    pin = read_pin(base_dir)
+    return pin.reference if pin else BASE_IMAGE
+
+
+def pull_image(
+    base_dir: Path,
+    reporter: PullReporter,
+    image: str = BASE_IMAGE,
+    pin: bool = True,
+) -> bool:
+    """Pulls ``image`` by the digest of its registry and pins it if ``pin``.
+
+    The image is not pulled again if the image with that digest is local
+    already. The tag of ``image`` is moved to the pulled image.
+
+    Returns
+    -------
+        Whether the image was pulled.
+    """
+    digest = wusa_docker_registry_digest(image)
+    repository = image_repository(image)
+    reference = f"{repository}@{digest}"
+
+    pulled = not wusa_docker_image_exists(reference)
+    if pulled:
+        # pulled by digest, so the pinned image is the one that was checked
+        wusa_docker_pull(reference, reporter.event)
+
+    # pulls by digest do not move the tag, e.g. for runners after 'image unpin'
+    tag = image_tag(image)
+    if tag:
+        wusa_docker_tag(reference, repository, tag)
+
+    if pin:
+        write_pin(base_dir, ImagePin(image, digest, time()))
+
+    return pulled
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Dict
+from typing import Iterable
+from typing import List
+from typing import Tuple
+
+from .docker import wusa_container_name
+from .docker import wusa_docker_list_containers
+from .exceptions import DockerError
+from .exceptions import NoDockerServerFound
+from .runners import Runner
+from .tracing import propagate
+
+# state of a runner whose state could not be obtained, e.g. without docker
+UNKNOWN = "unknown"
+# state of a runner without container, or which is not registered on GitHub
+MISSING = "missing"
+
+
+@dataclass
+class LiveRunner:
+    """Local runner together with the actual state of its container.
+
+    ``status`` is the status stored by wusa, e.g. 'standby' for runners of a
+    warm pool. ``github`` is the state of the runner on GitHub, e.g. 'online' or
+    'busy', and empty if GitHub was not asked.
+    """
+
+    name: str
+    repo: str
+    status: str
+    labels: List[str]
+    container: str = UNKNOWN
+    github: str = ""
+
+
+def container_states() -> Dict[str, str]:
+    """State of every wusa container by runner name, from a single docker call."""
+    containers = wusa_docker_list_containers(sparse=True)
+    return {wusa_container_name(c): c.status for c in containers}
+
+
+def github_states(
+    repos: Iterable[str],
+    concurrency: int,
+) -> Tuple[Dict[str, str], Dict[str, Exception]]:
+    """State of the runners of ``repos`` on GitHub by runner name.
+
+    The runners of all repositories are listed concurrently.
+
+    Returns
+    -------
+        States by runner name and failed listings by repository.
+    """
+    # the GitHub client is imported only by commands which talk to GitHub
+    from .gh import api_runner_list
+    from .gh import iter_gh_api_many
+
+    apis = {repo: api_runner_list(repo) for repo in repos}
+    states: Dict[str, str] = {}
+    failures: Dict[str, Exception] = {}
+    for repo, runner in iter_gh_api_many(apis, "runners", concurrency=concurrency):
+        if isinstance(runner, Exception):
+            failures[repo] = runner
+        else:
+            states[runner["name"]] = "busy" if runner["busy"] else runner["status"]
+    return states, failures
+
+
+def live_runners(
+    runners: List[Runner],
+    github: bool = False,
+    concurrency: int = 8,
+) -> Tuple[List[LiveRunner], Dict[str, Exception]]:
+    """Joins ``runners`` by name with the state of their containers.
+
+    Containers are listed with one docker call, which runs while the runners of
+    every repository are listed on GitHub if ``github``. So the number of
+    round-trips depends on the number of repositories, not of runners.
+
+    Returns
+    -------
+        Runners with their state and failures by repository, or by 'docker' if
+        containers could not be listed.
+    """
+    live = [
+        LiveRunner(runner.name, runner.repo, runner.status, runner.labels)
+        for runner in runners
+    ]
+    if not live:
+        return live, {}
+
+    failures: Dict[str, Exception] = {}
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        containers = executor.submit(propagate(container_states))
+        if github:
+            repos = sorted({runner.repo for runner in live})
+            registered, failures = github_states(repos, concurrency)
+
+        try:
+            states = containers.result()
+        except (DockerError, NoDockerServerFound) as exc:
+            failures["docker"] = exc
+            states = {}
+
+    for runner in live:
+        if "docker" not in failures:
+            runner.container = states.get(runner.name, MISSING)
+        if github and runner.repo not in failures:
+            runner.github = registered.get(runner.name, MISSING)
+        elif github:
+            runner.github = UNKNOWN
+    return live, failures
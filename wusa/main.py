@@ -1,45 +1,205 @@
 # -*- coding: utf-8 -*-
+import sys
 import webbrowser
+from contextlib import nullcontext
+from dataclasses import asdict
+from datetime import datetime
 from datetime import timedelta
-from importlib.metadata import version
+from functools import partial
+from http import HTTPStatus
+from json import loads
+from json.decoder import JSONDecodeError
+from pathlib import Path
 from time import sleep
+from typing import Any
+from typing import Dict
+from typing import Iterable
+from typing import List
+from typing import Optional
 
 import typer
 
+from . import WUSA_BASE_DIR
+from . import WUSA_RUNNER_DIR
+from .background import run_in_background
+from .docker import docker_api_calls
 from .exceptions import BadRequest
 from .exceptions import DockerError
 from .exceptions import GHError
 from .exceptions import InvalidRunnerName
 from .exceptions import NoAccessToken
+from .exceptions import NoDockerServerFound
 from .exceptions import PendingError
+from .exceptions import PlacementError
+from .exceptions import RateLimitExceeded
 from .exceptions import RunnerFileIOError
-from .gh import api_runner_list
-from .gh import api_runner_registration
-from .gh import get_gh_access_token
-from .gh import get_gh_api
-from .gh import get_gh_verification_codes
-from .gh import post_gh_api
-from .gh import save_access_token
+from .image import BASE_IMAGE
+from .image import pinned_base_image
+from .image import pull_image
+from .image import read_pin
+from .image import remove_pin
+from .inventory import live_runners
+from .mirror import DEFAULT_MIRROR_PORT
+from .mirror import DEFAULT_UPSTREAM
+from .mirror import Mirror
+from .mirror import daemon_mirrors
+from .mirror import mirror_down
+from .mirror import mirror_status
+from .mirror import mirror_up
+from .output import LayerLog
+from .output import LogProgress
+from .output import OutputFormat
+from .output import batch_progress
 from .output import press_enter_to
 from .output import print_error
-from .output import print_runners
+from .output import print_live_runners
+from .output import print_pools
 from .output import print_step
+from .output import print_timings
+from .output import print_warning
+from .output import pull_progress
+from .output import runner_records
+from .output import silent_print
 from .output import status
+from .output import stream_runners
+from .output import success
+from .output import write_records
+from .placement import ResourceLimits
+from .reconcile import DEFAULT_MIN_AGE
+from .reconcile import find_orphans
+from .reconcile import remove_orphans
+from .reconcile import take_inventory
 from .runners import Runner
 from .runners import Runners
+from .runners import host_label
+from .toolcache import DEFAULT_MIN_AGE as CACHE_MIN_AGE
+from .toolcache import cache_entries
+from .toolcache import cache_size
+from .toolcache import format_size
+from .toolcache import parse_size
+from .toolcache import prune_caches
+from .toolcache import running_jobs
+from .tracing import TRACER
 
 app = typer.Typer()
+pool_app = typer.Typer(help="Manage warm pools of standby runners.")
+app.add_typer(pool_app, name="pool")
+image_app = typer.Typer(help="Pre-pull and pin the base image of runners.")
+app.add_typer(image_app, name="image")
+cache_app = typer.Typer(help="Manage the tool and action cache shared by runners.")
+app.add_typer(cache_app, name="cache")
+mirror_app = typer.Typer(help="Run a local pull-through registry mirror for runners.")
+app.add_typer(mirror_app, name="mirror")
+
+
+def take_from_pool(repo: str, labels: List[str], count: int, shared_image: bool) -> int:
+    from .pool import get_pool
+    from .pool import refill_in_background
+
+    pool = get_pool()
+    try:
+        taken = pool.take(repo, labels, count, shared_image)
+    except RunnerFileIOError as exc:
+        print_error("An issue with the pool file occurred")
+        print_error(exc)
+        return 0
+
+    for runner in taken:
+        success(f"Runner '{runner.name}' taken from warm pool and running")
+
+    if pool.config(repo, labels):
+        refill_in_background(repo, labels)
+
+    return len(taken)
 
 
 @app.command(short_help="Create runner for repository.")
-def create(repo: str):
+def create(
+    repo: str,
+    labels: Optional[List[str]] = typer.Option(
+        None,
+        "--label",
+        "-l",
+        help="Additional label of the runner, can be given several times.",
+    ),
+    count: int = typer.Option(
+        1,
+        "--count",
+        "-n",
+        min=1,
+        help="Number of runners to create.",
+    ),
+    concurrency: int = typer.Option(
+        4,
+        "--concurrency",
+        "-j",
+        min=1,
+        help="Maximum number of runners which are created at the same time.",
+    ),
+    shared_image: bool = typer.Option(
+        False,
+        "--shared-image",
+        help="Start runner from the shared base image instead of committing an "
+        "image per runner. The runner identity is kept in its working directory.",
+    ),
+    no_pool: bool = typer.Option(
+        False,
+        "--no-pool",
+        help="Always create new runners instead of taking them from a warm pool.",
+    ),
+    cpus: float = typer.Option(
+        0.0,
+        "--cpus",
+        min=0.0,
+        help="CPU quota of the runner in number of CPUs.",
+    ),
+    cpuset: str = typer.Option(
+        "",
+        "--cpuset",
+        help="CPUs the runner is pinned to, e.g. '0-3'.",
+    ),
+    memory: str = typer.Option(
+        "",
+        "--memory",
+        help="Memory limit of the runner, e.g. '4g'.",
+    ),
+    pids_limit: int = typer.Option(
+        0,
+        "--pids-limit",
+        min=0,
+        help="Maximum number of processes of the runner.",
+    ),
+    place_cores: int = typer.Option(
+        0,
+        "--place",
+        min=0,
+        help="Pin every runner to this many CPUs, which are not used by other "
+        "runners, keeping runners on a single NUMA node where possible.",
+    ),
+):
+    labels = labels or []
+    limits = ResourceLimits(cpus, cpuset, memory, pids_limit)
+    if cpuset and place_cores:
+        print_error("Please use either '--cpuset' or '--place'")
+        raise typer.Exit(2)
+    # runners with limits are never taken from a warm pool
+    no_pool = no_pool or limits != ResourceLimits() or bool(place_cores)
+
+    # Task 0: Take runners from warm pool
+    if not no_pool:
+        count -= take_from_pool(repo, labels, count, shared_image)
+        if count == 0:
+            return
+
     # Task 1: Get registration token
+    from .tokens import get_runner_token
+
     with status(
         "Obtaining registration token for runner",
         on_success="Token for runner registration obtained",
     ):
         try:
-            runner_registration = post_gh_api(api_runner_registration(repo))
+            registration_token = get_runner_token(repo, "registration")
         except NoAccessToken:
             print_error("Please run 'wusa auth' to authenticate")
             raise typer.Exit(-1)
@@ -48,6 +208,20 @@ def create(repo: str):
             print_error(exc)
             raise typer.Exit(1)
 
+    # registration tokens can be used several times until they expire
+    if count > 1:
+        create_batch(
+            repo,
+            registration_token,
+            count,
+            concurrency,
+            shared_image,
+            labels,
+            limits=limits,
+            place_cores=place_cores,
+        )
+        return
+
     # Task 2: Create new runner
     with status(
         "Creating new runner",
@@ -56,8 +230,15 @@ def create(repo: str):
         try:
             new_runner = Runners.create_new_runner(
                 repo,
-                str(runner_registration["token"]),
+                registration_token,
+                labels,
+                shared_image=shared_image,
+                limits=limits,
+                place_cores=place_cores,
             )
+        except PlacementError as exc:
+            print_error(exc)
+            raise typer.Exit(2)
         except DockerError as exc:
             print_error("During runner creation an error occurred")
             print_error(exc)
@@ -79,19 +260,169 @@ def create(repo: str):
             raise typer.Exit(3)
 
 
+def create_batch(
+    repo: str,
+    token: str,
+    count: int,
+    concurrency: int,
+    shared_image: bool,
+    labels: List[str] = [],
+    limits: ResourceLimits = ResourceLimits(),
+    place_cores: int = 0,
+) -> None:
+    # steps: creation + startup
+    with batch_progress(count, steps=2) as progress:
+        try:
+            _, failures = Runners.create_new_runners(
+                repo,
+                token,
+                count,
+                progress,
+                labels,
+                max_workers=concurrency,
+                shared_image=shared_image,
+                limits=limits,
+                place_cores=place_cores,
+            )
+        except PlacementError as exc:
+            print_error(exc)
+            raise typer.Exit(2)
+        except RunnerFileIOError as exc:
+            print_error("An issue with the runner config file occurred")
+            print_error(exc)
+            raise typer.Exit(2)
+
+    for index, exc in sorted(failures.items()):
+        print_error(f"Runner #{index + 1} failed: {exc}")
+
+    success(f"{count - len(failures)} of {count} runners are up and running")
+    if failures:
+        raise typer.Exit(3)
+
+
 @app.command(
     name="list-local",
     short_help="List local runners.",
 )
-def list_local_runners():
-    print_runners(Runners)
+def list_local_runners(
+    github: bool = typer.Option(
+        False,
+        "--github",
+        "-g",
+        help="Also show the state of the runners on GitHub.",
+    ),
+    concurrency: int = typer.Option(
+        8,
+        "--concurrency",
+        "-j",
+        min=1,
+        help="Maximum number of repositories which are listed at the same time.",
+    ),
+    output_format: OutputFormat = typer.Option(
+        OutputFormat.table,
+        "--output",
+        "-o",
+        case_sensitive=False,
+        help="Print a table, or one record per runner for scripts.",
+    ),
+):
+    try:
+        runners, failures = live_runners(list(Runners), github, concurrency)
+    except NoAccessToken:
+        print_error("Please run 'wusa auth' to authenticate")
+        raise typer.Exit(-1)
+    except RunnerFileIOError as exc:
+        print_error("An issue with the runner file occurred")
+        print_error(exc)
+        raise typer.Exit(2)
+
+    if output_format == OutputFormat.table:
+        print_live_runners(runners, with_github=github)
+    else:
+        fields = ["name", "repo", "status", "container"]
+        fields += ["github", "labels"] if github else ["labels"]
+        write_records(runner_records(runners, fields), output_format, fields)
+
+    for source, exc in failures.items():
+        if source == "docker":
+            print_error("Issue obtaining state of containers")
+        else:
+            print_error(f"Issue obtaining runner information for '{source}'")
+        print_error(exc)
+    if failures:
+        raise typer.Exit(1)
 
 
 @app.command(
     name="remove",
-    short_help="Remove runner with name 'runner_name' from wusa.",
+    short_help="Remove runners from wusa.",
 )
-def remove_runner(runner_name: str):
+def remove_runner(
+    runner_names: Optional[List[str]] = typer.Argument(
+        None,
+        help="Names of the runners to remove.",
+    ),
+    repo: Optional[str] = typer.Option(
+        None,
+        "--repo",
+        help="Remove all runners of a repository.",
+    ),
+    all_runners: bool = typer.Option(
+        False,
+        "--all",
+        help="Remove all runners.",
+    ),
+    concurrency: int = typer.Option(
+        4,
+        "--concurrency",
+        "-j",
+        min=1,
+        help="Maximum number of runners which are removed at the same time.",
+    ),
+):
+    names = list(runner_names or [])
+    if len(names) == 1 and not repo and not all_runners:
+        remove_single_runner(names[0])
+        return
+
+    try:
+        if all_runners:
+            names += [runner.name for runner in Runners]
+        elif repo:
+            names += [runner.name for runner in Runners if runner.repo == repo]
+    except RunnerFileIOError as exc:
+        print_error("An issue with the runner config file occurred")
+        print_error(exc)
+        raise typer.Exit(2)
+
+    names = list(dict.fromkeys(names))
+    if not names:
+        print_step("No runners to remove")
+        return
+
+    # steps: cleanup + removal
+    with batch_progress(len(names), steps=2) as progress:
+        try:
+            removed, failures = Runners.remove_many(
+                names, progress, max_workers=concurrency
+            )
+        except RunnerFileIOError as exc:
+            print_error("An issue with the runner config file occurred")
+            print_error(exc)
+            raise typer.Exit(2)
+
+    for name in names:
+        if name in failures:
+            print_error(f"Runner '{name}' was not removed: {failures[name]}")
+    if any(isinstance(exc, NoAccessToken) for exc in failures.values()):
+        print_error("Please run 'wusa auth' to authenticate")
+
+    success(f"{len(removed)} of {len(names)} runners removed")
+    if failures:
+        raise typer.Exit(1)
+
+
+def remove_single_runner(runner_name: str) -> None:
     with status(
         "Removing wusa runner",
         on_success=f"Runner '{runner_name}' successfully removed",
@@ -111,16 +442,119 @@ def remove_runner(runner_name: str):
             raise typer.Exit(1)
 
 
+def show_runners(
+    runners: Iterable[Runner],
+    output_format: OutputFormat,
+    with_repo_column: bool,
+) -> None:
+    """Prints ``runners`` while they are listed, as table or as records."""
+    if output_format == OutputFormat.table:
+        stream_runners(runners, with_repo_column=with_repo_column)
+    else:
+        fields = ["name", "repo", "status", "labels"]
+        write_records(runner_records(runners, fields), output_format, fields)
+
+
+def read_repo_file(repo_file: Path) -> List[str]:
+    repos = []
+    for line in repo_file.read_text().splitlines():
+        line = line.strip()
+        if line and not line.startswith("#"):
+            repos.append(line)
+    return repos
+
+
+def is_forbidden(exc: Any) -> bool:
+    """Whether ``exc`` is a '403 Forbidden' of GitHub, e.g. for a missing scope."""
+    return (
+        isinstance(exc, BadRequest)
+        and not isinstance(exc, RateLimitExceeded)
+        and exc.status_code == HTTPStatus.FORBIDDEN
+    )
+
+
 @app.command(
     name="list-repo",
-    short_help="List runners for repository.",
+    short_help="List runners for repositories.",
 )
-def list_repo_runners(repo: str):
+def list_repo_runners(
+    repos: Optional[List[str]] = typer.Argument(
+        None,
+        help="Repositories in the format 'some_user/repo_name'.",
+    ),
+    repo_file: Optional[Path] = typer.Option(
+        None,
+        "--file",
+        "-f",
+        exists=True,
+        dir_okay=False,
+        help="File with one repository per line.",
+    ),
+    org: Optional[str] = typer.Option(
+        None,
+        "--org",
+        help="List runners of an organization and of all its repositories.",
+    ),
+    concurrency: int = typer.Option(
+        8,
+        "--concurrency",
+        "-j",
+        min=1,
+        help="Maximum number of repositories which are listed at the same time.",
+    ),
+    output_format: OutputFormat = typer.Option(
+        OutputFormat.table,
+        "--output",
+        "-o",
+        case_sensitive=False,
+        help="Print a table, or one record per runner for scripts.",
+    ),
+):
+    from .gh import api_org_repos
+    from .gh import api_org_runner_list
+    from .gh import api_runner_list
+    from .gh import iter_gh_api
+    from .gh import iter_gh_api_many
+
+    all_repos = list(repos or [])
+    if repo_file:
+        all_repos += read_repo_file(repo_file)
+
     try:
-        response = get_gh_api(api_runner_list(repo))
-        repo_runners = response["runners"]
-        repo_runners_as_runners = [Runner.from_dict(repo, r) for r in repo_runners]
-        print_runners(repo_runners_as_runners, with_repo_column=False)
+        if org:
+            org_repos = iter_gh_api(api_org_repos(org), None)
+            all_repos += [repo["full_name"] for repo in org_repos]
+
+        # keep order of repositories but list every repository only once
+        apis: Dict[str, str] = {repo: api_runner_list(repo) for repo in all_repos}
+        if org:
+            apis[org] = api_org_runner_list(org)
+
+        if not apis:
+            print_error("Please provide at least one repository or organization")
+            raise typer.Exit(2)
+
+        if len(apis) == 1 and not org:
+            (repo,) = apis
+            repo_runners = iter_gh_api(apis[repo], "runners")
+            repo_runners_as_runners = (Runner.from_dict(repo, r) for r in repo_runners)
+            show_runners(repo_runners_as_runners, output_format, with_repo_column=False)
+            return
+
+        failures: Dict[str, Exception] = {}
+        forbidden: List[str] = []
+
+        def merged_runners():
+            listings = iter_gh_api_many(apis, "runners", concurrency=concurrency)
+            for repo, runner in listings:
+                if repo == org and is_forbidden(runner):
+                    forbidden.append(repo)
+                elif isinstance(runner, Exception):
+                    failures[repo] = runner
+                else:
+                    yield Runner.from_dict(repo, runner)
+
+        show_runners(merged_runners(), output_format, with_repo_column=True)
     except NoAccessToken:
         print_error("Please run 'wusa auth' to authenticate")
         raise typer.Exit(-1)
@@ -129,9 +563,651 @@ def list_repo_runners(repo: str):
         print_error(exc)
         raise typer.Exit(1)
 
+    for name in forbidden:
+        print_warning(
+            f"Runners of organization '{name}' are not listed, as this requires "
+            "the 'admin:org' scope"
+        )
+    for repo, exc in failures.items():
+        print_error(f"Issue obtaining runner information for '{repo}'")
+        print_error(exc)
+    if failures:
+        raise typer.Exit(1)
+
+
+@app.command(
+    name="migrate-image",
+    short_help="Move runners with committed images to the shared base image.",
+)
+def migrate_image(
+    runner_names: Optional[List[str]] = typer.Argument(
+        None,
+        help="Names of the runners to migrate.",
+    ),
+    all_runners: bool = typer.Option(
+        False,
+        "--all",
+        help="Migrate all runners which have their own committed image.",
+    ),
+):
+    try:
+        if all_runners:
+            runners = [runner for runner in Runners if not runner.image]
+        else:
+            runners = [Runners.get(name) for name in runner_names or []]
+    except InvalidRunnerName as exc:
+        print_error(exc)
+        raise typer.Exit(-2)
+    except RunnerFileIOError as exc:
+        print_error("An issue with the runner config file occurred")
+        print_error(exc)
+        raise typer.Exit(2)
+
+    for runner in runners:
+        with status(
+            f"Migrating runner '{runner.name}'",
+            on_success=f"Runner '{runner.name}' uses shared image",
+        ):
+            try:
+                runner.migrate_to_shared_image()
+            except DockerError as exc:
+                print_error(f"An error occurred while migrating '{runner.name}'")
+                print_error(exc)
+                raise typer.Exit(3)
+            finally:
+                # store every runner which already switched its image
+                if runner.image:
+                    Runners.update([runner])
+
+
+@app.command(short_help="Scale runners with queued and running jobs.")
+def autoscale(
+    repos: Optional[List[str]] = typer.Argument(
+        None,
+        help="Repositories in the format 'some_user/repo_name'.",
+    ),
+    min_runners: int = typer.Option(0, "--min", min=0, help="Minimum runners."),
+    max_runners: int = typer.Option(10, "--max", min=0, help="Maximum runners."),
+    hysteresis: int = typer.Option(
+        1,
+        "--hysteresis",
+        min=0,
+        help="Number of spare runners kept before scaling down.",
+    ),
+    scale_up_cooldown: float = typer.Option(
+        30.0,
+        "--scale-up-cooldown",
+        help="Seconds between two times scaling up.",
+    ),
+    scale_down_cooldown: float = typer.Option(
+        300.0,
+        "--scale-down-cooldown",
+        help="Seconds after any scaling before scaling down.",
+    ),
+    interval: float = typer.Option(
+        30.0,
+        "--interval",
+        help="Seconds between two polls of GitHub.",
+    ),
+    config: Optional[Path] = typer.Option(
+        None,
+        "--config",
+        exists=True,
+        dir_okay=False,
+        help="JSON file with scaling options by repository, e.g. "
+        '{"some_user/repo_name": {"min_runners": 1, "max_runners": 4}}.',
+    ),
+    shared_image: bool = typer.Option(
+        False,
+        "--shared-image",
+        help="Create runners from the shared base image.",
+    ),
+    once: bool = typer.Option(False, "--once", help="Scale only once and exit."),
+):
+    from .autoscale import Autoscaler
+    from .autoscale import ScalingPolicy
+    from .autoscale import create_runners
+    from .gh import get_gh_client
+
+    default_policy = ScalingPolicy(
+        min_runners=min_runners,
+        max_runners=max_runners,
+        hysteresis=hysteresis,
+        scale_up_cooldown=scale_up_cooldown,
+        scale_down_cooldown=scale_down_cooldown,
+    )
+    policies = {repo: default_policy for repo in repos or []}
+    if config:
+        try:
+            for repo, options in loads(config.read_text()).items():
+                policies[repo] = ScalingPolicy(**{**asdict(default_policy), **options})
+        except (JSONDecodeError, AttributeError, TypeError) as exc:
+            print_error("Invalid autoscale configuration")
+            print_error(exc)
+            raise typer.Exit(2)
+
+    if not policies:
+        print_error("Please provide at least one repository")
+        raise typer.Exit(2)
+
+    try:
+        get_gh_client()
+    except NoAccessToken:
+        print_error("Please run 'wusa auth' to authenticate")
+        raise typer.Exit(-1)
+
+    autoscaler = Autoscaler(
+        policies,
+        create=partial(create_runners, shared_image=shared_image),
+    )
+    print_step(f"Autoscaling runners of {len(policies)} repositories")
+    autoscaler.run(interval, iterations=1 if once else None)
+
+
+@pool_app.command(
+    name="fill",
+    short_help="Create standby runners until the warm pool is full.",
+)
+def pool_fill(
+    repo: str,
+    labels: Optional[List[str]] = typer.Option(
+        None,
+        "--label",
+        "-l",
+        help="Additional label of the standby runners.",
+    ),
+    size: Optional[int] = typer.Option(
+        None,
+        "--size",
+        "-k",
+        min=0,
+        help="Number of standby runners kept in the pool.",
+    ),
+    shared_image: Optional[bool] = typer.Option(
+        None,
+        "--shared-image/--own-image",
+        help="Create standby runners from the shared base image.",
+    ),
+    paused: Optional[bool] = typer.Option(
+        None,
+        "--paused/--running",
+        help="Pause standby runners, so they do not pick up jobs until taken.",
+    ),
+    concurrency: int = typer.Option(
+        4,
+        "--concurrency",
+        "-j",
+        min=1,
+        help="Maximum number of runners which are created at the same time.",
+    ),
+):
+    from .pool import get_pool
+
+    labels = labels or []
+    pool = get_pool()
+
+    try:
+        pool.configure(repo, labels, size, shared_image, paused)
+        new_runners, failures = pool.fill(
+            repo, labels, LogProgress(), max_workers=concurrency
+        )
+    except NoAccessToken:
+        print_error("Please run 'wusa auth' to authenticate")
+        raise typer.Exit(-1)
+    except BadRequest as exc:
+        print_error("Issue obtaining 'registration-token'")
+        print_error(exc)
+        raise typer.Exit(1)
+    except RunnerFileIOError as exc:
+        print_error("An issue with the runner or pool file occurred")
+        print_error(exc)
+        raise typer.Exit(2)
+
+    success(f"Added {len(new_runners)} standby runners to warm pool of '{repo}'")
+    if failures:
+        raise typer.Exit(3)
+
+
+@pool_app.command(
+    name="status",
+    short_help="Show standby runners and hits and misses of warm pools.",
+)
+def pool_status():
+    from .pool import get_pool
+
+    print_pools(get_pool().status())
+
+
+@pool_app.command(
+    name="drain",
+    short_help="Remove a warm pool and its standby runners.",
+)
+def pool_drain(
+    repo: str,
+    labels: Optional[List[str]] = typer.Option(
+        None,
+        "--label",
+        "-l",
+        help="Additional label of the standby runners.",
+    ),
+):
+    from .pool import get_pool
+
+    with status(
+        "Removing standby runners",
+        on_success=f"Warm pool of '{repo}' drained",
+    ):
+        try:
+            removed = get_pool().drain(repo, labels or [])
+        except NoAccessToken:
+            print_error("Please run 'wusa auth' to authenticate")
+            raise typer.Exit(-1)
+        except (BadRequest, DockerError, RunnerFileIOError) as exc:
+            print_error("An error occurred while draining warm pool")
+            print_error(exc)
+            raise typer.Exit(1)
+
+    for runner_name in removed:
+        print_step(f"Removed standby runner '{runner_name}'")
+
+
+@image_app.command(
+    name="pull",
+    short_help="Pull the base image and pin new runners to its digest.",
+)
+def image_pull(
+    image: str = typer.Argument(BASE_IMAGE, help="Base image of runners."),
+    pin: bool = typer.Option(
+        True,
+        "--pin/--no-pin",
+        help="Create new runners from the pulled digest.",
+    ),
+    background: bool = typer.Option(
+        False,
+        "--background",
+        help="Pull in a detached process, logging into 'image.log'.",
+    ),
+):
+    if background:
+        args = ["image", "pull", image, "--pin" if pin else "--no-pin"]
+        run_in_background(args, WUSA_BASE_DIR / "image.log")
+        print_step(f"Pulling '{image}' in the background")
+        return
+
+    # background pulls and pipes are logged line by line
+    reporter_context = (
+        pull_progress() if sys.stdout.isatty() else nullcontext(LayerLog())
+    )
+    try:
+        with reporter_context as reporter:
+            pulled = pull_image(WUSA_BASE_DIR, reporter, image, pin)
+    except NoDockerServerFound as exc:
+        print_error(exc)
+        raise typer.Exit(1)
+    except DockerError as exc:
+        print_error(f"An error occurred while pulling '{image}'")
+        print_error(exc)
+        raise typer.Exit(2)
+
+    if not pulled:
+        success(f"Local image '{image}' is up to date")
+    if pin:
+        success(f"New runners use '{pinned_base_image(WUSA_BASE_DIR)}'")
+
+
+@image_app.command(
+    name="status",
+    short_help="Show the base image of new runners.",
+)
+def image_status():
+    pin = read_pin(WUSA_BASE_DIR)
+    if pin is None:
+        print_step(f"New runners use '{BASE_IMAGE}' (not pinned)")
+        return
+
+    pulled = datetime.fromtimestamp(pin.pulled).isoformat(" ", "seconds")
+    print_step(f"New runners use '{pin.reference}'")
+    silent_print(f"Pinned '{pin.image}' on {pulled}")
+
+
+@image_app.command(
+    name="unpin",
+    short_help="Create new runners from the base image tag again.",
+)
+def image_unpin():
+    remove_pin(WUSA_BASE_DIR)
+    success(f"New runners use '{BASE_IMAGE}'")
+
+
+def shared_cache_size() -> int:
+    try:
+        return cache_size()
+    except ValueError as exc:
+        print_error("An issue with 'WUSA_CACHE_SIZE' occurred")
+        print_error(exc)
+        raise typer.Exit(2)
+
+
+@cache_app.command(
+    name="status",
+    short_help="Show size and entries of the shared caches.",
+)
+def cache_status():
+    max_size = shared_cache_size()
+    if not max_size:
+        print_step("Shared caches are off, set 'WUSA_CACHE_SIZE' to turn them on")
+        return
+
+    total = 0
+    for cache, entries in cache_entries(WUSA_BASE_DIR).items():
+        size = sum(entry.size for entry in entries)
+        total += size
+        silent_print(f"{cache}: {len(entries)} entries, {format_size(size)}")
+    print_step(f"Shared caches use {format_size(total)} of {format_size(max_size)}")
+
+
+@cache_app.command(
+    name="prune",
+    short_help="Evict the oldest entries of the shared caches.",
+)
+def cache_prune(
+    size: Optional[str] = typer.Option(
+        None,
+        "--size",
+        help="Size to prune the caches to, e.g. '10g', instead of the cap.",
+    ),
+    min_age: float = typer.Option(
+        CACHE_MIN_AGE,
+        "--min-age",
+        min=0.0,
+        help="Seconds after their last change until entries may be evicted.",
+    ),
+):
+    try:
+        max_size = parse_size(size) if size is not None else shared_cache_size()
+    except ValueError as exc:
+        print_error(exc)
+        raise typer.Exit(2)
+
+    pruned = prune_caches(WUSA_BASE_DIR, max_size, min_age)
+    if pruned is None:
+        print_error("The shared caches are pruned by another process")
+        raise typer.Exit(1)
+
+    evicted, remaining = pruned
+    jobs = running_jobs(WUSA_BASE_DIR)
+    if jobs:
+        print_step(f"Nothing is evicted while runners run jobs: {', '.join(jobs)}")
+    for entry in evicted:
+        silent_print(f"Evicted '{entry.path}' ({format_size(entry.size)})")
+    freed = format_size(sum(entry.size for entry in evicted))
+    success(f"Evicted {len(evicted)} entries, freed {freed}")
+    if remaining > max_size:
+        print_step(
+            f"Shared caches still use {format_size(remaining)}, "
+            "as the remaining entries changed recently"
+        )
+
+
+def print_daemon_hint(mirror: Mirror) -> None:
+    print_step("Docker pulls images through the mirror once it is a registry mirror")
+    silent_print("Add it to '/etc/docker/daemon.json' and restart docker:")
+    silent_print(f'  {{"registry-mirrors": ["{mirror.url}"]}}')
+    silent_print(f"Jobs may also pull from '{mirror.address}' directly,")
+    silent_print("e.g. 'docker pull $WUSA_REGISTRY_MIRROR/library/ubuntu'")
+
+
+@mirror_app.command(
+    name="up",
+    short_help="Start the registry mirror or keep it running.",
+)
+def mirror_start(
+    port: int = typer.Option(
+        DEFAULT_MIRROR_PORT,
+        "--port",
+        "-p",
+        help="Port of the mirror on the loopback of the host.",
+    ),
+    upstream: str = typer.Option(
+        DEFAULT_UPSTREAM,
+        "--upstream",
+        help="Registry which images are pulled from and cached.",
+    ),
+):
+    try:
+        with status("Starting registry mirror"):
+            mirror = mirror_up(WUSA_BASE_DIR, port, upstream)
+        configured = mirror.url in daemon_mirrors()
+    except NoDockerServerFound as exc:
+        print_error(exc)
+        raise typer.Exit(1)
+    except DockerError as exc:
+        print_error("An error occurred while starting the registry mirror")
+        print_error(exc)
+        raise typer.Exit(2)
+
+    success(f"Registry mirror of '{mirror.upstream}' runs on '{mirror.address}'")
+    silent_print("Runners started from now on get it as 'WUSA_REGISTRY_MIRROR'")
+    if not configured:
+        print_daemon_hint(mirror)
+
+
+@mirror_app.command(
+    name="down",
+    short_help="Stop and remove the registry mirror.",
+)
+def mirror_stop(
+    purge: bool = typer.Option(
+        False,
+        "--purge",
+        help="Also remove the images cached by the mirror.",
+    ),
+):
+    try:
+        with status("Stopping registry mirror"):
+            removed = mirror_down(WUSA_BASE_DIR, purge)
+    except NoDockerServerFound as exc:
+        print_error(exc)
+        raise typer.Exit(1)
+    except (DockerError, OSError) as exc:
+        print_error("An error occurred while removing the registry mirror")
+        print_error(exc)
+        raise typer.Exit(2)
+
+    if removed:
+        success("Registry mirror removed")
+    else:
+        print_step("No registry mirror is running")
+
+
+@mirror_app.command(
+    name="status",
+    short_help="Show the registry mirror and the size of its cache.",
+)
+def mirror_show():
+    try:
+        current = mirror_status(WUSA_BASE_DIR)
+    except NoDockerServerFound as exc:
+        print_error(exc)
+        raise typer.Exit(1)
+    except DockerError as exc:
+        print_error("An error occurred while getting the registry mirror")
+        print_error(exc)
+        raise typer.Exit(2)
+
+    cache = format_size(current.cache_size)
+    if current.mirror is None or not current.state:
+        print_step(f"No registry mirror is running, its cache uses {cache}")
+        return
+
+    mirror = current.mirror
+    print_step(f"Registry mirror of '{mirror.upstream}' on '{mirror.address}'")
+    silent_print(f"Container is {current.state}, its cache uses {cache}")
+    if current.daemon_uses_mirror:
+        silent_print("Docker pulls images through the mirror")
+    else:
+        print_daemon_hint(mirror)
+
+
+@app.command(short_help="Remove leftovers of runners which were not cleaned up.")
+def gc(
+    dry_run: bool = typer.Option(
+        False,
+        "--dry-run",
+        "-n",
+        help="Only show what would be removed.",
+    ),
+    repos: Optional[List[str]] = typer.Option(
+        None,
+        "--repo",
+        help="Also look for registrations of runners of this repository.",
+    ),
+    concurrency: int = typer.Option(
+        8,
+        "--concurrency",
+        "-j",
+        min=1,
+        help="Maximum number of listings or removals at the same time.",
+    ),
+    min_age: float = typer.Option(
+        DEFAULT_MIN_AGE,
+        "--min-age",
+        min=0.0,
+        help="Seconds after which leftovers are removed, to spare new runners.",
+    ),
+):
+    try:
+        runners = list(Runners)
+    except RunnerFileIOError as exc:
+        print_error("An issue with the runner file occurred")
+        print_error(exc)
+        raise typer.Exit(2)
+
+    known = sorted({runner.repo for runner in runners} | set(repos or []))
+    try:
+        with status("Taking inventory of runners"):
+            inventory = take_inventory(WUSA_RUNNER_DIR, known, concurrency)
+    except NoAccessToken:
+        print_error("Please run 'wusa auth' to authenticate")
+        raise typer.Exit(-1)
+
+    for source, exc in inventory.failures.items():
+        if source in known:
+            print_error(f"Issue obtaining runner information for '{source}'")
+        else:
+            print_error(f"Issue obtaining list of {source}s")
+        print_error(exc)
+
+    names = {runner.name for runner in runners}
+    orphans = find_orphans(inventory, names, min_age, host_label(WUSA_BASE_DIR))
+    if not orphans:
+        print_step("Nothing to remove")
+    elif dry_run:
+        for orphan in orphans:
+            print_step(f"Would remove {orphan.kind} '{orphan.name}'")
+    else:
+        with batch_progress(len(orphans), steps=1) as progress:
+            failures = remove_orphans(orphans, progress, max_workers=concurrency)
+
+        for orphan, exc in failures.items():
+            print_error(f"Failed to remove {orphan.kind} '{orphan.name}': {exc}")
+        success(f"{len(orphans) - len(failures)} of {len(orphans)} leftovers removed")
+        if failures:
+            raise typer.Exit(1)
+
+    if inventory.failures:
+        raise typer.Exit(1)
+
+
+@app.command(short_help="Export metrics of runners for Prometheus.")
+def metrics(
+    host: str = typer.Option(
+        "127.0.0.1",
+        "--host",
+        help="Address the metrics are served on.",
+    ),
+    port: int = typer.Option(
+        9464,
+        "--port",
+        "-p",
+        help="Port the metrics are served on, as '/metrics'.",
+    ),
+    textfile: Optional[Path] = typer.Option(
+        None,
+        "--textfile",
+        dir_okay=False,
+        help="Write metrics to a file of the textfile collector instead.",
+    ),
+    interval: float = typer.Option(
+        15.0,
+        "--interval",
+        min=1.0,
+        help="Seconds between writes of the textfile.",
+    ),
+    once: bool = typer.Option(
+        False,
+        "--once",
+        help="Print or write the metrics once and exit.",
+    ),
+):
+    from http.server import BaseHTTPRequestHandler
+    from http.server import ThreadingHTTPServer
+
+    from .metrics import MetricsCollector
+    from .metrics import write_textfile
+
+    collector = MetricsCollector(WUSA_BASE_DIR)
+
+    if once and textfile is None:
+        typer.echo(collector.collect(), nl=False)
+        return
+
+    if textfile is not None:
+        if not once:
+            print_step(f"Writing metrics to '{textfile}' every {interval:g}s")
+        while True:
+            write_textfile(textfile, collector.collect())
+            if once:
+                return
+            sleep(interval)
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = collector.collect().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    try:
+        server = ThreadingHTTPServer((host, port), MetricsHandler)
+    except OSError as exc:
+        print_error(f"Unable to serve metrics on {host}:{port}")
+        print_error(exc)
+        raise typer.Exit(1)
+
+    print_step(f"Serving metrics on 'http://{host}:{port}/metrics'")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
 
 @app.command(short_help="Login or refresh your authentication.")
 def auth():
+    from .gh import get_gh_access_token
+    from .gh import get_gh_verification_codes
+    from .gh import save_access_token
+
     try:
         verification_response = get_gh_verification_codes()
     except GHError as exc:
@@ -172,14 +1248,24 @@ def auth():
     save_access_token(access_token)
 
 
+def record_gh_usage() -> None:
+    # commands which do not talk to GitHub do not import its client at all
+    gh = sys.modules.get(f"{__package__}.gh")
+    if gh is not None:
+        gh.record_gh_usage()
+
+
 def version_info(value: bool):
     if value:
+        from importlib.metadata import version
+
         typer.echo(version(__package__))
         raise typer.Exit()
 
 
 @app.callback()
 def main(
+    ctx: typer.Context,
     version: bool = typer.Option(
         None,
         "--version",
@@ -187,5 +1273,40 @@ def main(
         is_eager=True,
         help="Print version of wusa.",
     ),
+    no_cache: bool = typer.Option(
+        False,
+        "--no-cache",
+        help="Do not use cached responses of GitHub API.",
+    ),
+    timings: bool = typer.Option(
+        False,
+        "--timings",
+        help="Print how long the steps, docker and GitHub calls took.",
+    ),
+    trace_file: Optional[Path] = typer.Option(
+        None,
+        "--trace",
+        dir_okay=False,
+        help="Write timings as Chrome trace to a JSON file.",
+    ),
 ):
-    pass
+    if no_cache:
+        from .gh import set_http_cache
+
+        set_http_cache(False)
+    ctx.call_on_close(record_gh_usage)
+
+    if timings or trace_file:
+        TRACER.enabled = True
+        # every span of the command is recorded as child of this span
+        command_span = TRACER.span(f"wusa {ctx.invoked_subcommand}")
+        command_span.__enter__()
+
+        def report_timings():
+            command_span.__exit__(None, None, None)
+            if timings:
+                print_timings(TRACER, {"docker API calls": docker_api_calls()})
+            if trace_file:
+                TRACER.write_chrome_trace(trace_file)
+
+        ctx.call_on_close(report_timings)
@@ -0,0 +1,233 @@
+# -*- coding: utf-8 -*-
+import os
+from bisect import bisect_left
+from collections import Counter
+from pathlib import Path
+from tempfile import NamedTemporaryFile
+from threading import Lock
+from typing import Dict
+from typing import Iterable
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+from .docker import wusa_container_name
+from .docker import wusa_docker_list_containers
+from .events import EVENT_LOG
+from .events import EventTail
+from .exceptions import DockerError
+from .exceptions import NoDockerServerFound
+from .runners import Runners
+from .runners import RunnersList
+
+CGROUP_ROOT = Path("/sys/fs/cgroup")
+
+# seconds, create and startup of runners take tens of seconds
+LATENCY_BUCKETS = (1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+
+RUNNER_EVENTS = {
+    "create": "Seconds to register and configure a runner.",
+    "startup": "Seconds until a runner listens for jobs.",
+    "remove": "Seconds to remove a runner.",
+}
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(labels: Labels, **extra: str) -> str:
+    pairs = list(labels) + list(extra.items())
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in pairs) + "}"
+
+
+class Histogram:
+    def __init__(self, buckets: Iterable[float] = LATENCY_BUCKETS) -> None:
+        self.buckets = sorted(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def lines(self, name: str, labels: Labels) -> List[str]:
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            le = _labels(labels, le=f"{bound:g}")
+            lines.append(f"{name}_bucket{le} {cumulative}")
+        total = sum(self.counts)
+        lines.append(f"{name}_bucket{_labels(labels, le='+Inf')} {total}")
+        lines.append(f"{name}_sum{_labels(labels)} {self.sum:g}")
+        lines.append(f"{name}_count{_labels(labels)} {total}")
+        return lines
+
+
+def cgroup_stats(cgroup_root: Path, container_id: str) -> Dict[str, float]:
+    """CPU seconds and memory bytes of a container from its cgroup files.
+
+    Supports cgroup v2 with the systemd driver and cgroup v1. Reading the files
+    is much cheaper than ``docker stats``, which samples for a second. Nothing is
+    returned if the cgroup is not found, e.g. for a remote docker server.
+    """
+    stats: Dict[str, float] = {}
+
+    v2 = cgroup_root / "system.slice" / f"docker-{container_id}.scope"
+    if not v2.exists():
+        v2 = cgroup_root / "docker" / container_id
+    if (v2 / "cpu.stat").exists():
+        for line in (v2 / "cpu.stat").read_text().splitlines():
+            key, _, value = line.partition(" ")
+            if key == "usage_usec":
+                stats["cpu_seconds"] = int(value) / 1e6
+        memory = v2 / "memory.current"
+        if memory.exists():
+            stats["memory_bytes"] = float(memory.read_text())
+        return stats
+
+    cpuacct = cgroup_root / "cpuacct" / "docker" / container_id / "cpuacct.usage"
+    if cpuacct.exists():
+        stats["cpu_seconds"] = int(cpuacct.read_text()) / 1e9
+    memory = cgroup_root / "memory" / "docker" / container_id
+    if (memory / "memory.usage_in_bytes").exists():
+        stats["memory_bytes"] = float((memory / "memory.usage_in_bytes").read_text())
+    return stats
+
+
+class MetricsCollector:
+    """Collects metrics of the runner fleet in the Prometheus text format.
+
+    A scrape reads the cached runner store, lists the containers of wusa with a
+    single sparse docker call and reads their cgroup files. Latencies and GitHub usage
+    come from the event log, of which only new lines are read by every scrape.
+    """
+
+    def __init__(
+        self,
+        base_dir: Path,
+        runners: RunnersList = Runners,
+        cgroup_root: Path = CGROUP_ROOT,
+    ) -> None:
+        self.runners = runners
+        self.cgroup_root = cgroup_root
+        self._events = EventTail(base_dir / EVENT_LOG)
+        self._histograms: Dict[Tuple[str, Labels], Histogram] = {}
+        self._github_requests = 0
+        self._rate_limit: Optional[Tuple[int, int]] = None
+        self._lock = Lock()
+
+    def _read_events(self) -> None:
+        for event in self._events.read():
+            kind = event.get("kind")
+            if kind in RUNNER_EVENTS and "seconds" in event:
+                key = (kind, (("repo", str(event.get("repo", ""))),))
+                histogram = self._histograms.setdefault(key, Histogram())
+                histogram.observe(float(event["seconds"]))
+            elif kind == "github":
+                self._github_requests += int(event.get("requests", 0))
+                if "rate_limit_remaining" in event:
+                    self._rate_limit = (
+                        int(event["rate_limit"]),
+                        int(event["rate_limit_remaining"]),
+                    )
+
+    def _runner_lines(self) -> List[str]:
+        counts = Counter(
+            (runner.repo, runner.status or "unknown") for runner in self.runners
+        )
+        lines = [
+            "# HELP wusa_runners Local runners by repository and status.",
+            "# TYPE wusa_runners gauge",
+        ]
+        for (repo, status), count in sorted(counts.items()):
+            labels = (("repo", repo), ("status", status))
+            lines.append(f"wusa_runners{_labels(labels)} {count}")
+        return lines
+
+    def _histogram_lines(self) -> List[str]:
+        lines = []
+        for kind, description in RUNNER_EVENTS.items():
+            name = f"wusa_runner_{kind}_seconds"
+            lines += [f"# HELP {name} {description}", f"# TYPE {name} histogram"]
+            for (event_kind, labels), histogram in sorted(self._histograms.items()):
+                if event_kind == kind:
+                    lines += histogram.lines(name, labels)
+        return lines
+
+    def _github_lines(self) -> List[str]:
+        lines = [
+            "# HELP wusa_github_requests_total Requests of wusa to GitHub API.",
+            "# TYPE wusa_github_requests_total counter",
+            f"wusa_github_requests_total {self._github_requests}",
+        ]
+        if self._rate_limit is not None:
+            limit, remaining = self._rate_limit
+            lines += [
+                "# HELP wusa_github_rate_limit Requests per hour to GitHub API.",
+                "# TYPE wusa_github_rate_limit gauge",
+                f"wusa_github_rate_limit {limit}",
+                "# HELP wusa_github_rate_limit_remaining Requests left this hour.",
+                "# TYPE wusa_github_rate_limit_remaining gauge",
+                f"wusa_github_rate_limit_remaining {remaining}",
+            ]
+        return lines
+
+    def _container_lines(self) -> List[str]:
+        try:
+            containers = wusa_docker_list_containers(sparse=True)
+        except (DockerError, NoDockerServerFound):
+            return []
+
+        cpu_lines = [
+            "# HELP wusa_container_cpu_seconds_total CPU time of runner containers.",
+            "# TYPE wusa_container_cpu_seconds_total counter",
+        ]
+        memory_lines = [
+            "# HELP wusa_container_memory_bytes Memory usage of runner containers.",
+            "# TYPE wusa_container_memory_bytes gauge",
+        ]
+        up_lines = [
+            "# HELP wusa_container_running Whether a runner container is running.",
+            "# TYPE wusa_container_running gauge",
+        ]
+        for container in containers:
+            labels = (("name", wusa_container_name(container)),)
+            running = int(container.status == "running")
+            up_lines.append(f"wusa_container_running{_labels(labels)} {running}")
+            stats = cgroup_stats(self.cgroup_root, container.id)
+            if "cpu_seconds" in stats:
+                value = f"{stats['cpu_seconds']:g}"
+                cpu_lines.append(
+                    f"wusa_container_cpu_seconds_total{_labels(labels)} {value}"
+                )
+            if "memory_bytes" in stats:
+                value = f"{stats['memory_bytes']:g}"
+                memory_lines.append(
+                    f"wusa_container_memory_bytes{_labels(labels)} {value}"
+                )
+        return up_lines + cpu_lines + memory_lines
+
+    def collect(self) -> str:
+        with self._lock:
+            self._read_events()
+            lines = (
+                self._runner_lines()
+                + self._histogram_lines()
+                + self._github_lines()
+                + self._container_lines()
+            )
+        return "\n".join(lines) + "\n"
+
+
+def write_textfile(path: Path, content: str) -> None:
+    """Replaces ``path`` atomically, as expected by the textfile collector."""
+    with NamedTemporaryFile("w", dir=path.parent, prefix=".wusa-", delete=False) as fp:
+        fp.write(content)
+    os.chmod(fp.name, 0o644)
+    os.replace(fp.name, path)
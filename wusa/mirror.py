@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+from dataclasses import asdict
+from dataclasses import dataclass
+from json import dumps
+from json import loads
+from json.decoder import JSONDecodeError
+from pathlib import Path
+from shutil import rmtree
+from time import time
+from typing import Dict
+from typing import List
+from typing import Optional
+
+from .docker import LogMatch
+from .docker import wusa_docker_container_stop
+from .docker import wusa_docker_get_service
+from .docker import wusa_docker_info
+from .docker import wusa_docker_run_service
+from .toolcache import disk_usage
+
+MIRROR_IMAGE = "registry:2"
+MIRROR_NAME = "wusa-mirror"
+MIRROR_FILE = "mirror.json"
+# blobs and manifests pulled through the mirror
+MIRROR_DIR = "mirror"
+DEFAULT_MIRROR_PORT = 5000
+DEFAULT_UPSTREAM = "https://registry-1.docker.io"
+# seconds the registry may take to listen
+MIRROR_STARTUP_TIMEOUT = 60.0
+
+
+@dataclass
+class Mirror:
+    """Pull-through cache of a registry, served on the loopback of the host.
+
+    The docker daemon may use registries on the loopback without TLS, so the
+    daemon, shared by all runners, reaches the mirror on ``address``.
+    """
+
+    port: int
+    upstream: str
+    started: float
+
+    @property
+    def address(self) -> str:
+        return f"127.0.0.1:{self.port}"
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.address}"
+
+
+@dataclass
+class MirrorStatus:
+    mirror: Optional[Mirror]
+    # state of the mirror container, empty without container
+    state: str
+    cache_size: int
+    # the docker daemon pulls images of the upstream through the mirror
+    daemon_uses_mirror: bool
+
+
+def read_mirror(base_dir: Path) -> Optional[Mirror]:
+    try:
+        return Mirror(**loads((base_dir / MIRROR_FILE).read_text()))
+    except (FileNotFoundError, JSONDecodeError, TypeError):
+        return None
+
+
+def write_mirror(base_dir: Path, mirror: Mirror) -> None:
+    base_dir.mkdir(parents=True, exist_ok=True)
+    (base_dir / MIRROR_FILE).write_text(dumps(asdict(mirror)))
+
+
+def remove_mirror(base_dir: Path) -> None:
+    try:
+        (base_dir / MIRROR_FILE).unlink()
+    except FileNotFoundError:
+        pass
+
+
+def mirror_environment(base_dir: Path) -> Dict[str, str]:
+    """Variables telling jobs of runners where the mirror is, if it is up."""
+    mirror = read_mirror(base_dir)
+    if mirror is None:
+        return {}
+    return {"WUSA_REGISTRY_MIRROR": mirror.address}
+
+
+def daemon_mirrors() -> List[str]:
+    """Registry mirrors of the docker daemon, e.g. 'http://127.0.0.1:5000'."""
+    config = wusa_docker_info().get("RegistryConfig") or {}
+    return [mirror.rstrip("/") for mirror in config.get("Mirrors") or []]
+
+
+def mirror_up(
+    base_dir: Path,
+    port: int = DEFAULT_MIRROR_PORT,
+    upstream: str = DEFAULT_UPSTREAM,
+) -> Mirror:
+    """Starts the mirror, or keeps it if it runs already with the same settings.
+
+    The cache of the mirror is kept in the wusa directory, so it survives
+    restarts of the mirror.
+    """
+    current = read_mirror(base_dir)
+    container = wusa_docker_get_service(MIRROR_NAME)
+    if (
+        current is not None
+        and container is not None
+        and container.status == "running"
+        and (current.port, current.upstream) == (port, upstream)
+    ):
+        return current
+    if container is not None:
+        wusa_docker_container_stop(container)
+
+    storage = base_dir / MIRROR_DIR
+    # docker would create a missing directory owned by root
+    storage.mkdir(parents=True, exist_ok=True)
+    wusa_docker_run_service(
+        MIRROR_IMAGE,
+        MIRROR_NAME,
+        ports={"5000/tcp": ("127.0.0.1", port)},
+        mounts=[f"{storage}:/var/lib/registry"],
+        environment={"REGISTRY_PROXY_REMOTEURL": upstream},
+        ready=LogMatch("listening on"),
+        timeout=MIRROR_STARTUP_TIMEOUT,
+    )
+    mirror = Mirror(port, upstream, time())
+    write_mirror(base_dir, mirror)
+    return mirror
+
+
+def mirror_down(base_dir: Path, purge: bool = False) -> bool:
+    """Stops and removes the mirror, and its cache if ``purge``.
+
+    Returns
+    -------
+        Whether there was a mirror container.
+    """
+    container = wusa_docker_get_service(MIRROR_NAME)
+    if container is not None:
+        wusa_docker_container_stop(container)
+    remove_mirror(base_dir)
+    if purge and (base_dir / MIRROR_DIR).exists():
+        rmtree(base_dir / MIRROR_DIR)
+    return container is not None
+
+
+def mirror_status(base_dir: Path) -> MirrorStatus:
+    mirror = read_mirror(base_dir)
+    container = wusa_docker_get_service(MIRROR_NAME)
+    storage = base_dir / MIRROR_DIR
+    cache_size = disk_usage(storage)[0] if storage.exists() else 0
+    uses_mirror = mirror is not None and mirror.url in daemon_mirrors()
+    return MirrorStatus(
+        mirror,
+        container.status if container is not None else "",
+        cache_size,
+        uses_mirror,
+    )
@@ -1,16 +1,33 @@
 # -*- coding: utf-8 -*-
+import csv
+import sys
 from contextlib import contextmanager
+from enum import Enum
+from json import dumps
+from typing import IO
+from typing import TYPE_CHECKING
+from typing import Any
+from typing import Dict
 from typing import Generator
 from typing import Iterable
+from typing import Iterator
 from typing import List
 from typing import Optional
 from typing import Protocol
 from typing import Union
 
 from rich.console import Console
-from rich.prompt import Confirm
 from rich.table import Table
 
+from .tracing import Span
+from .tracing import Tracer
+from .tracing import span
+
+if TYPE_CHECKING:
+    from rich.progress import Progress
+    from rich.progress import TaskID
+    from rich.tree import Tree
+
 CONSOLE = Console()
 ERROR_CONSOLE = Console(stderr=True)
 
@@ -23,6 +40,8 @@ class RunnerObject(Protocol):
 
 
 def press_enter_to(message: str) -> bool:
+    from rich.prompt import Confirm
+
     confirm = Confirm.ask(
         "[bold]*[/bold] Press Enter to " + message,
         show_choices=False,
@@ -52,32 +71,217 @@ def print_error(message: Union[str, Exception]) -> None:
     )
 
 
+def print_warning(message: str) -> None:
+    ERROR_CONSOLE.print(
+        "[bold black on yellow] WARNING [/bold black on yellow] " + message,
+        highlight=False,
+    )
+
+
+def _runners_table(with_repo_column: bool) -> Table:
+    table = Table()
+
+    table.add_column("Runner name", style="bold blue", no_wrap=True)
+    if with_repo_column:
+        table.add_column("Repository", style="magenta")
+    table.add_column("Status")
+    table.add_column("Labels")
+
+    return table
+
+
+def _add_runner_row(table: Table, runner: RunnerObject, with_repo_column: bool) -> None:
+    runner_status = runner.status
+    if runner_status in ["online", "idle"]:
+        runner_status = "[green]" + runner_status + "[/green]"
+    else:
+        runner_status = "[grey50]" + runner_status + "[/grey50]"
+
+    args = [runner.name]
+
+    if with_repo_column:
+        args += [runner.repo]
+
+    args += [runner_status, ", ".join(runner.labels)]
+    table.add_row(*args)
+
+
 def print_runners(
     runners: Iterable[RunnerObject],
     with_repo_column: bool = True,
 ) -> None:
+    table = _runners_table(with_repo_column)
+
+    for runner in runners:
+        _add_runner_row(table, runner, with_repo_column)
+
+    CONSOLE.print(table)
+
+
+class LiveRunnerObject(RunnerObject, Protocol):
+    container: str
+    github: str
+
+
+def _state(state: str) -> str:
+    if state in ["running", "online", "idle"]:
+        return f"[green]{state}[/green]"
+    if state in ["paused", "busy", "restarting"]:
+        return f"[yellow]{state}[/yellow]"
+    if state in ["unknown", ""]:
+        return f"[grey50]{state}[/grey50]"
+    return f"[red]{state}[/red]"
+
+
+def print_live_runners(
+    runners: Iterable[LiveRunnerObject],
+    with_github: bool = False,
+) -> None:
+    """Prints runners with the state of their container and on GitHub."""
     table = Table()
 
     table.add_column("Runner name", style="bold blue", no_wrap=True)
+    table.add_column("Repository", style="magenta")
+    table.add_column("Container")
+    if with_github:
+        table.add_column("GitHub")
+    table.add_column("Labels")
+
+    for runner in runners:
+        container = _state(runner.container)
+        if runner.status:
+            container += f" [grey50]({runner.status})[/grey50]"
+        args = [runner.name, runner.repo, container]
+        if with_github:
+            args += [_state(runner.github)]
+        args += [", ".join(runner.labels)]
+        table.add_row(*args)
+
+    CONSOLE.print(table)
+
+
+class OutputFormat(str, Enum):
+    table = "table"
+    json = "json"
+    ndjson = "ndjson"
+    csv = "csv"
+
+
+def runner_records(
+    runners: Iterable[RunnerObject],
+    fields: List[str],
+) -> Iterator[Dict[str, Any]]:
+    for runner in runners:
+        yield {field: getattr(runner, field) for field in fields}
+
+
+def write_records(
+    records: Iterable[Dict[str, Any]],
+    output_format: OutputFormat,
+    fields: List[str],
+    fp: Optional[IO[str]] = None,
+) -> None:
+    """Writes every record as soon as it is taken from ``records``.
+
+    Records are written as plain text, without building a table or rendering
+    markup, so thousands of runners can be piped into other tools. Lists, e.g.
+    labels, are joined by commas in CSV. Records go to stdout by default.
+    """
+    fp = fp or sys.stdout
+    if output_format == OutputFormat.ndjson:
+        for record in records:
+            fp.write(dumps(record) + "\n")
+
+    elif output_format == OutputFormat.json:
+        # an array which is valid JSON only once all records are written
+        separator = "\n"
+        fp.write("[")
+        for record in records:
+            fp.write(separator + dumps(record))
+            separator = ",\n"
+        fp.write("\n]\n" if separator != "\n" else "]\n")
+
+    elif output_format == OutputFormat.csv:
+        writer = csv.DictWriter(fp, fieldnames=fields, lineterminator="\n")
+        writer.writeheader()
+        for record in records:
+            writer.writerow(
+                {
+                    key: ",".join(value) if isinstance(value, list) else value
+                    for key, value in record.items()
+                }
+            )
+
+    else:
+        raise ValueError(f"Records can not be written as '{output_format.value}'")
+
+    fp.flush()
+
+
+def _stream_table(with_repo_column: bool, show_header: bool) -> Table:
+    # rows are printed one by one, so columns are not measured but fixed
+    table = Table(box=None, show_header=show_header, pad_edge=False)
+
+    table.add_column("Runner name", style="bold blue", width=20, no_wrap=True)
     if with_repo_column:
-        table.add_column("Repository", style="magenta")
-    table.add_column("Status")
+        table.add_column("Repository", style="magenta", width=32)
+    table.add_column("Status", width=10)
     table.add_column("Labels")
 
+    return table
+
+
+def stream_runners(
+    runners: Iterable[RunnerObject],
+    with_repo_column: bool = True,
+) -> None:
+    """Same as ``print_runners`` but prints rows while ``runners`` is consumed.
+
+    The header is printed once and every runner in its own row afterwards, so
+    rows which scrolled off the terminal are never printed again. Without a
+    terminal, the runners are printed as table once all are listed.
+    """
+    if not CONSOLE.is_terminal:
+        print_runners(runners, with_repo_column)
+        return
+
+    CONSOLE.print(_stream_table(with_repo_column, show_header=True))
     for runner in runners:
-        runner_status = runner.status
-        if runner_status in ["online", "idle"]:
-            runner_status = "[green]" + runner_status + "[/green]"
-        else:
-            runner_status = "[grey50]" + runner_status + "[/grey50]"
+        row = _stream_table(with_repo_column, show_header=False)
+        _add_runner_row(row, runner, with_repo_column)
+        CONSOLE.print(row)
 
-        args = [runner.name]
 
-        if with_repo_column:
-            args += [runner.repo]
+class PoolObject(Protocol):
+    repo: str
+    labels: List[str]
+    size: int
+    standby: int
+    hits: int
+    misses: int
 
-        args += [runner_status, ", ".join(runner.labels)]
-        table.add_row(*args)
+
+def print_pools(pools: Iterable[PoolObject]) -> None:
+    table = Table()
+
+    table.add_column("Repository", style="magenta", no_wrap=True)
+    table.add_column("Labels")
+    table.add_column("Standby", justify="right")
+    table.add_column("Hits", justify="right")
+    table.add_column("Misses", justify="right")
+    table.add_column("Hit rate", justify="right")
+
+    for pool in pools:
+        requests = pool.hits + pool.misses
+        hit_rate = f"{pool.hits / requests:.0%}" if requests else "-"
+        table.add_row(
+            pool.repo,
+            ", ".join(pool.labels),
+            f"{pool.standby}/{pool.size}",
+            str(pool.hits),
+            str(pool.misses),
+            hit_rate,
+        )
 
     CONSOLE.print(table)
 
@@ -86,7 +290,182 @@ def print_runners(
 def status(
     message: str, on_success: Optional[str] = None
 ) -> Generator[None, None, None]:
-    with CONSOLE.status(message):
+    with CONSOLE.status(message), span(message):
         yield
     if on_success:
         success(on_success)
+
+
+class ProgressReporter(Protocol):
+    def update(self, index: int, message: str) -> None:
+        ...
+
+    def done(self, index: int, message: str) -> None:
+        ...
+
+    def failed(self, index: int, message: str) -> None:
+        ...
+
+
+class BatchProgress:
+    """Per-item progress display for operations running concurrently."""
+
+    def __init__(self, progress: "Progress", total: int, steps: int) -> None:
+        self._progress = progress
+        self._steps = steps
+        self._tasks: List["TaskID"] = [
+            progress.add_task(f"#{i + 1} Waiting", total=steps) for i in range(total)
+        ]
+
+    def update(self, index: int, message: str) -> None:
+        self._progress.update(
+            self._tasks[index], description=f"#{index + 1} {message}", advance=1
+        )
+
+    def done(self, index: int, message: str) -> None:
+        task = self._tasks[index]
+        self._progress.update(
+            task,
+            description=f"#{index + 1} [green]{message}[/green]",
+            completed=self._steps,
+        )
+
+    def failed(self, index: int, message: str) -> None:
+        self._progress.update(
+            self._tasks[index], description=f"#{index + 1} [red]{message}[/red]"
+        )
+
+
+class LogProgress:
+    """Reports progress of concurrent operations line by line, e.g. for daemons."""
+
+    def update(self, index: int, message: str) -> None:
+        silent_print(f"#{index + 1} {message}")
+
+    def done(self, index: int, message: str) -> None:
+        success(f"#{index + 1} {message}")
+
+    def failed(self, index: int, message: str) -> None:
+        print_error(f"#{index + 1} {message}")
+
+
+@contextmanager
+def batch_progress(total: int, steps: int) -> Generator[BatchProgress, None, None]:
+    from rich.progress import BarColumn
+    from rich.progress import Progress
+    from rich.progress import SpinnerColumn
+    from rich.progress import TextColumn
+
+    progress = Progress(
+        SpinnerColumn(),
+        TextColumn("{task.description}"),
+        BarColumn(),
+        console=CONSOLE,
+    )
+    with progress:
+        yield BatchProgress(progress, total, steps)
+
+
+# statuses of docker after which a layer is on the host
+LAYER_DONE = ("Pull complete", "Already exists")
+
+
+class LayerProgress:
+    """Progress of every layer of a 'docker pull'."""
+
+    def __init__(self, progress: "Progress") -> None:
+        self._progress = progress
+        self._layers: Dict[str, "TaskID"] = {}
+
+    def event(self, event: Dict[str, Any]) -> None:
+        layer = event.get("id")
+        status = event.get("status", "")
+        if not layer or "progressDetail" not in event:
+            silent_print(status)
+            return
+
+        if layer not in self._layers:
+            self._layers[layer] = self._progress.add_task(layer)
+        task = self._layers[layer]
+
+        detail = event["progressDetail"] or {}
+        if status in LAYER_DONE:
+            total = self._progress.tasks[task].total
+            self._progress.update(
+                task,
+                description=f"{layer} [green]{status}[/green]",
+                total=total,
+                completed=total,
+            )
+        elif status == "Downloading" and detail.get("total"):
+            self._progress.update(
+                task,
+                description=f"{layer} {status}",
+                total=detail["total"],
+                completed=detail.get("current", 0),
+            )
+        else:
+            self._progress.update(task, description=f"{layer} {status}")
+
+
+class LayerLog:
+    """Reports a 'docker pull' line by line, e.g. for background processes."""
+
+    def event(self, event: Dict[str, Any]) -> None:
+        layer = event.get("id")
+        status = event.get("status", "")
+        if not layer or "progressDetail" not in event:
+            silent_print(status)
+        elif status in LAYER_DONE:
+            silent_print(f"{layer}: {status}")
+
+
+@contextmanager
+def pull_progress() -> Generator[LayerProgress, None, None]:
+    from rich.progress import BarColumn
+    from rich.progress import DownloadColumn
+    from rich.progress import Progress
+    from rich.progress import TextColumn
+
+    progress = Progress(
+        TextColumn("{task.description}"),
+        BarColumn(),
+        DownloadColumn(),
+        console=CONSOLE,
+    )
+    with progress:
+        yield LayerProgress(progress)
+
+
+def _add_spans(
+    tree: "Tree",
+    spans: List[Span],
+    children: Dict[Span, List[Span]],
+) -> None:
+    # spans of the same name on one level are merged, e.g. many GitHub calls
+    by_name: Dict[str, List[Span]] = {}
+    for child in sorted(spans, key=lambda s: s.start):
+        by_name.setdefault(child.name, []).append(child)
+
+    for name, same_spans in by_name.items():
+        total = sum(s.duration for s in same_spans)
+        label = f"{name} [bold]{total * 1000:.1f} ms[/bold]"
+        if len(same_spans) > 1:
+            label += f" [grey50]({len(same_spans)} times)[/grey50]"
+        branch = tree.add(label)
+        grandchildren = [c for s in same_spans for c in children.get(s, [])]
+        _add_spans(branch, grandchildren, children)
+
+
+def print_timings(tracer: Tracer, counts: Dict[str, int] = {}) -> None:
+    """Prints spans of ``tracer`` as tree to stderr, so output can be piped.
+
+    ``counts``, e.g. the number of docker API calls, are printed below the spans.
+    """
+    from rich.tree import Tree
+
+    tree = Tree("Timings", guide_style="grey50")
+    _add_spans(tree, tracer.roots(), tracer.children())
+    for name, count in counts.items():
+        tree.add(f"{name} [bold]{count}[/bold]")
+    ERROR_CONSOLE.print(tree, highlight=False)
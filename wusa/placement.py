@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+import os
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+from typing import Dict
+from typing import Iterable
+from typing import List
+from typing import Optional
+from typing import Set
+
+from .exceptions import PlacementError
+
+NODE_DIR = Path("/sys/devices/system/node")
+
+Topology = Dict[int, List[int]]
+
+
+@dataclass
+class ResourceLimits:
+    """Resource limits of a runner container, empty or zero for no limit.
+
+    Parameters
+    ----------
+    cpus
+        CPU quota in number of CPUs, e.g. ``1.5``.
+
+    cpuset
+        CPUs the container is pinned to, e.g. ``"0-3,8"``.
+
+    memory
+        Memory limit as understood by docker, e.g. ``"4g"``.
+
+    pids_limit
+        Maximum number of processes in the container.
+    """
+
+    cpus: float = 0.0
+    cpuset: str = ""
+    memory: str = ""
+    pids_limit: int = 0
+
+    def docker_kwargs(self) -> Dict[str, Any]:
+        kwargs: Dict[str, Any] = {}
+        if self.cpus:
+            kwargs["nano_cpus"] = int(self.cpus * 1e9)
+        if self.cpuset:
+            kwargs["cpuset_cpus"] = self.cpuset
+        if self.memory:
+            kwargs["mem_limit"] = self.memory
+        if self.pids_limit:
+            kwargs["pids_limit"] = self.pids_limit
+        return kwargs
+
+
+def parse_cpulist(cpulist: str) -> List[int]:
+    """Parses a cpu list of the kernel or docker, e.g. '0-3,8'."""
+    cpus: List[int] = []
+    for part in cpulist.strip().split(","):
+        if not part:
+            continue
+        first, _, last = part.partition("-")
+        cpus.extend(range(int(first), int(last or first) + 1))
+    return cpus
+
+
+def format_cpulist(cpus: Iterable[int]) -> str:
+    ranges: List[str] = []
+    start = previous = None
+    for cpu in sorted(set(cpus)):
+        if previous is not None and cpu == previous + 1:
+            previous = cpu
+            continue
+        if start is not None:
+            ranges.append(str(start) if start == previous else f"{start}-{previous}")
+        start = previous = cpu
+    if start is not None:
+        ranges.append(str(start) if start == previous else f"{start}-{previous}")
+    return ",".join(ranges)
+
+
+def read_topology(node_dir: Path = NODE_DIR) -> Topology:
+    """Returns the CPUs usable by wusa by NUMA node.
+
+    Without NUMA information all usable CPUs are on node 0.
+    """
+    usable = set(os.sched_getaffinity(0))
+    topology: Topology = {}
+    for cpulist in sorted(node_dir.glob("node[0-9]*/cpulist")):
+        node = int(cpulist.parent.name[len("node") :])
+        cpus = [cpu for cpu in parse_cpulist(cpulist.read_text()) if cpu in usable]
+        if cpus:
+            topology[node] = cpus
+    return topology or {0: sorted(usable)}
+
+
+def place_cpuset(
+    cores: int,
+    used: Set[int],
+    topology: Optional[Topology] = None,
+) -> str:
+    """Picks ``cores`` CPUs which are not ``used`` by other runners.
+
+    Runners are kept on a single NUMA node if possible, taking the node with the
+    most free CPUs, so runners are spread across nodes. Otherwise the CPUs are
+    taken from the nodes with the most free CPUs.
+    """
+    if topology is None:
+        topology = read_topology()
+
+    free = {
+        node: [cpu for cpu in cpus if cpu not in used]
+        for node, cpus in topology.items()
+    }
+    by_free = sorted(free, key=lambda node: (-len(free[node]), node))
+
+    for node in by_free:
+        if len(free[node]) >= cores:
+            return format_cpulist(free[node][:cores])
+
+    if sum(len(cpus) for cpus in free.values()) < cores:
+        raise PlacementError(f"Not enough free CPUs to place a runner on {cores}")
+
+    picked: List[int] = []
+    for node in by_free:
+        picked += free[node][: cores - len(picked)]
+    return format_cpulist(picked)
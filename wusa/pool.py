@@ -0,0 +1,259 @@
+# -*- coding: utf-8 -*-
+from contextlib import contextmanager
+from dataclasses import asdict
+from dataclasses import dataclass
+from json import dumps
+from json import loads
+from json.decoder import JSONDecodeError
+from pathlib import Path
+from typing import Dict
+from typing import Generator
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+from . import WUSA_BASE_DIR
+from .background import run_in_background
+from .exceptions import DockerError
+from .exceptions import RunnerFileIOError
+from .output import ProgressReporter
+from .runners import Runner
+from .runners import Runners
+from .runners import RunnersList
+from .state import file_lock
+from .tokens import get_runner_token
+
+STANDBY = "standby"
+
+
+def pool_key(repo: str, labels: List[str]) -> str:
+    return repo + ":" + ",".join(sorted(labels))
+
+
+@dataclass
+class PoolConfig:
+    repo: str
+    labels: List[str]
+    size: int = 1
+    shared_image: bool = False
+    # paused standby runners do not pick up jobs before they are handed out
+    paused: bool = True
+    hits: int = 0
+    misses: int = 0
+
+
+@dataclass
+class PoolStatus:
+    repo: str
+    labels: List[str]
+    size: int
+    standby: int
+    hits: int
+    misses: int
+
+
+class WarmPool:
+    """Standby runners which are configured and started ahead of time.
+
+    Pools are kept by repository and label set in a JSON file next to the runner
+    file. Standby runners are regular entries of ``Runners`` with the status
+    'standby'. Taking a runner only marks it as regular runner and resumes its
+    container, which replaces the registration, configuration and startup of a
+    new runner. Every taken runner counts as hit of the pool, every runner which
+    had to be created instead as miss.
+    """
+
+    def __init__(self, path: Path, runners: RunnersList = Runners) -> None:
+        self.path = path
+        self.runners = runners
+        self._lock_path = path.with_name(path.name + ".lock")
+        self._fill_lock_path = path.with_name(path.name + ".fill.lock")
+
+    def _read(self) -> Dict[str, PoolConfig]:
+        try:
+            content = loads(self.path.read_text())
+        except FileNotFoundError:
+            return {}
+        except JSONDecodeError:
+            raise RunnerFileIOError("Can not decode pool file!")
+        return {key: PoolConfig(**config) for key, config in content.items()}
+
+    def _write(self, pools: Dict[str, PoolConfig]) -> None:
+        content = {key: asdict(config) for key, config in pools.items()}
+        self.path.write_text(dumps(content, indent=2))
+
+    @contextmanager
+    def _pools(self) -> Generator[Dict[str, PoolConfig], None, None]:
+        with file_lock(self._lock_path):
+            pools = self._read()
+            yield pools
+            self._write(pools)
+
+    def configs(self) -> Dict[str, PoolConfig]:
+        return self._read()
+
+    def config(self, repo: str, labels: List[str] = []) -> Optional[PoolConfig]:
+        return self._read().get(pool_key(repo, labels))
+
+    def configure(
+        self,
+        repo: str,
+        labels: List[str] = [],
+        size: Optional[int] = None,
+        shared_image: Optional[bool] = None,
+        paused: Optional[bool] = None,
+    ) -> PoolConfig:
+        """Creates or changes the pool of ``repo`` and ``labels``.
+
+        Options which are not given are kept, statistics are never reset.
+        """
+        key = pool_key(repo, labels)
+        with self._pools() as pools:
+            config = pools.setdefault(key, PoolConfig(repo, sorted(labels)))
+            if size is not None:
+                config.size = size
+            if shared_image is not None:
+                config.shared_image = shared_image
+            if paused is not None:
+                config.paused = paused
+        return config
+
+    def unconfigure(self, repo: str, labels: List[str] = []) -> None:
+        with self._pools() as pools:
+            pools.pop(pool_key(repo, labels), None)
+
+    def standby(self, repo: str, labels: List[str] = []) -> List[Runner]:
+        labels = sorted(labels)
+        return [
+            runner
+            for runner in self.runners
+            if runner.status == STANDBY
+            and runner.repo == repo
+            and runner.labels == labels
+        ]
+
+    def take(
+        self,
+        repo: str,
+        labels: List[str] = [],
+        count: int = 1,
+        shared_image: bool = False,
+    ) -> List[Runner]:
+        """Hands out up to ``count`` standby runners and records hits and misses.
+
+        Nothing is counted if there is no pool for ``repo`` and ``labels`` or its
+        runners are not of the requested image mode (``shared_image``). Runners
+        which can not be resumed are marked with the status 'error' and count as
+        misses.
+        """
+        key = pool_key(repo, labels)
+        taken: List[Runner] = []
+        broken: List[Runner] = []
+
+        if not self.path.exists():
+            return []
+
+        with self._pools() as pools:
+            config = pools.get(key)
+            if config is None or config.shared_image != shared_image:
+                return []
+
+            for runner in self.standby(repo, labels):
+                # left from before the image mode of the pool was changed
+                if bool(runner.image) != shared_image:
+                    continue
+                if len(taken) == count:
+                    break
+                try:
+                    runner.resume()
+                except DockerError:
+                    runner.status = "error"
+                    broken.append(runner)
+                    continue
+                runner.status = ""
+                taken.append(runner)
+
+            # stored while locked, so no runner is taken twice
+            self.runners.update(taken + broken)
+            config.hits += len(taken)
+            config.misses += count - len(taken)
+
+        return taken
+
+    def fill(
+        self,
+        repo: str,
+        labels: List[str],
+        progress: ProgressReporter,
+        max_workers: int = 4,
+    ) -> Tuple[List[Runner], Dict[int, Exception]]:
+        """Creates standby runners until the pool has its configured size.
+
+        Concurrent fills of any pool wait for each other, so pools are never
+        filled above their size.
+        """
+        with file_lock(self._fill_lock_path):
+            config = self.config(repo, labels)
+            if config is None:
+                return [], {}
+
+            missing = config.size - len(self.standby(repo, labels))
+            if missing <= 0:
+                return [], {}
+
+            token = get_runner_token(repo, "registration")
+            return self.runners.create_new_runners(
+                repo,
+                token,
+                missing,
+                progress,
+                labels=labels,
+                max_workers=max_workers,
+                shared_image=config.shared_image,
+                status=STANDBY,
+                pause=config.paused,
+            )
+
+    def drain(self, repo: str, labels: List[str] = []) -> List[str]:
+        """Removes the pool and all its standby runners.
+
+        Returns the names of the removed runners.
+        """
+        self.unconfigure(repo, labels)
+        removed = []
+        for runner in self.standby(repo, labels):
+            self.runners.remove(runner.name)
+            removed.append(runner.name)
+        return removed
+
+    def status(self) -> List[PoolStatus]:
+        pools = self._read()
+        standby: Dict[str, int] = {key: 0 for key in pools}
+        for runner in self.runners:
+            key = pool_key(runner.repo, runner.labels)
+            if runner.status == STANDBY and key in standby:
+                standby[key] += 1
+
+        return [
+            PoolStatus(
+                config.repo,
+                config.labels,
+                config.size,
+                standby[key],
+                config.hits,
+                config.misses,
+            )
+            for key, config in pools.items()
+        ]
+
+
+def get_pool() -> WarmPool:
+    return WarmPool(WUSA_BASE_DIR / "pool.json")
+
+
+def refill_in_background(repo: str, labels: List[str] = []) -> None:
+    """Starts ``wusa pool fill`` as detached process, logging into 'pool.log'."""
+    args = ["pool", "fill", repo]
+    for label in labels:
+        args += ["--label", label]
+    run_in_background(args, WUSA_BASE_DIR / "pool.log")
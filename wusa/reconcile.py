@@ -0,0 +1,283 @@
+# -*- coding: utf-8 -*-
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from dataclasses import field
+from pathlib import Path
+from shutil import rmtree
+from time import time
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import Iterable
+from typing import List
+from typing import Optional
+from typing import Set
+from typing import Tuple
+
+from .docker import wusa_container_name
+from .docker import wusa_docker_container_stop
+from .docker import wusa_docker_list_containers
+from .docker import wusa_docker_list_images
+from .docker import wusa_docker_remove_image
+from .exceptions import DockerError
+from .exceptions import NoDockerServerFound
+from .output import ProgressReporter
+from .tracing import propagate
+
+# names of runners, and so of their containers and images, created by wusa
+RUNNER_PREFIX = "wusa-"
+# debris younger than this may belong to a runner which is still being created
+DEFAULT_MIN_AGE = 600.0
+
+CONTAINER = "container"
+IMAGE = "image"
+WORKDIR = "workdir"
+REGISTRATION = "registration"
+
+
+@dataclass(frozen=True)
+class Orphan:
+    """Resource of a runner which is not in the runner store anymore.
+
+    ``ref`` is what is removed: the container, the image name, the path of the
+    workdir or the ID of the runner registered on GitHub for ``repo``.
+    """
+
+    kind: str
+    name: str
+    ref: Any = field(compare=False)
+    repo: str = ""
+
+
+@dataclass
+class Inventory:
+    """Resources of runners by runner name, with their age in seconds.
+
+    Registrations on GitHub are kept by repository and runner name, as runners
+    of several repositories may have the same name, with their ID, status and
+    labels.
+    The inventories which could not be taken are in ``failures`` by kind.
+    """
+
+    containers: Dict[str, Tuple[Any, float]] = field(default_factory=dict)
+    images: Dict[str, float] = field(default_factory=dict)
+    workdirs: Dict[str, Tuple[Path, float]] = field(default_factory=dict)
+    registrations: Dict[Tuple[str, str], Tuple[int, str, List[str]]] = field(
+        default_factory=dict
+    )
+    failures: Dict[str, Exception] = field(default_factory=dict)
+
+
+def _containers(now: float) -> Dict[str, Tuple[Any, float]]:
+    containers = wusa_docker_list_containers(sparse=True)
+    return {
+        wusa_container_name(c): (c, now - c.attrs.get("Created", now))
+        for c in containers
+    }
+
+
+def _images(now: float) -> Dict[str, float]:
+    images: Dict[str, float] = {}
+    for image in wusa_docker_list_images(RUNNER_PREFIX + "*"):
+        for tag in image.tags:
+            name = tag.rsplit(":", 1)[0]
+            if name.startswith(RUNNER_PREFIX):
+                images[name] = now - image.attrs.get("Created", now)
+    return images
+
+
+def _workdirs(runner_dir: Path, now: float) -> Dict[str, Tuple[Path, float]]:
+    if not runner_dir.is_dir():
+        return {}
+    return {
+        path.name: (path, now - path.stat().st_mtime)
+        for path in runner_dir.iterdir()
+        if path.is_dir()
+    }
+
+
+def _registrations(
+    repos: Iterable[str],
+    concurrency: int,
+    failures: Dict[str, Exception],
+) -> Dict[Tuple[str, str], Tuple[int, str, List[str]]]:
+    # the GitHub client is imported only by commands which talk to GitHub
+    from .gh import api_runner_list
+    from .gh import iter_gh_api_many
+
+    apis = {repo: api_runner_list(repo) for repo in repos}
+    registrations: Dict[Tuple[str, str], Tuple[int, str, List[str]]] = {}
+    if not apis:
+        return registrations
+    for repo, runner in iter_gh_api_many(apis, "runners", concurrency=concurrency):
+        if isinstance(runner, Exception):
+            failures[repo] = runner
+        else:
+            labels = [label["name"] for label in runner.get("labels", [])]
+            registrations[(repo, runner["name"])] = (
+                runner["id"],
+                runner["status"],
+                labels,
+            )
+    return registrations
+
+
+def take_inventory(
+    runner_dir: Path,
+    repos: Iterable[str],
+    concurrency: int = 8,
+) -> Inventory:
+    """Lists containers, images, workdirs and registrations on GitHub at once.
+
+    Containers, images and workdirs are listed in threads while the runners of
+    every repository in ``repos`` are listed concurrently on GitHub.
+    """
+    now = time()
+    inventory = Inventory()
+    listings: Dict[str, Callable[[], Any]] = {
+        CONTAINER: lambda: _containers(now),
+        IMAGE: lambda: _images(now),
+        WORKDIR: lambda: _workdirs(runner_dir, now),
+    }
+
+    with ThreadPoolExecutor(max_workers=len(listings)) as executor:
+        futures = {
+            kind: executor.submit(propagate(listing))
+            for kind, listing in listings.items()
+        }
+        inventory.registrations = _registrations(repos, concurrency, inventory.failures)
+
+        for kind, future in futures.items():
+            try:
+                setattr(inventory, kind + "s", future.result())
+            except (DockerError, NoDockerServerFound, OSError) as exc:
+                inventory.failures[kind] = exc
+
+    return inventory
+
+
+def find_orphans(
+    inventory: Inventory,
+    runners: Set[str],
+    min_age: float = DEFAULT_MIN_AGE,
+    host: Optional[str] = None,
+) -> List[Orphan]:
+    """Resources of runners which are not in ``runners``, the stored runners.
+
+    Containers, images and workdirs are orphans once they are ``min_age``
+    seconds old, so runners which are being created right now are kept. A
+    registration is an orphan if it is offline and has no container anymore.
+    Only registrations with the label ``host`` are considered, as runners of
+    other hosts are registered with the same repositories. Without ``host``,
+    no registration is an orphan.
+    """
+    orphans: List[Orphan] = []
+
+    for name, (container, age) in sorted(inventory.containers.items()):
+        if name not in runners and age >= min_age:
+            orphans.append(Orphan(CONTAINER, name, container))
+
+    for name, age in sorted(inventory.images.items()):
+        if name not in runners and age >= min_age:
+            orphans.append(Orphan(IMAGE, name, name))
+
+    for name, (path, age) in sorted(inventory.workdirs.items()):
+        if name not in runners and age >= min_age:
+            orphans.append(Orphan(WORKDIR, name, path))
+
+    # without the list of containers, a registration might have one
+    if host is not None and CONTAINER not in inventory.failures:
+        for (repo, name), (runner_id, status, labels) in sorted(
+            inventory.registrations.items()
+        ):
+            if (
+                host in labels
+                and name.startswith(RUNNER_PREFIX)
+                and name not in runners
+                and name not in inventory.containers
+                and status == "offline"
+            ):
+                orphans.append(Orphan(REGISTRATION, name, runner_id, repo))
+
+    return orphans
+
+
+def _remove(orphan: Orphan) -> None:
+    if orphan.kind == CONTAINER:
+        wusa_docker_container_stop(orphan.ref)
+    elif orphan.kind == IMAGE:
+        wusa_docker_remove_image(orphan.ref)
+    elif orphan.kind == WORKDIR:
+        rmtree(orphan.ref)
+
+
+def remove_orphans(
+    orphans: List[Orphan],
+    progress: ProgressReporter,
+    max_workers: int = 8,
+) -> Dict[Orphan, Exception]:
+    """Removes ``orphans`` in parallel, images after all containers.
+
+    Registrations are deleted on GitHub concurrently by the shared client while
+    containers and workdirs are removed. Images are removed last, as an image
+    can not be removed while a container of it exists.
+
+    Returns
+    -------
+        Exceptions of the orphans which could not be removed.
+    """
+    failures: Dict[Orphan, Exception] = {}
+    index = {orphan: i for i, orphan in enumerate(orphans)}
+
+    def remove(orphan: Orphan) -> None:
+        try:
+            _remove(orphan)
+        except Exception as exc:
+            failures[orphan] = exc
+            progress.failed(index[orphan], f"Failed to remove {orphan.kind}")
+        else:
+            progress.done(index[orphan], f"Removed {orphan.kind} '{orphan.name}'")
+
+    registrations = [o for o in orphans if o.kind == REGISTRATION]
+    images = [o for o in orphans if o.kind == IMAGE]
+    others = [o for o in orphans if o.kind not in (REGISTRATION, IMAGE)]
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        removals = [executor.submit(propagate(remove), o) for o in others]
+        if registrations:
+            _delete_registrations(registrations, max_workers, progress, index, failures)
+        for removal in removals:
+            removal.result()
+
+        for removal in [executor.submit(propagate(remove), o) for o in images]:
+            removal.result()
+
+    return failures
+
+
+def _delete_registrations(
+    registrations: List[Orphan],
+    concurrency: int,
+    progress: ProgressReporter,
+    index: Dict[Orphan, int],
+    failures: Dict[Orphan, Exception],
+) -> None:
+    from .gh import GHRequest
+    from .gh import api_runner
+    from .gh import batch_gh_api
+
+    requests = [
+        GHRequest("DELETE", api_runner(orphan.repo, orphan.ref))
+        for orphan in registrations
+    ]
+    try:
+        responses: List[Any] = batch_gh_api(requests, concurrency)
+    except Exception as exc:
+        responses = [exc] * len(registrations)
+
+    for orphan, response in zip(registrations, responses):
+        if isinstance(response, Exception):
+            failures[orphan] = response
+            progress.failed(index[orphan], "Failed to delete registration")
+        else:
+            progress.done(index[orphan], f"Deleted registration of '{orphan.name}'")
@@ -1,44 +1,171 @@
 # -*- coding: utf-8 -*-
+import os
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import contextmanager
 from dataclasses import asdict
 from dataclasses import dataclass
 from dataclasses import field
+from dataclasses import replace
 from json import dumps
 from json import loads
 from json.decoder import JSONDecodeError
+from pathlib import Path
 from shutil import rmtree
 from string import ascii_lowercase
-from typing import IO
+from time import monotonic
+from typing import Any
+from typing import Callable
 from typing import Dict
 from typing import Generator
+from typing import Hashable
+from typing import Iterable
+from typing import Iterator
 from typing import List
+from typing import Optional
+from typing import Set
+from typing import Tuple
+from typing import TypeVar
 from typing import Union
-
-from shortuuid import ShortUUID
+from uuid import uuid4
 
 from . import WUSA_BASE_DIR
 from . import WUSA_RUNNER_DIR
+from .docker import LogMatch
 from .docker import wusa_docker_commit
 from .docker import wusa_docker_container_stop
+from .docker import wusa_docker_get
 from .docker import wusa_docker_list_containers
+from .docker import wusa_docker_pause
 from .docker import wusa_docker_remove
 from .docker import wusa_docker_remove_image
 from .docker import wusa_docker_run
+from .docker import wusa_docker_unpause
+from .events import EVENT_LOG
+from .events import append_event
+from .exceptions import ContainerExited
 from .exceptions import InvalidRunnerName
 from .exceptions import RunnerFileIOError
-from .gh import api_runner_removal
-from .gh import post_gh_api
+from .image import BASE_IMAGE  # noqa: F401
+from .image import pinned_base_image
+from .mirror import mirror_environment
+from .output import ProgressReporter
 from .output import silent_print
+from .placement import ResourceLimits
+from .placement import parse_cpulist
+from .placement import place_cpuset
+from .state import Entry
+from .state import RunnerStore
+from .state import file_lock
+from .state import open_runner_store
+from .toolcache import PRUNE_INTERVAL
+from .toolcache import cache_environment
+from .toolcache import cache_mounts
+from .toolcache import end_job
+from .toolcache import prune_caches
+from .tracing import propagate
+
+RUNNER_IDENTITY_FILES = (".runner", ".credentials", ".credentials_rsaparams")
+
+DEFAULT_STARTUP_TIMEOUT = 300.0
+
+# CPUs placed for runners which are not stored yet, see ``RunnersList.reserve``
+CPU_RESERVATIONS = "cpu-reservations.json"
+CPU_RESERVATIONS_LOCK = "cpu-reservations.lock"
+
+# ID of the wusa directory, registered as label of every runner created here
+HOST_ID = "host-id"
+HOST_LABEL_PREFIX = "wusa-host-"
+
+T = TypeVar("T")
+
+
+def base_image() -> str:
+    """Base image of new runners, pinned by ``wusa image pull`` if possible."""
+    return pinned_base_image(WUSA_BASE_DIR)
+
+
+def host_label(base_dir: Path) -> str:
+    """Label of runners created with ``base_dir``, e.g. 'wusa-host-0a1b2c3d4e5f'.
+
+    Several hosts may register runners with the same repository, so runners on
+    GitHub are told apart by this label. The ID is created on first use.
+    """
+    path = base_dir / HOST_ID
+    with file_lock(base_dir / (HOST_ID + ".lock")):
+        try:
+            host_id = path.read_text().strip()
+        except FileNotFoundError:
+            host_id = ""
+        if not host_id:
+            host_id = uuid4().hex[:12]
+            path.write_text(host_id)
+    return HOST_LABEL_PREFIX + host_id
+
+
+def with_fresh_token(
+    repo: str, kind: str, token: str, configure: Callable[[str], T]
+) -> T:
+    """Calls ``configure`` with ``token``, and once more if config.sh failed.
+
+    Cached tokens may be revoked by GitHub before they expire, so a failed
+    ``configure``, which raises ``ContainerExited``, drops the token from the
+    cache and is retried with a fresh ``kind`` token.
+    """
+    try:
+        return configure(token)
+    except ContainerExited:
+        # the GitHub client is imported only by commands which talk to GitHub
+        from .tokens import get_runner_token
+        from .tokens import invalidate_runner_token
 
-UUID = ShortUUID(alphabet=ascii_lowercase)
+        invalidate_runner_token(repo, kind)
+        silent_print(f"- Retrying with a new {kind} token")
+        return configure(get_runner_token(repo, kind))
 
 
-@contextmanager
-def open_runner_file(mode: str) -> Generator[IO, None, None]:
-    runner_file = WUSA_BASE_DIR / "runners.json"
-    runner_file.touch()
-    with runner_file.open(mode) as fp:
-        yield fp
+def startup_timeout() -> float:
+    """Seconds a runner may take to listen for jobs (``WUSA_STARTUP_TIMEOUT``)."""
+    return float(os.environ.get("WUSA_STARTUP_TIMEOUT", DEFAULT_STARTUP_TIMEOUT))
+
+
+def record_runner_event(kind: str, runner: "Runner", seconds: float) -> None:
+    """Appends how long ``kind``, e.g. 'startup', of ``runner`` took to the log."""
+    event = {
+        "kind": kind,
+        "name": runner.name,
+        "repo": runner.repo,
+        "image": runner.runner_image,
+        "seconds": round(seconds, 3),
+    }
+    append_event(WUSA_BASE_DIR / EVENT_LOG, event)
+
+
+def read_reservations(base_dir: Path) -> Dict[str, Dict[str, Any]]:
+    """CPUs reserved for runners being created, without those of exited processes."""
+    try:
+        reservations = loads((base_dir / CPU_RESERVATIONS).read_text())
+    except (FileNotFoundError, JSONDecodeError):
+        return {}
+    return {
+        key: reservation
+        for key, reservation in reservations.items()
+        if _is_alive(reservation["pid"])
+    }
+
+
+def write_reservations(base_dir: Path, reservations: Dict[str, Any]) -> None:
+    base_dir.mkdir(parents=True, exist_ok=True)
+    (base_dir / CPU_RESERVATIONS).write_text(dumps(reservations))
+
+
+def _is_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
 
 
 @dataclass
@@ -47,15 +174,22 @@ class Runner:
     repo: str
     status: str
     labels: List[str] = field(default_factory=list)
+    # image shared by runners - empty for runners with their own committed image
+    image: str = ""
+    limits: ResourceLimits = field(default_factory=ResourceLimits)
 
     def __post_init__(self) -> None:
         self.labels = sorted(self.labels)
+        if isinstance(self.limits, dict):
+            self.limits = ResourceLimits(**self.limits)
+        # created on first use, listing runners does not touch the filesystem
         self.workdir = WUSA_RUNNER_DIR / self.name
-        self.workdir.mkdir(exist_ok=True)
 
     @classmethod
     def new(cls, repo: str, labels: List[str] = []) -> "Runner":
-        name = "wusa-" + UUID.random(length=8)
+        from shortuuid import ShortUUID
+
+        name = "wusa-" + ShortUUID(alphabet=ascii_lowercase).random(length=8)
         return cls(name, repo, "", labels)
 
     @classmethod
@@ -69,70 +203,193 @@ class Runner:
     def url(self) -> str:
         return f"https://github.com/{self.repo}"
 
+    @property
+    def runner_image(self) -> str:
+        return self.image or self.name
+
+    @property
+    def identity_dir(self) -> Path:
+        """Directory in the workdir holding the runner identity for shared images."""
+        return self.workdir / ".wusa-identity"
+
+    def _with_identity(self, command: str) -> str:
+        if not self.image:
+            return command
+        return f"cp -a {self.identity_dir}/. ./ && {command}"
+
+    def _mount_workdir(self) -> List[str]:
+        # docker would create a missing workdir owned by root
+        self.workdir.mkdir(parents=True, exist_ok=True)
+        return [f"{self.workdir}:{self.workdir}"]
+
     def as_dict(self) -> Dict[str, Union[str, List[str]]]:
         return asdict(self)
 
-    def up(self) -> None:
+    def up(self, quiet: bool = False) -> None:
+        started = monotonic()
+        environment = {**cache_environment(), **mirror_environment(WUSA_BASE_DIR)}
         wusa_docker_run(
-            "bash -c './run.sh'",
-            self.name,
+            f"bash -c '{self._with_identity('./run.sh')}'",
+            self.runner_image,
             self.name,
-            stop_logging_substr="Listening for Jobs",
-            mounts=[f"{self.workdir}:{self.workdir}"],
+            mounts=self._mount_workdir() + cache_mounts(WUSA_BASE_DIR),
             mount_docker=True,
+            quiet=quiet,
+            ready=LogMatch("Listening for Jobs"),
+            timeout=startup_timeout(),
+            limits=self.limits.docker_kwargs(),
+            environment=environment,
         )
+        record_runner_event("startup", self, monotonic() - started)
+
+    def pause(self) -> None:
+        wusa_docker_pause(wusa_docker_get(self.name))
+
+    def resume(self) -> None:
+        wusa_docker_unpause(wusa_docker_get(self.name))
 
     def cleanup(self) -> None:
+        started = monotonic()
         # directly unpack container list
         (container,) = wusa_docker_list_containers(name=self.name)
         wusa_docker_container_stop(container)
         silent_print("# Getting removal token")
-        response = post_gh_api(api_runner_removal(self.repo))
+        # the GitHub client is imported only by commands which talk to GitHub
+        from .tokens import get_runner_token
+
+        token = get_runner_token(self.repo, "removal")
         silent_print("- Got removal token")
-        token = response["token"]
-        removal_container = wusa_docker_run(
-            f"bash -c './config.sh remove --token {token}'",
-            self.name,
+
+        def remove(token: str) -> Any:
+            removal_cmd = self._with_identity(f"./config.sh remove --token {token}")
+            return wusa_docker_run(
+                f"bash -c '{removal_cmd}'",
+                self.runner_image,
+                self.name,
+                mounts=self._mount_workdir() if self.image else [],
+                check=True,
+            )
+
+        try:
+            removal_container = with_fresh_token(self.repo, "removal", token, remove)
+        except ContainerExited:
+            # e.g. the runner was deleted on GitHub already, which is left as is
+            silent_print("GitHub did not delete runner")
+        else:
+            silent_print("GitHub deleted runner")
+            wusa_docker_container_stop(removal_container)
+        if not self.image:
+            wusa_docker_remove_image(self.name)
+        silent_print("# Removing working directory")
+        if self.workdir.exists():
+            rmtree(self.workdir)
+        silent_print("- Removed working directory")
+        record_runner_event("remove", self, monotonic() - started)
+        # unlike creating runners, removing them is not waited for by jobs
+        try:
+            end_job(WUSA_BASE_DIR, self.name)
+            prune_caches(WUSA_BASE_DIR, interval=PRUNE_INTERVAL)
+        except OSError:
+            pass
+
+    def migrate_to_shared_image(self, image: Optional[str] = None) -> None:
+        """Moves identity of a runner with a committed image into its workdir.
+
+        The runner is restarted from the shared ``image``, by default the pinned
+        base image, and its committed image is removed afterwards.
+        """
+        if self.image:
+            return
+
+        silent_print("# Copying runner identity into working directory")
+        self.identity_dir.mkdir(parents=True, exist_ok=True)
+        files = " ".join(RUNNER_IDENTITY_FILES)
+        copy_container = wusa_docker_run(
+            f"bash -c 'cp -a {files} {self.identity_dir}/'",
             self.name,
+            f"{self.name}-migration",
+            mounts=self._mount_workdir(),
         )
-        silent_print("GitHub deleted runner")
-        wusa_docker_container_stop(removal_container)
+        wusa_docker_container_stop(copy_container)
+        silent_print("- Copied runner identity")
+
+        for container in wusa_docker_list_containers(name=self.name):
+            if container.name == self.name:
+                wusa_docker_container_stop(container)
+
+        self.image = image or base_image()
+        self.up()
         wusa_docker_remove_image(self.name)
-        silent_print("# Removing working directory")
-        rmtree(self.workdir)
-        silent_print("- Removed working directory")
 
 
 class RunnersList:
-    @property
-    def _runners(self) -> List[Runner]:
-        try:
-            with open_runner_file(mode="r") as fp:
-                file_content = fp.read()
-                if file_content:
-                    raw_list = loads(file_content)
-                else:
-                    raw_list = []
-        except JSONDecodeError:
-            raise RunnerFileIOError("Can not decode runner file!")
+    """Registry of local runners backed by a runner store (see ``wusa.state``).
+
+    Stored runners are loaded only once and kept in memory together with an
+    index by runner name. The cache is invalidated whenever the store reports a
+    new version, e.g. after another process changed it. Assigning a new list
+    only writes the entries which were added, changed or removed.
+    """
+
+    def __init__(self) -> None:
+        self._cache: List[Runner] = []
+        self._index: Dict[str, Runner] = {}
+        self._saved: Dict[str, Entry] = {}
+        self._stamp: Optional[Hashable] = None
+        self._store_dir: Optional[Path] = None
+        self._runner_store: Optional[RunnerStore] = None
 
-        runner_list = []
-        for entry in raw_list:
-            runner_list.append(Runner(**entry))
+    def _store(self) -> RunnerStore:
+        if self._runner_store is None or self._store_dir != WUSA_BASE_DIR:
+            self._runner_store = open_runner_store(WUSA_BASE_DIR)
+            self._store_dir = WUSA_BASE_DIR
+            self._stamp = None
+        return self._runner_store
 
-        return runner_list
+    def _load(self) -> None:
+        store = self._store()
+        stamp = store.version()
+        self._cache = [Runner(**entry) for entry in store.load()]
+        self._index = {runner.name: runner for runner in self._cache}
+        self._saved = {runner.name: runner.as_dict() for runner in self._cache}
+        self._stamp = stamp
+
+    def _refresh(self) -> None:
+        if self._stamp != self._store().version():
+            self._load()
+
+    @property
+    def _runners(self) -> List[Runner]:
+        self._refresh()
+        return self._cache
 
     @_runners.setter
     def _runners(self, list_runners: List[Runner]) -> None:
-        processed_list = []
-        for runner in list_runners:
-            processed_list.append(runner.as_dict())
+        store = self._store()
+        processed = {runner.name: runner.as_dict() for runner in list_runners}
+        upserts = [
+            entry for name, entry in processed.items() if self._saved.get(name) != entry
+        ]
+        removals = [name for name in self._saved if name not in processed]
 
-        try:
-            with open_runner_file(mode="w") as fp:
-                fp.write(dumps(processed_list))
-        except TypeError:
-            raise RunnerFileIOError("Can not write to runner file!")
+        if upserts or removals:
+            try:
+                before, after = store.apply(upserts, removals)
+            except RunnerFileIOError:
+                self._stamp = None
+                raise
+        else:
+            before = after = store.version()
+
+        # changed by someone else -> only our changes are applied, reload later
+        if before != self._stamp:
+            self._stamp = None
+            return
+
+        self._cache = list(list_runners)
+        self._index = {runner.name: runner for runner in self._cache}
+        self._saved = processed
+        self._stamp = after
 
     def __len__(self) -> int:
         return len(self._runners)
@@ -140,44 +397,278 @@ class RunnersList:
     def __getitem__(self, key: int) -> Runner:
         return self._runners[key]
 
-    def remove(self, runner_name: str) -> None:
-        runners = self._runners
-        for i, runner in enumerate(runners):
-            if runner.name == runner_name:
-                runners[i].cleanup()
-                del runners[i]
-                break
-        else:
+    def __iter__(self) -> Iterator[Runner]:
+        # snapshot avoids checking the runner file for every single item
+        return iter(list(self._runners))
+
+    def __contains__(self, runner_name: object) -> bool:
+        self._refresh()
+        return runner_name in self._index
+
+    def get(self, runner_name: str) -> Runner:
+        self._refresh()
+        try:
+            return self._index[runner_name]
+        except KeyError:
             raise InvalidRunnerName(f"No runner with name '{runner_name}' found")
 
+    def remove(self, runner_name: str) -> None:
+        runner = self.get(runner_name)
+        runner.cleanup()
+        self._runners = [r for r in self._runners if r is not runner]
+
+    def remove_many(
+        self,
+        runner_names: List[str],
+        progress: ProgressReporter,
+        max_workers: int = 4,
+    ) -> Tuple[List[str], Dict[str, Exception]]:
+        """Cleans up runners concurrently and removes them from the store at once.
+
+        Runners whose cleanup failed are kept, as parts of them may still exist.
+        Unknown names are reported as failures as well. Removal tokens are shared
+        by all runners of a repository through the token cache.
+        """
+        names = list(dict.fromkeys(runner_names))
+        failures: Dict[str, Exception] = {}
+        cleaned_up: List[bool] = [False] * len(names)
+
+        # resolved up front, so workers do not read the store concurrently
+        runners: Dict[int, Runner] = {}
+        for index, name in enumerate(names):
+            try:
+                runners[index] = self.get(name)
+            except InvalidRunnerName as exc:
+                failures[name] = exc
+                progress.failed(index, str(exc))
+
+        def cleanup(index: int) -> None:
+            runner = runners[index]
+            try:
+                progress.update(index, f"Removing runner '{runner.name}'")
+                runner.cleanup()
+                cleaned_up[index] = True
+                progress.done(index, f"Runner '{runner.name}' removed")
+            except Exception as exc:
+                failures[runner.name] = exc
+                progress.failed(index, str(exc) or type(exc).__name__)
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            list(executor.map(propagate(cleanup), runners))
+
+        removed = [name for name, done in zip(names, cleaned_up) if done]
+        if removed:
+            removed_names = set(removed)
+            self._runners = [r for r in self._runners if r.name not in removed_names]
+
+        return removed, failures
+
+    def add(self, new_runners: Iterable[Runner]) -> None:
+        runners = self._runners
+        runners.extend(new_runners)
         self._runners = runners
 
+    def update(self, changed_runners: Iterable[Runner]) -> None:
+        changed = {runner.name: runner for runner in changed_runners}
+        self._runners = [changed.get(r.name, r) for r in self._runners]
+
+    def used_cpus(self) -> Set[int]:
+        return {cpu for runner in self for cpu in parse_cpulist(runner.limits.cpuset)}
+
+    def place(
+        self,
+        count: int,
+        limits: ResourceLimits,
+        place_cores: int,
+        reserved: Set[int] = set(),
+    ) -> List[ResourceLimits]:
+        """Returns ``limits`` of ``count`` new runners.
+
+        With ``place_cores``, every runner is pinned to that many CPUs which are
+        neither used by stored runners, nor ``reserved``, nor by the other new
+        runners. Its CPU quota defaults to the number of pinned CPUs.
+        """
+        if not place_cores:
+            return [limits] * count
+
+        used = self.used_cpus() | reserved
+        placed = []
+        for _ in range(count):
+            cpuset = place_cpuset(place_cores, used)
+            used.update(parse_cpulist(cpuset))
+            cpus = limits.cpus or float(place_cores)
+            placed.append(replace(limits, cpuset=cpuset, cpus=cpus))
+        return placed
+
+    @contextmanager
+    def reserve(
+        self,
+        count: int,
+        limits: ResourceLimits,
+        place_cores: int,
+    ) -> Generator[List[ResourceLimits], None, None]:
+        """Places new runners and reserves their CPUs until they are stored.
+
+        New runners are only stored once they are provisioned, so their CPUs are
+        reserved in the meantime, which keeps concurrent ``wusa create --place``
+        from pinning runners to the same CPUs.
+        """
+        if not place_cores:
+            yield self.place(count, limits, place_cores)
+            return
+
+        key = uuid4().hex
+        with file_lock(WUSA_BASE_DIR / CPU_RESERVATIONS_LOCK):
+            reservations = read_reservations(WUSA_BASE_DIR)
+            reserved = {cpu for cpus in reservations.values() for cpu in cpus["cpus"]}
+            placed = self.place(count, limits, place_cores, reserved)
+            reservations[key] = {
+                "pid": os.getpid(),
+                "cpus": [cpu for lim in placed for cpu in parse_cpulist(lim.cpuset)],
+            }
+            write_reservations(WUSA_BASE_DIR, reservations)
+
+        try:
+            yield placed
+        finally:
+            with file_lock(WUSA_BASE_DIR / CPU_RESERVATIONS_LOCK):
+                reservations = read_reservations(WUSA_BASE_DIR)
+                reservations.pop(key, None)
+                write_reservations(WUSA_BASE_DIR, reservations)
+
+    def configure_new_runner(
+        self,
+        repo: str,
+        token: str,
+        labels: List[str] = [],
+        quiet: bool = False,
+        shared_image: bool = False,
+        limits: ResourceLimits = ResourceLimits(),
+    ) -> Runner:
+        started = monotonic()
+
+        def configure(token: str) -> Runner:
+            new_runner = Runner.new(repo, labels)
+            new_runner.limits = limits
+            cmd = (
+                f"./config.sh "
+                f" --unattended "
+                f" --url {new_runner.url} "
+                f" --name {new_runner.name} "
+                f" --work {new_runner.workdir} "
+                f" --replace "
+                f" --token {token} "
+            )
+            # not stored with the runner, as it is not chosen by the user
+            registered_labels = new_runner.labels + [host_label(WUSA_BASE_DIR)]
+            cmd += f" --labels {','.join(registered_labels)} "
+            image = base_image()
+            if shared_image:
+                # identity stays in the workdir instead of a new image
+                new_runner.image = image
+                new_runner.identity_dir.mkdir(parents=True, exist_ok=True)
+                files = " ".join(RUNNER_IDENTITY_FILES)
+                try:
+                    container = wusa_docker_run(
+                        f"bash -c '{cmd} && cp -a {files} {new_runner.identity_dir}/'",
+                        image,
+                        new_runner.name,
+                        mounts=new_runner._mount_workdir(),
+                        quiet=quiet,
+                        check=True,
+                    )
+                except ContainerExited:
+                    rmtree(new_runner.workdir, ignore_errors=True)
+                    raise
+                wusa_docker_remove(container)
+            else:
+                container = wusa_docker_run(
+                    f"bash -c '{cmd}'",
+                    image,
+                    new_runner.name,
+                    quiet=quiet,
+                    check=True,
+                )
+                wusa_docker_commit(container, new_runner.name)
+                wusa_docker_remove(container)
+            return new_runner
+
+        new_runner = with_fresh_token(repo, "registration", token, configure)
+        record_runner_event("create", new_runner, monotonic() - started)
+        return new_runner
+
     def create_new_runner(
         self,
         repo: str,
         token: str,
         labels: List[str] = [],
+        shared_image: bool = False,
+        limits: ResourceLimits = ResourceLimits(),
+        place_cores: int = 0,
     ) -> Runner:
-        runners = self._runners
-        new_runner = Runner.new(repo, labels)
-        cmd = (
-            f"./config.sh "
-            f" --unattended "
-            f" --url {new_runner.url} "
-            f" --name {new_runner.name} "
-            f" --work {new_runner.workdir} "
-            f" --replace "
-            f" --token {token} "
-        )
-        container = wusa_docker_run(
-            f"bash -c '{cmd}'", "wusarunner/base-linux:latest", new_runner.name
-        )
-        wusa_docker_commit(container, new_runner.name)
-        wusa_docker_remove(container)
-        runners.append(new_runner)
-        self._runners = runners
+        with self.reserve(1, limits, place_cores) as (limits,):
+            new_runner = self.configure_new_runner(
+                repo, token, labels, shared_image=shared_image, limits=limits
+            )
+            self.add([new_runner])
 
         return new_runner
 
+    def create_new_runners(
+        self,
+        repo: str,
+        token: str,
+        count: int,
+        progress: ProgressReporter,
+        labels: List[str] = [],
+        max_workers: int = 4,
+        shared_image: bool = False,
+        status: str = "",
+        pause: bool = False,
+        limits: ResourceLimits = ResourceLimits(),
+        place_cores: int = 0,
+    ) -> Tuple[List[Runner], Dict[int, Exception]]:
+        """Configures and starts ``count`` runners concurrently.
+
+        Every runner which got configured is stored, even if its startup failed,
+        as its image exists and it is registered on GitHub. All new entries are
+        written to the runner file at once after every worker has finished.
+        Runners are stored with ``status`` and paused once they are up if
+        ``pause`` is set, e.g. for standby runners of a warm pool.
+        """
+        with self.reserve(count, limits, place_cores) as runner_limits:
+            configured: List[Optional[Runner]] = [None] * count
+            failures: Dict[int, Exception] = {}
+
+            def provision(index: int) -> None:
+                try:
+                    progress.update(index, "Creating new runner")
+                    runner = self.configure_new_runner(
+                        repo,
+                        token,
+                        labels,
+                        quiet=True,
+                        shared_image=shared_image,
+                        limits=runner_limits[index],
+                    )
+                    runner.status = status
+                    configured[index] = runner
+                    progress.update(index, f"Starting up runner '{runner.name}'")
+                    runner.up(quiet=True)
+                    if pause:
+                        runner.pause()
+                    progress.done(index, f"Runner '{runner.name}' is up and running")
+                except Exception as exc:
+                    failures[index] = exc
+                    progress.failed(index, str(exc) or type(exc).__name__)
+
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                list(executor.map(propagate(provision), range(count)))
+
+            new_runners = [runner for runner in configured if runner is not None]
+            self.add(new_runners)
+
+            return new_runners, failures
+
 
 Runners = RunnersList()
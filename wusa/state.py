@@ -0,0 +1,263 @@
+# -*- coding: utf-8 -*-
+import os
+import sqlite3
+from contextlib import contextmanager
+from json import dumps
+from json import loads
+from json.decoder import JSONDecodeError
+from pathlib import Path
+from tempfile import NamedTemporaryFile
+from threading import Lock
+from typing import Any
+from typing import Dict
+from typing import Generator
+from typing import Hashable
+from typing import List
+from typing import Optional
+from typing import Protocol
+from typing import Tuple
+
+from .exceptions import RunnerFileIOError
+
+try:
+    from fcntl import LOCK_EX
+    from fcntl import LOCK_UN
+    from fcntl import flock
+except ImportError:  # pragma: no cover - non-POSIX platforms
+    flock = None  # type: ignore
+
+Entry = Dict[str, Any]
+
+STATE_BACKENDS = ("json", "sqlite")
+
+
+class RunnerStore(Protocol):
+    def version(self) -> Hashable:
+        ...
+
+    def load(self) -> List[Entry]:
+        ...
+
+    def apply(
+        self, upserts: List[Entry], removals: List[str]
+    ) -> Tuple[Hashable, Hashable]:
+        ...
+
+
+def state_backend(base_dir: Path) -> str:
+    """Returns the state backend to use for runners.
+
+    The backend is selected by ``WUSA_STATE_BACKEND``. Without it, SQLite is used
+    as soon as a runner database exists, otherwise ``runners.json``.
+    """
+    backend = os.environ.get("WUSA_STATE_BACKEND", "").lower()
+    if not backend:
+        backend = "sqlite" if (base_dir / "runners.db").exists() else "json"
+
+    if backend not in STATE_BACKENDS:
+        raise RunnerFileIOError(f"Unknown state backend '{backend}'")
+
+    return backend
+
+
+@contextmanager
+def file_lock(path: Path) -> Generator[None, None, None]:
+    """Exclusive cross-process lock using ``flock`` on ``path``."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open("a") as fp:
+        if flock is not None:
+            flock(fp.fileno(), LOCK_EX)
+        try:
+            yield
+        finally:
+            if flock is not None:
+                flock(fp.fileno(), LOCK_UN)
+
+
+class JSONRunnerStore:
+    """Stores runners as a list in a JSON file.
+
+    Writes are serialized across processes with a lock file. The file is read
+    again under the lock, so entries written by others in the meantime are kept,
+    and replaced atomically, so readers never see a partially written file.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._lock_path = path.with_name(path.name + ".lock")
+
+    def version(self) -> Hashable:
+        try:
+            stat = self.path.stat()
+        except FileNotFoundError:
+            return (str(self.path), 0, 0, 0)
+        return (str(self.path), stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+    def load(self) -> List[Entry]:
+        # no 'touch' here as it would change the version of the store
+        if not self.path.exists():
+            return []
+        try:
+            file_content = self.path.read_text()
+            return loads(file_content) if file_content else []
+        except JSONDecodeError:
+            raise RunnerFileIOError("Can not decode runner file!")
+
+    def apply(
+        self, upserts: List[Entry], removals: List[str]
+    ) -> Tuple[Hashable, Hashable]:
+        """Applies the changes and returns the versions right before and after.
+
+        Both versions are taken under the lock, so if the version before is the
+        one the caller knows, nobody else changed the file in between.
+        """
+        with file_lock(self._lock_path):
+            before = self.version()
+            removed = set(removals)
+            updated = {entry["name"]: entry for entry in upserts}
+            entries = []
+            for entry in self.load():
+                if entry["name"] in removed:
+                    continue
+                entries.append(updated.pop(entry["name"], entry))
+            entries.extend(updated.values())
+
+            try:
+                content = dumps(entries)
+            except TypeError:
+                raise RunnerFileIOError("Can not write to runner file!")
+
+            with NamedTemporaryFile(
+                "w", dir=self.path.parent, prefix=".runners-", delete=False
+            ) as fp:
+                fp.write(content)
+            os.replace(fp.name, self.path)
+            return before, self.version()
+
+
+class SQLiteRunnerStore:
+    """Stores runners as rows in a SQLite database.
+
+    The database runs in WAL mode, so readers do not block writers, and every
+    change is a single transaction of row-level inserts and deletes. Entries of
+    a legacy ``runners.json`` are imported once when the database is created.
+    """
+
+    def __init__(self, path: Path, legacy_path: Optional[Path] = None) -> None:
+        self.path = path
+        self._lock = Lock()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            self._connection = sqlite3.connect(
+                str(path),
+                timeout=30,
+                isolation_level=None,
+                check_same_thread=False,
+            )
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA synchronous=NORMAL")
+            self._setup(legacy_path)
+        except sqlite3.Error as exc:
+            raise RunnerFileIOError(f"Can not open runner database: {exc}")
+
+    @contextmanager
+    def _transaction(self) -> Generator[sqlite3.Cursor, None, None]:
+        with self._lock:
+            cursor = self._connection.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            try:
+                yield cursor
+            except BaseException:
+                cursor.execute("ROLLBACK")
+                raise
+            else:
+                cursor.execute("COMMIT")
+
+    def _setup(self, legacy_path: Optional[Path]) -> None:
+        migrated = False
+        with self._transaction() as cursor:
+            cursor.execute(
+                "CREATE TABLE IF NOT EXISTS runners ("
+                " name TEXT PRIMARY KEY,"  # primary key is indexed
+                " repo TEXT NOT NULL,"
+                " status TEXT NOT NULL DEFAULT '',"
+                " data TEXT NOT NULL"
+                ")"
+            )
+            cursor.execute("CREATE INDEX IF NOT EXISTS runners_repo ON runners (repo)")
+            cursor.execute(
+                "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)"
+            )
+            cursor.execute("SELECT value FROM meta WHERE key = 'migrated_json'")
+            if cursor.fetchone() is None and legacy_path and legacy_path.exists():
+                entries = JSONRunnerStore(legacy_path).load()
+                self._upsert(cursor, entries)
+                cursor.execute(
+                    "INSERT INTO meta VALUES ('migrated_json', ?)", (len(entries),)
+                )
+                migrated = True
+
+        if migrated and legacy_path:
+            try:
+                legacy_path.replace(
+                    legacy_path.with_name(legacy_path.name + ".migrated")
+                )
+            except FileNotFoundError:
+                pass
+
+    @staticmethod
+    def _upsert(cursor: sqlite3.Cursor, entries: List[Entry]) -> None:
+        try:
+            rows = [
+                (entry["name"], entry["repo"], entry.get("status", ""), dumps(entry))
+                for entry in entries
+            ]
+        except TypeError:
+            raise RunnerFileIOError("Can not write to runner database!")
+
+        cursor.executemany(
+            "INSERT INTO runners (name, repo, status, data) VALUES (?, ?, ?, ?)"
+            " ON CONFLICT (name) DO UPDATE SET"
+            " repo = excluded.repo, status = excluded.status, data = excluded.data",
+            rows,
+        )
+
+    def version(self) -> Hashable:
+        # 'data_version' changes whenever another connection commits
+        with self._lock:
+            (data_version,) = self._connection.execute("PRAGMA data_version").fetchone()
+        return (str(self.path), data_version)
+
+    def load(self) -> List[Entry]:
+        try:
+            with self._lock:
+                rows = self._connection.execute(
+                    "SELECT data FROM runners ORDER BY rowid"
+                ).fetchall()
+        except sqlite3.Error as exc:
+            raise RunnerFileIOError(f"Can not read runner database: {exc}")
+        return [loads(data) for (data,) in rows]
+
+    def apply(
+        self, upserts: List[Entry], removals: List[str]
+    ) -> Tuple[Hashable, Hashable]:
+        try:
+            with self._transaction() as cursor:
+                # commits of this connection do not change 'data_version', so
+                # the version after is the one before
+                (data_version,) = cursor.execute("PRAGMA data_version").fetchone()
+                cursor.executemany(
+                    "DELETE FROM runners WHERE name = ?", [(n,) for n in removals]
+                )
+                self._upsert(cursor, upserts)
+        except sqlite3.Error as exc:
+            raise RunnerFileIOError(f"Can not write to runner database: {exc}")
+        version = (str(self.path), data_version)
+        return version, version
+
+
+def open_runner_store(base_dir: Path) -> RunnerStore:
+    json_path = base_dir / "runners.json"
+    if state_backend(base_dir) == "sqlite":
+        return SQLiteRunnerStore(base_dir / "runners.db", legacy_path=json_path)
+    return JSONRunnerStore(json_path)
@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+import os
+from datetime import datetime
+from datetime import timedelta
+from datetime import timezone
+from json import dumps
+from json import loads
+from json.decoder import JSONDecodeError
+from pathlib import Path
+from tempfile import NamedTemporaryFile
+from threading import Lock
+from typing import Callable
+from typing import Dict
+from typing import Optional
+from typing import Tuple
+
+from . import WUSA_BASE_DIR
+from .gh import api_runner_registration
+from .gh import api_runner_removal
+from .gh import post_gh_api
+from .state import file_lock
+
+TOKEN_APIS: Dict[str, Callable[[str], str]] = {
+    "registration": api_runner_registration,
+    "removal": api_runner_removal,
+}
+
+# tokens are not used anymore if they expire within this margin
+EXPIRY_MARGIN = timedelta(minutes=5)
+
+CachedToken = Tuple[str, datetime]
+
+
+def parse_expires_at(expires_at: str) -> datetime:
+    """Parses ``expires_at`` of GitHub, e.g. '2020-01-22T12:13:35.123-08:00'."""
+    if expires_at.endswith("Z"):
+        expires_at = expires_at[:-1] + "+00:00"
+    return datetime.fromisoformat(expires_at)
+
+
+class RunnerTokenCache:
+    """Cache for registration and removal tokens of runners by repo and kind.
+
+    Tokens are valid for an hour and reused until shortly before they expire.
+    Concurrent requests for the same token wait for a single API call. If a
+    ``path`` is given, tokens are also stored in a file only readable by the
+    user, so following wusa invocations can reuse them.
+    """
+
+    def __init__(
+        self,
+        path: Optional[Path] = None,
+        margin: timedelta = EXPIRY_MARGIN,
+    ) -> None:
+        self.path = path
+        self.margin = margin
+        self._tokens: Dict[Tuple[str, str], CachedToken] = {}
+        self._locks: Dict[Tuple[str, str], Lock] = {}
+        self._lock = Lock()
+        self._loaded = False
+
+    def _key_lock(self, key: Tuple[str, str]) -> Lock:
+        with self._lock:
+            return self._locks.setdefault(key, Lock())
+
+    def _is_valid(self, token: CachedToken) -> bool:
+        _, expires_at = token
+        return datetime.now(timezone.utc) + self.margin < expires_at
+
+    def _read(self, path: Path) -> Dict[Tuple[str, str], CachedToken]:
+        try:
+            entries = loads(path.read_text())
+        except (FileNotFoundError, JSONDecodeError):
+            return {}
+
+        tokens: Dict[Tuple[str, str], CachedToken] = {}
+        for entry in entries:
+            try:
+                key = (entry["repo"], entry["kind"])
+                token = (entry["token"], parse_expires_at(entry["expires_at"]))
+            except (KeyError, ValueError):
+                continue
+            if self._is_valid(token):
+                tokens.setdefault(key, token)
+        return tokens
+
+    def _load(self) -> None:
+        if self._loaded or self.path is None:
+            return
+        self._loaded = True
+
+        for key, token in self._read(self.path).items():
+            self._tokens.setdefault(key, token)
+
+    def _save(self, key: Tuple[str, str]) -> None:
+        """Writes the token of ``key`` to the file, or removes it from there.
+
+        Other processes might have stored tokens in the meantime, so the file is
+        read again under a lock and only the token of ``key`` is changed.
+        """
+        if self.path is None:
+            return
+
+        with file_lock(self.path.with_name(self.path.name + ".lock")):
+            tokens = self._read(self.path)
+            if key in self._tokens:
+                tokens[key] = self._tokens[key]
+            else:
+                tokens.pop(key, None)
+
+            entries = [
+                {
+                    "repo": repo,
+                    "kind": kind,
+                    "token": token,
+                    "expires_at": expires_at.isoformat(),
+                }
+                for (repo, kind), (token, expires_at) in tokens.items()
+            ]
+            # temporary files are only readable by the user
+            with NamedTemporaryFile(
+                "w", dir=self.path.parent, prefix=".runner_tokens-", delete=False
+            ) as fp:
+                fp.write(dumps(entries))
+            os.replace(fp.name, self.path)
+
+    def get(self, repo: str, kind: str) -> str:
+        """Returns a valid token of ``kind`` for ``repo``.
+
+        Parameters
+        ----------
+        repo
+            Repository in the format "some_user/repo_name".
+
+        kind
+            Either ``"registration"`` or ``"removal"``.
+        """
+        api = TOKEN_APIS[kind]
+        key = (repo, kind)
+
+        with self._key_lock(key):
+            with self._lock:
+                self._load()
+                cached = self._tokens.get(key)
+            if cached and self._is_valid(cached):
+                return cached[0]
+
+            response = post_gh_api(api(repo))
+            token = str(response["token"])
+            try:
+                expires_at = parse_expires_at(str(response["expires_at"]))
+            except (KeyError, ValueError):
+                # without expiration date the token is not cached
+                return token
+
+            with self._lock:
+                self._tokens[key] = (token, expires_at)
+                self._save(key)
+            return token
+
+    def invalidate(self, repo: str, kind: str) -> None:
+        with self._lock:
+            self._load()
+            if self._tokens.pop((repo, kind), None):
+                self._save((repo, kind))
+
+
+def token_cache_path() -> Optional[Path]:
+    """Token file if tokens are also cached on disk (``WUSA_TOKEN_CACHE=disk``)."""
+    if os.environ.get("WUSA_TOKEN_CACHE", "").lower() == "disk":
+        return WUSA_BASE_DIR / ".runner_tokens"
+    return None
+
+
+_token_cache: Optional[RunnerTokenCache] = None
+_token_cache_lock = Lock()
+
+
+def get_runner_token(repo: str, kind: str) -> str:
+    """Returns a registration or removal token using the shared token cache.
+
+    Parameters
+    ----------
+    repo
+        Repository in the format "some_user/repo_name".
+
+    kind
+        Either ``"registration"`` or ``"removal"``.
+
+    Returns
+    -------
+        Token which is valid for at least ``EXPIRY_MARGIN``.
+    """
+    return _shared_token_cache().get(repo, kind)
+
+
+def invalidate_runner_token(repo: str, kind: str) -> None:
+    """Drops a token of the shared token cache which GitHub rejected.
+
+    GitHub revokes tokens before they expire, e.g. when the repo is
+    re-registered, so the next ``get_runner_token`` requests a new one.
+    """
+    _shared_token_cache().invalidate(repo, kind)
+
+
+def _shared_token_cache() -> RunnerTokenCache:
+    global _token_cache
+    with _token_cache_lock:
+        if _token_cache is None:
+            _token_cache = RunnerTokenCache(token_cache_path())
+    return _token_cache
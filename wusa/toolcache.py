@@ -0,0 +1,338 @@
+# -*- coding: utf-8 -*-
+import os
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from shutil import rmtree
+from time import time
+from typing import Dict
+from typing import Generator
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+from .state import file_lock
+
+try:
+    from fcntl import LOCK_EX
+    from fcntl import LOCK_NB
+    from fcntl import LOCK_UN
+    from fcntl import flock
+except ImportError:  # pragma: no cover - non-POSIX platforms
+    flock = None  # type: ignore
+
+CACHE_DIR = "cache"
+# toolchains of 'actions/setup-*', as '<tool>/<version>/<arch>'
+TOOL_CACHE = "tool-cache"
+# archives of actions used instead of downloading them, as '<owner>_<repo>/<sha>'
+ACTION_CACHE = "action-cache"
+CACHE_LOCK = ".lock"
+PRUNE_STAMP = ".pruned"
+# scripts run by the runners before and after every job, see ``JOB_HOOKS``
+HOOKS_DIR = "hooks"
+# one file per running job in the tool cache, written by the job hooks
+JOBS_DIR = ".jobs"
+JOBS_LOCK = ".lock"
+
+# where the caches are mounted in runner containers
+CONTAINER_CACHE_DIRS = {
+    TOOL_CACHE: "/opt/hostedtoolcache",
+    ACTION_CACHE: "/opt/actionarchivecache",
+}
+CONTAINER_HOOKS_DIR = "/opt/wusa-hooks"
+# depth of the cache entries below the root of each cache
+ENTRY_DEPTH = {TOOL_CACHE: 3, ACTION_CACHE: 2}
+
+# caches are off unless a size is set
+DEFAULT_CACHE_SIZE = "0"
+# entries installed more recently than this may still be installed
+DEFAULT_MIN_AGE = 3600.0
+# jobs running longer are considered gone, e.g. with their runner
+JOB_TIMEOUT = 24 * 3600.0
+# seconds between two automatic prunes
+PRUNE_INTERVAL = 3600.0
+
+SIZE_UNITS = {"b": 1, "k": 1 << 10, "m": 1 << 20, "g": 1 << 30, "t": 1 << 40}
+
+_JOBS = CONTAINER_CACHE_DIRS[TOOL_CACHE] + "/" + JOBS_DIR
+_JOB = _JOBS + '/"${RUNNER_NAME:-$HOSTNAME}"'
+# the shared lock makes jobs wait while the caches are pruned
+JOB_HOOKS = {
+    "job-started.sh": (
+        "#!/bin/sh\n"
+        f"mkdir -p {_JOBS}\n"
+        f"flock -s {_JOBS}/{JOBS_LOCK} touch {_JOB}\n"
+    ),
+    "job-completed.sh": f"#!/bin/sh\nrm -f {_JOB}\n",
+}
+
+
+@dataclass
+class ToolCacheEntry:
+    """Toolchain or action archive in a cache, evicted as a whole."""
+
+    path: Path
+    size: int
+    # when the entry was installed or updated last
+    last_used: float
+
+
+def parse_size(size: str) -> int:
+    """Parses a size like docker does, e.g. '20g' or '512m', into bytes."""
+    size = size.strip().lower()
+    unit = SIZE_UNITS.get(size[-1:], 0)
+    try:
+        return int(float(size[:-1] if unit else size) * (unit or 1))
+    except ValueError:
+        raise ValueError(f"Invalid size '{size}'")
+
+
+def format_size(size: float) -> str:
+    """Size in bytes for humans, e.g. '1.5 GiB'."""
+    for unit in ("B", "KiB", "MiB", "GiB"):
+        if size < 1024:
+            break
+        size /= 1024
+    else:
+        unit = "TiB"
+    return f"{size:.1f} {unit}" if unit != "B" else f"{size:.0f} B"
+
+
+def cache_size() -> int:
+    """Size cap of the shared caches in bytes (``WUSA_CACHE_SIZE``), 0 if off."""
+    return parse_size(os.environ.get("WUSA_CACHE_SIZE", DEFAULT_CACHE_SIZE))
+
+
+def cache_root(base_dir: Path) -> Path:
+    return base_dir / CACHE_DIR
+
+
+def jobs_dir(base_dir: Path) -> Path:
+    return cache_root(base_dir) / TOOL_CACHE / JOBS_DIR
+
+
+def _write_hooks(hooks_dir: Path) -> None:
+    hooks_dir.mkdir(parents=True, exist_ok=True)
+    for name, content in JOB_HOOKS.items():
+        hook = hooks_dir / name
+        if not hook.exists() or hook.read_text() != content:
+            hook.write_text(content)
+        hook.chmod(0o755)
+
+
+def cache_mounts(base_dir: Path) -> List[str]:
+    """Volumes of the caches shared by all runners, empty if caching is off."""
+    if not cache_size():
+        return []
+
+    mounts = []
+    for cache, container_dir in CONTAINER_CACHE_DIRS.items():
+        host_dir = cache_root(base_dir) / cache
+        # docker would create missing directories owned by root
+        host_dir.mkdir(parents=True, exist_ok=True)
+        mounts.append(f"{host_dir}:{container_dir}")
+    jobs_dir(base_dir).mkdir(exist_ok=True)
+
+    hooks_dir = cache_root(base_dir) / HOOKS_DIR
+    _write_hooks(hooks_dir)
+    mounts.append(f"{hooks_dir}:{CONTAINER_HOOKS_DIR}:ro")
+    return mounts
+
+
+def cache_environment() -> Dict[str, str]:
+    """Variables pointing the runner and setup actions to the shared caches.
+
+    Every job is recorded by the hooks of the runner, so the caches are never
+    pruned while a job might use them.
+    """
+    if not cache_size():
+        return {}
+
+    tool_cache = CONTAINER_CACHE_DIRS[TOOL_CACHE]
+    return {
+        "RUNNER_TOOL_CACHE": tool_cache,
+        "AGENT_TOOLSDIRECTORY": tool_cache,
+        "ACTIONS_RUNNER_ACTION_ARCHIVE_CACHE": CONTAINER_CACHE_DIRS[ACTION_CACHE],
+        "ACTIONS_RUNNER_HOOK_JOB_STARTED": f"{CONTAINER_HOOKS_DIR}/job-started.sh",
+        "ACTIONS_RUNNER_HOOK_JOB_COMPLETED": (
+            f"{CONTAINER_HOOKS_DIR}/job-completed.sh"
+        ),
+    }
+
+
+def running_jobs(base_dir: Path, now: Optional[float] = None) -> List[str]:
+    """Names of the runners with a running job which may use the caches."""
+    now = time() if now is None else now
+    running = []
+    try:
+        leases = list(jobs_dir(base_dir).iterdir())
+    except FileNotFoundError:
+        return []
+    for lease in leases:
+        if lease.name == JOBS_LOCK:
+            continue
+        try:
+            if now - lease.stat().st_mtime < JOB_TIMEOUT:
+                running.append(lease.name)
+        except FileNotFoundError:
+            pass
+    return sorted(running)
+
+
+def end_job(base_dir: Path, runner_name: str) -> None:
+    """Drops the job of a removed runner, which can not finish it anymore."""
+    try:
+        (jobs_dir(base_dir) / runner_name).unlink()
+    except FileNotFoundError:
+        pass
+
+
+def _marker(path: Path) -> Path:
+    # '@actions/tool-cache' only uses toolchains with a '<arch>.complete' file
+    return path.with_name(path.name + ".complete")
+
+
+def disk_usage(path: Path) -> Tuple[int, float]:
+    """Size of the files of ``path`` and when one of them was written last.
+
+    Access times are not used, as filesystems mounted with 'relatime' update
+    them at most once a day.
+    """
+    stats = []
+    if path.is_dir() and not path.is_symlink():
+        for root, _, files in os.walk(path):
+            for name in files:
+                try:
+                    stats.append(os.lstat(os.path.join(root, name)))
+                except FileNotFoundError:
+                    pass
+    else:
+        stats.append(path.lstat())
+
+    size = sum(stat.st_size for stat in stats)
+    # a toolchain which is being installed may have no files yet
+    last_used = max((s.st_mtime for s in stats), default=0.0)
+    last_used = max(last_used, path.lstat().st_mtime)
+    marker = _marker(path)
+    if marker.exists():
+        last_used = max(last_used, marker.stat().st_mtime)
+    return size, last_used
+
+
+def cache_entries(base_dir: Path) -> Dict[str, List[ToolCacheEntry]]:
+    """Entries of every shared cache with their size and last change."""
+    entries: Dict[str, List[ToolCacheEntry]] = {}
+    for cache, depth in ENTRY_DEPTH.items():
+        root = cache_root(base_dir) / cache
+        paths = [root]
+        for _ in range(depth):
+            paths = [
+                child
+                for path in paths
+                if path.is_dir() and not path.is_symlink()
+                for child in path.iterdir()
+                if not child.name.endswith(".complete")
+                and not child.name.startswith(".")
+            ]
+        entries[cache] = []
+        for path in paths:
+            try:
+                entries[cache].append(ToolCacheEntry(path, *disk_usage(path)))
+            except FileNotFoundError:
+                # evicted or replaced meanwhile
+                pass
+    return entries
+
+
+@contextmanager
+def try_lock(path: Path) -> Generator[bool, None, None]:
+    """Exclusive cross-process lock on ``path``, yields False if already taken."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open("a") as fp:
+        if flock is None:
+            yield True
+            return
+        try:
+            flock(fp.fileno(), LOCK_EX | LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            flock(fp.fileno(), LOCK_UN)
+
+
+def _evict(entry: ToolCacheEntry) -> None:
+    # without the marker, jobs see the toolchain as missing, not half-removed
+    for path in (_marker(entry.path), entry.path):
+        if path.is_dir() and not path.is_symlink():
+            rmtree(path, ignore_errors=True)
+        else:
+            try:
+                path.unlink()
+            except OSError:
+                pass
+
+    # drop directories of tools and versions without entries
+    parent = entry.path.parent
+    while parent.name not in (TOOL_CACHE, ACTION_CACHE):
+        try:
+            parent.rmdir()
+        except OSError:
+            break
+        parent = parent.parent
+
+
+def prune_caches(
+    base_dir: Path,
+    max_size: Optional[int] = None,
+    min_age: float = DEFAULT_MIN_AGE,
+    interval: float = 0.0,
+) -> Optional[Tuple[List[ToolCacheEntry], int]]:
+    """Evicts the oldest entries until the caches fit ``max_size``.
+
+    Nothing is evicted while a job runs, as it might use any entry, and jobs
+    which start wait until the eviction is done. Entries changed within
+    ``min_age`` seconds are kept, as they might still be installed. Only one
+    process prunes at a time, and if ``interval`` is given only if the last
+    prune is at least ``interval`` seconds ago.
+
+    Returns
+    -------
+        Evicted entries and the size of the caches afterwards, or None if the
+        caches were not pruned as another process is pruning them.
+    """
+    max_size = cache_size() if max_size is None else max_size
+    root = cache_root(base_dir)
+    if not root.exists():
+        return [], 0
+
+    stamp = root / PRUNE_STAMP
+    with try_lock(root / CACHE_LOCK) as locked:
+        if not locked:
+            return None
+        if interval and stamp.exists() and time() - stamp.stat().st_mtime < interval:
+            return None
+
+        now = time()
+        entries = [e for cache in cache_entries(base_dir).values() for e in cache]
+        size = sum(entry.size for entry in entries)
+        evicted = []
+        with file_lock(jobs_dir(base_dir) / JOBS_LOCK):
+            if running_jobs(base_dir, now):
+                entries = []
+            for entry in sorted(entries, key=lambda e: e.last_used):
+                if size <= max_size:
+                    break
+                if now - entry.last_used < min_age:
+                    continue
+                _evict(entry)
+                # e.g. files written by root in the container
+                if entry.path.exists():
+                    continue
+                evicted.append(entry)
+                size -= entry.size
+
+        stamp.touch()
+        return evicted, size
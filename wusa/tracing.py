@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+import os
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from contextvars import copy_context
+from dataclasses import dataclass
+from dataclasses import field
+from functools import wraps
+from json import dumps
+from pathlib import Path
+from time import perf_counter
+from typing import Any
+from typing import Awaitable
+from typing import Callable
+from typing import Dict
+from typing import Generator
+from typing import List
+from typing import Optional
+from typing import TypeVar
+
+T = TypeVar("T")
+
+
+@dataclass(eq=False)
+class Span:
+    name: str
+    start: float
+    parent: Optional["Span"] = None
+    end: Optional[float] = None
+    # thread, or task for spans of coroutines, the span was recorded in
+    track: int = 0
+    args: Dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def duration(self) -> float:
+        return (self.end or perf_counter()) - self.start
+
+
+_current_span: "ContextVar[Optional[Span]]" = ContextVar("current_span", default=None)
+
+
+def _track() -> int:
+    # only called while tracing, asyncio is not imported by every command
+    import asyncio
+
+    try:
+        task = asyncio.current_task()
+    except RuntimeError:
+        task = None
+    return id(task) if task else threading.get_ident()
+
+
+class Tracer:
+    """Records hierarchical spans of time, e.g. of docker and GitHub calls.
+
+    Spans are nested by context, so spans of threads and coroutines are children
+    of the span which was current when they were started (see ``propagate`` and
+    ``attach``). Nothing is recorded unless the tracer is enabled.
+    """
+
+    def __init__(self) -> None:
+        self.enabled = False
+        self.spans: List[Span] = []
+        self._lock = threading.Lock()
+
+    def start(self, name: str, **args: Any) -> Optional[Span]:
+        if not self.enabled:
+            return None
+        span = Span(name, perf_counter(), _current_span.get(), track=_track())
+        span.args.update(args)
+        with self._lock:
+            self.spans.append(span)
+        return span
+
+    def finish(self, span: Optional[Span]) -> None:
+        if span is not None:
+            span.end = perf_counter()
+
+    @contextmanager
+    def span(self, name: str, **args: Any) -> Generator[None, None, None]:
+        span = self.start(name, **args)
+        if span is None:
+            yield
+            return
+
+        token = _current_span.set(span)
+        try:
+            yield
+        finally:
+            _current_span.reset(token)
+            self.finish(span)
+
+    def roots(self) -> List[Span]:
+        return [span for span in self.spans if span.parent is None]
+
+    def children(self) -> Dict[Span, List[Span]]:
+        children: Dict[Span, List[Span]] = {}
+        for span in self.spans:
+            if span.parent is not None:
+                children.setdefault(span.parent, []).append(span)
+        return children
+
+    def chrome_trace(self) -> Dict[str, Any]:
+        """Spans in the Trace Event Format of Chrome ('chrome://tracing')."""
+        origin = min((span.start for span in self.spans), default=0.0)
+        events = [
+            {
+                "name": span.name,
+                "ph": "X",
+                "ts": (span.start - origin) * 1e6,
+                "dur": span.duration * 1e6,
+                "pid": os.getpid(),
+                "tid": span.track,
+                "args": span.args,
+            }
+            for span in self.spans
+        ]
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def write_chrome_trace(self, path: Path) -> None:
+        path.write_text(dumps(self.chrome_trace(), default=str))
+
+
+TRACER = Tracer()
+
+
+def span(name: str, **args: Any):
+    """Records a span of ``name`` with the shared tracer."""
+    return TRACER.span(name, **args)
+
+
+def traced(name: str) -> Callable[[Callable[..., T]], Callable[..., T]]:
+    """Decorator recording every call of a function as span of ``name``."""
+
+    def decorator(function: Callable[..., T]) -> Callable[..., T]:
+        @wraps(function)
+        def wrapper(*args: Any, **kwargs: Any) -> T:
+            if not TRACER.enabled:
+                return function(*args, **kwargs)
+            with TRACER.span(name):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def propagate(function: Callable[..., T]) -> Callable[..., T]:
+    """Runs ``function`` in the current context, e.g. in worker threads."""
+    context = copy_context()
+
+    @wraps(function)
+    def wrapper(*args: Any, **kwargs: Any) -> T:
+        # a context can only be entered by one thread at a time
+        return context.copy().run(function, *args, **kwargs)
+
+    return wrapper
+
+
+async def attach(coroutine: Awaitable[T], parent: Optional[Span]) -> T:
+    """Awaits ``coroutine`` with ``parent`` as current span, e.g. on other loops."""
+    token = _current_span.set(parent)
+    try:
+        return await coroutine
+    finally:
+        _current_span.reset(token)
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()